@@ -228,10 +228,10 @@ class PythonServerManager: ObservableObject {
         #if targetEnvironment(simulator)
         
         let localIP = getLocalIPAddress()
-        testURL = "http://\(localIP):8000/health"
+        testURL = "http://\(localIP):8000/readyz"
         #else
         
-        testURL = "http://192.168.1.202:8000/health"
+        testURL = "http://192.168.1.202:8000/readyz"
         #endif
 
         guard let url = URL(string: testURL) else {
@@ -248,7 +248,7 @@ class PythonServerManager: ObservableObject {
                 let isHealthy = httpResponse.statusCode == 200
 
                 if isHealthy {
-                    let serverIP = testURL.replacingOccurrences(of: "/health", with: "")
+                    let serverIP = testURL.replacingOccurrences(of: "/readyz", with: "")
                     await MainActor.run {
                         self.serverURL = serverIP
                     }
@@ -53,21 +53,18 @@ class WebAPIService {
             throw WebAPIError.invalidImage
         }
 
-        let base64Image = imageData.base64EncodedString()
-
-        let request = FoodAnalysisRequest(
-            imageBase64: base64Image,
-            userContext: userContext
-        )
-
-        let url = URL(string: "\(baseURL)/analyze-food")!
+        let url = URL(string: "\(baseURL)/analyze-food/upload")!
         var urlRequest = URLRequest(url: url)
         urlRequest.httpMethod = "POST"
-        urlRequest.setValue("application/json", forHTTPHeaderField: "Content-Type")
+        urlRequest.setValue("image/jpeg", forHTTPHeaderField: "Content-Type")
         urlRequest.timeoutInterval = 30 
 
-        let encoder = JSONEncoder()
-        urlRequest.httpBody = try encoder.encode(request)
+        if let userContext = userContext {
+            let contextData = try JSONEncoder().encode(userContext)
+            urlRequest.setValue(String(data: contextData, encoding: .utf8), forHTTPHeaderField: "X-User-Context")
+        }
+
+        urlRequest.httpBody = imageData
 
         print("DEBUG WebAPIService: Sending request to \(url.absoluteString)")
 
@@ -0,0 +1,187 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import DEFAULT_SIZE_BUCKETS, metrics
+from request_timing import record_stage
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+
+class _PendingItem:
+    __slots__ = ('array', 'future', 'enqueued_at', 'started_at', 'finished_at')
+
+    def __init__(self, array):
+        self.array = array
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-image predictions into batched forward passes.
+
+    Callers submit one preprocessed sample (no batch dimension) and get a
+    Future for that sample's output. A background thread collects up to
+    ``max_batch_size`` samples, waiting at most ``max_wait_ms`` after the
+    first one arrives, runs ``predict_fn`` once on the stacked batch and
+    hands each row back to the caller that submitted it. After ``close``
+    the thread finishes what was queued and exits; later samples run
+    unbatched on the caller's thread.
+    """
+
+    def __init__(self, predict_fn, name='classifier', max_batch_size=None, max_wait_ms=None):
+        self.predict_fn = predict_fn
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size or BATCH_MAX_SIZE)
+        self.max_wait = (BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._inputs = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._stopping = False
+
+        self.batch_size_histogram = metrics.histogram(
+            f'{name}_batch_size', 'Samples per batched forward pass', buckets=DEFAULT_SIZE_BUCKETS
+        )
+        self.queue_wait_histogram = metrics.histogram(
+            f'{name}_queue_wait_seconds', 'Time a sample waited before its batch ran'
+        )
+        self.predict_histogram = metrics.histogram(
+            f'{name}_batch_predict_seconds', 'Duration of one batched forward pass'
+        )
+
+    def _enqueue(self, array):
+        item = _PendingItem(array)
+        # Under the lock, so nothing is queued behind close()'s sentinel.
+        with self._start_lock:
+            if self._closed:
+                return None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._thread.start()
+            self._queue.put(item)
+        return item
+
+    def _predict_one(self, array):
+        outputs = self.predict_fn(np.asarray(array)[None])
+        if isinstance(outputs, (list, tuple)):
+            return tuple(output[0] for output in outputs)
+        return outputs[0]
+
+    def submit(self, array):
+        item = self._enqueue(array)
+        if item is not None:
+            return item.future
+
+        future = Future()
+        try:
+            future.set_result(self._predict_one(array))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def predict(self, array, timeout=None):
+        item = self._enqueue(array)
+        if item is None:
+            started_at = time.perf_counter()
+            result = self._predict_one(array)
+            record_stage('predict', time.perf_counter() - started_at)
+            return result
+
+        result = item.future.result(timeout=timeout)
+        # Timed here, on the caller's thread, so both land in its request timings.
+        record_stage('queue_wait', item.started_at - item.enqueued_at)
+        record_stage('predict', item.finished_at - item.started_at)
+        return result
+
+    def close(self):
+        """Stop the batching thread once the samples already queued have run."""
+        with self._start_lock:
+            self._closed = True
+            if self._thread is not None:
+                self._queue.put(None)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            self._stopping = True
+            return []
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopping = True
+                break
+            batch.append(item)
+
+        return batch
+
+    def _run(self):
+        while not self._stopping:
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.exception(f"Batcher '{self.name}' failed: {e}")
+
+    def _stack(self, batch):
+        # Only the batcher thread touches this buffer, so it is reused across
+        # batches instead of allocating a fresh one per forward pass.
+        first = np.asarray(batch[0].array)
+        if self._inputs is None or self._inputs.shape[1:] != first.shape or self._inputs.dtype != first.dtype:
+            self._inputs = np.empty((self.max_batch_size,) + first.shape, dtype=first.dtype)
+
+        inputs = self._inputs[:len(batch)]
+        for row, item in zip(inputs, batch):
+            row[...] = item.array
+        return inputs
+
+    def _run_batch(self, batch):
+        started_at = time.perf_counter()
+        for item in batch:
+            item.started_at = started_at
+            self.queue_wait_histogram.observe(started_at - item.enqueued_at)
+        self.batch_size_histogram.observe(len(batch))
+
+        try:
+            inputs = self._stack(batch)
+            outputs = self.predict_fn(inputs)
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finally:
+            finished_at = time.perf_counter()
+            for item in batch:
+                item.finished_at = finished_at
+            self.predict_histogram.observe(finished_at - started_at)
+
+        for index, item in enumerate(batch):
+            if isinstance(outputs, (list, tuple)):
+                item.future.set_result(tuple(output[index] for output in outputs))
+            else:
+                item.future.set_result(outputs[index])
@@ -0,0 +1,17 @@
+"""Offline benchmarks and load tests for the food analysis backend.
+
+Run from ``python_backend/`` with ``python -m benchmarks.<name>``; every
+script takes ``--output`` to write its results as JSON.
+
+    run_suite              run the parity checks, then the suite below into results/<timestamp>/
+    check_food_tags_parity food tags and dental verdicts against the legacy scans (exits 1 on drift)
+    compare_results        diff two runs and flag regressions
+    bench_preprocessing    image decode/resize/normalize
+    bench_verdict          determine_verdict / determine_dental_safety
+    bench_predict          model predict at batch sizes 1-32
+    bench_embedding_index  exact and IVF-PQ lookup at 10k and 1M images
+    bench_tta              test-time augmentation accuracy gain and added latency
+    bench_runtime_config   worker count x thread pools x XLA sweep for a core count
+    bench_history          history write-behind cost and report query latency
+    loadgen                synthetic JPEG load against both route shapes
+"""
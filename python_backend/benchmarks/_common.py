@@ -0,0 +1,178 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# How each entry point is launched locally and where its endpoints live:
+# gunicorn with uvicorn workers (the Food-101 deployment) and app.py's
+# ImageNet defaults under plain uvicorn (the local server the iOS app runs).
+SERVERS = {
+    'server': {
+        'command': ['-m', 'gunicorn', 'server:app', '--bind', '127.0.0.1:{port}'],
+        'ready': '/readyz',
+    },
+    'app': {
+        'command': ['-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+        'ready': '/readyz',
+    },
+}
+
+
+def peak_rss_kb():
+    # VmHWM is reset on exec, unlike ru_maxrss which can carry over the
+    # parent's peak from before the fork.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def synthetic_jpeg(width=1024, height=768, seed=0, quality=85):
+    """Return JPEG bytes of a noisy gradient image, roughly phone-photo sized."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([
+        np.broadcast_to(x, (height, width)),
+        np.broadcast_to(y, (height, width)),
+        rng.uniform(0, 255, (height, width)).astype(np.float32)
+    ], axis=-1).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, 'RGB').save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def synthetic_corpus(count, sizes=((640, 480), (1024, 768), (1280, 960), (2016, 1512)), seed=0):
+    """``count`` distinct JPEGs cycling through ``sizes``, so caches cannot answer repeats."""
+    return [
+        synthetic_jpeg(*sizes[index % len(sizes)], seed=seed + index)
+        for index in range(count)
+    ]
+
+
+def load_image_bytes(path=None, **kwargs):
+    if path:
+        with open(path, 'rb') as f:
+            return f.read()
+    return synthetic_jpeg(**kwargs)
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    return float(np.percentile(np.asarray(samples, dtype=np.float64), q))
+
+
+def summarize(latencies, wall_time=None):
+    summary = {
+        'count': len(latencies),
+        'mean_ms': float(np.mean(latencies)) * 1000 if latencies else None,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 95) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+    }
+    if wall_time:
+        summary['throughput_rps'] = len(latencies) / wall_time
+    return summary
+
+
+def print_summary(title, summary):
+    print(f"{title}:")
+    for key, value in summary.items():
+        if isinstance(value, float):
+            print(f"  {key:>16}: {value:.2f}")
+        else:
+            print(f"  {key:>16}: {value}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_server(kind, port=None, env=None, timeout=300):
+    """Start the service as ``server`` or ``app`` (see SERVERS) locally; yields its base URL."""
+    import requests
+
+    port = port or free_port()
+    spec = SERVERS[kind]
+    command = [sys.executable] + [part.format(port=port) for part in spec['command']]
+    process = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+            try:
+                if requests.get(url + spec['ready'], timeout=2).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{kind} server not ready after {timeout:.0f}s")
+            time.sleep(0.25)
+
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def environment_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit
+    }
+
+
+def write_results(path, name, results, **metadata):
+    if not path:
+        return
+
+    payload = {
+        'benchmark': name,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment_metadata(),
+        'metadata': metadata,
+        'results': results
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {path}")
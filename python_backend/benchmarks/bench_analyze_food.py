@@ -0,0 +1,68 @@
+"""Latency of app.py's /analyze-food endpoint against a running server.
+
+Run once against the old server and once against the new one with a
+different --label to compare p50/p99:
+
+    python -m benchmarks.bench_analyze_food --url http://localhost:8000 --label after
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks._common import load_image_bytes, print_summary, summarize, write_results
+
+
+_local = threading.local()
+
+
+def _session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def post_image(session, url, image_bytes):
+    start = time.perf_counter()
+    response = session.post(
+        f"{url}/analyze-food",
+        files={'file': ('food.jpg', image_bytes, 'image/jpeg')},
+        timeout=120
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--image', help='JPEG to upload (default: synthetic)')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    image_bytes = load_image_bytes(args.image)
+    for _ in range(args.warmup):
+        post_image(_session(), args.url, image_bytes)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(
+            lambda _: post_image(_session(), args.url, image_bytes),
+            range(args.requests)
+        ))
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(latencies, wall_time)
+    print_summary(f"/analyze-food [{args.label}]", summary)
+    write_results(args.output, 'analyze_food', {args.label: summary},
+                  url=args.url, concurrency=args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""N sequential single-image requests vs one batch request.
+
+    python -m benchmarks.bench_batch_endpoint --routes api --url http://localhost:5000 --images 8
+    python -m benchmarks.bench_batch_endpoint --routes multipart --url http://localhost:8000 --images 8
+"""
+import argparse
+import base64
+import time
+
+import requests
+
+from benchmarks._common import print_summary, summarize, synthetic_jpeg, write_results
+
+
+def post_single(session, routes, url, image_bytes):
+    if routes == 'api':
+        response = session.post(f"{url}/api/analyze-food/upload", data=image_bytes,
+                                headers={'Content-Type': 'image/jpeg'}, timeout=120)
+    else:
+        response = session.post(f"{url}/analyze-food",
+                                files={'file': ('food.jpg', image_bytes, 'image/jpeg')}, timeout=120)
+    response.raise_for_status()
+
+
+def post_batch(session, routes, url, images):
+    if routes == 'api':
+        response = session.post(f"{url}/api/analyze-food/batch", json={
+            'images': [base64.b64encode(image).decode('ascii') for image in images],
+            'userContext': {}
+        }, timeout=120)
+    else:
+        response = session.post(f"{url}/analyze-food/batch", files=[
+            ('files', (f'food{index}.jpg', image, 'image/jpeg')) for index, image in enumerate(images)
+        ], timeout=120)
+    response.raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', choices=('api', 'multipart'), default='api')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    # Distinct images so the result cache cannot answer the repeats.
+    session = requests.Session()
+    sequential, batched = [], []
+
+    for round_index in range(args.rounds + 1):
+        images = [synthetic_jpeg(640, 480, seed=round_index * args.images + index) for index in range(args.images)]
+
+        start = time.perf_counter()
+        for image in images:
+            post_single(session, args.routes, args.url, image)
+        sequential_time = time.perf_counter() - start
+
+        images = [synthetic_jpeg(640, 480, seed=10_000 + round_index * args.images + index)
+                  for index in range(args.images)]
+
+        start = time.perf_counter()
+        post_batch(session, args.routes, args.url, images)
+        batch_time = time.perf_counter() - start
+
+        if round_index:
+            sequential.append(sequential_time)
+            batched.append(batch_time)
+
+    results = {'sequential': summarize(sequential), 'batch': summarize(batched)}
+    print_summary(f"{args.images} sequential requests", results['sequential'])
+    print_summary(f"1 batch request of {args.images}", results['batch'])
+    write_results(args.output, 'batch_endpoint', results, routes=args.routes, images=args.images)
+
+
+if __name__ == '__main__':
+    main()
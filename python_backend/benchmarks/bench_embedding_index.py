@@ -0,0 +1,126 @@
+"""Micro-benchmark: embedding index lookup latency at 10k and 1M images.
+
+Builds synthetic indexes (clustered vectors, one cluster per food) in a
+temporary directory, then times exact memory-mapped search and IVF-PQ
+search, and reports IVF-PQ recall against the exact top-k, how often
+both name the same food for the closest image, build time and on-disk
+size. Each size is built once; the 1M x 1280 index takes
+about 5 GB of disk.
+
+    python -m benchmarks.bench_embedding_index
+    python -m benchmarks.bench_embedding_index --sizes 10000 100000 --dim 256 --queries 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks._common import print_summary, summarize, write_results
+from embedding_index import EmbeddingIndex, append_embeddings, create_index, train_ivf
+
+CHUNK_ROWS = 50000
+
+
+def synthetic_embeddings(centers, labels, rng, noise):
+    return centers[labels] + rng.normal(0, noise, (len(labels), centers.shape[1])).astype(np.float32)
+
+
+def build(path, size, dim, foods, noise, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (foods, dim)).astype(np.float32)
+    names = [f'food {index}' for index in range(foods)]
+
+    create_index(path, 'imagenet', dim)
+    for start in range(0, size, CHUNK_ROWS):
+        labels = rng.integers(0, foods, min(CHUNK_ROWS, size - start))
+        append_embeddings(path, synthetic_embeddings(centers, labels, rng, noise), [names[label] for label in labels])
+    return centers
+
+
+def disk_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 1e6
+
+
+def time_search(index, queries, k, nprobe=None):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, k, nprobe))
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies), results
+
+
+def recall(exact, approximate):
+    hits = [len({row for row, _ in truth} & {row for row, _ in found}) / len(truth)
+            for truth, found in zip(exact, approximate)]
+    return float(np.mean(hits))
+
+
+def label_agreement(index, exact, approximate):
+    # What the service acts on: whether the closest image found names the same food.
+    return float(np.mean([index.label_ids[truth[0][0]] == index.label_ids[found[0][0]]
+                          for truth, found in zip(exact, approximate)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=(10000, 1000000))
+    parser.add_argument('--dim', type=int, default=1280)
+    parser.add_argument('--foods', type=int, default=1000)
+    parser.add_argument('--noise', type=float, default=0.6, help='Spread of images around their food')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=(8, 16, 32))
+    parser.add_argument('--pq-subvectors', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix='embedding-index-') as path:
+            start = time.perf_counter()
+            centers = build(path, size, args.dim, args.foods, args.noise, args.seed)
+            build_seconds = time.perf_counter() - start
+
+            rng = np.random.default_rng(args.seed + 1)
+            queries = synthetic_embeddings(centers, rng.integers(0, args.foods, args.queries), rng, args.noise)
+
+            exact_summary, exact = time_search(EmbeddingIndex.load(path), queries, args.k)
+            exact_summary.update({'build_seconds': build_seconds, 'disk_mb': disk_mb(path)})
+            results[f'{size}_exact'] = exact_summary
+            print_summary(f"{size} exact", exact_summary)
+
+            lists = max(1, int(4 * np.sqrt(size)))
+            start = time.perf_counter()
+            train_ivf(path, lists, args.pq_subvectors, seed=args.seed)
+            train_seconds = time.perf_counter() - start
+            index = EmbeddingIndex.load(path)
+
+            for nprobe in args.nprobe:
+                summary, approximate = time_search(index, queries, args.k, nprobe)
+                summary.update({
+                    f'recall_at_{args.k}': recall(exact, approximate),
+                    'top1_label_agreement': label_agreement(index, exact, approximate),
+                    'lists': lists,
+                    'train_seconds': train_seconds,
+                    'disk_mb': disk_mb(path)
+                })
+                results[f'{size}_ivfpq_nprobe_{nprobe}'] = summary
+                print_summary(f"{size} IVF-PQ nprobe={nprobe}", summary)
+
+            # Adding a food: append to the trained index and time the encode.
+            start = time.perf_counter()
+            append_embeddings(path, synthetic_embeddings(centers, np.zeros(100, dtype=np.int64), rng, args.noise),
+                              ['new food'] * 100)
+            results[f'{size}_append_100_ms'] = (time.perf_counter() - start) * 1000
+            print(f"{size} append 100 rows: {results[f'{size}_append_100_ms']:.1f} ms")
+
+    write_results(args.output, 'embedding_index', results, dim=args.dim, foods=args.foods, queries=args.queries,
+                  k=args.k, pq_subvectors=args.pq_subvectors)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Micro-benchmark: compiled food-tag matcher vs the legacy substring scans.
+
+    python -m benchmarks.bench_food_tags --repeat 200
+"""
+import argparse
+import timeit
+
+from benchmarks._common import print_summary, write_results
+from benchmarks.check_food_tags_parity import FREE_TEXT_NAMES, food101_names, legacy_server_tags
+from food_tags import food_tags, food_tags_many
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    names = food101_names() + FREE_TEXT_NAMES
+    candidates = {
+        'legacy_substring_scan': lambda: [legacy_server_tags(name) for name in names],
+        'compiled_per_name': lambda: [food_tags(name) for name in names],
+        'compiled_batch': lambda: food_tags_many(names),
+    }
+
+    results = {}
+    for label, fn in candidates.items():
+        seconds = min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat
+        results[label] = {
+            'names': len(names),
+            'per_call_us': seconds / len(names) * 1e6,
+            'per_list_ms': seconds * 1000
+        }
+        print_summary(label, results[label])
+
+    write_results(args.output, 'food_tags', results, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
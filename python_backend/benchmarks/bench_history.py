@@ -0,0 +1,95 @@
+"""Analysis history: request-path write cost and report query latency.
+
+Compares what a request pays to record an analysis with the write-behind
+buffer against a synchronous committed INSERT per request, then fills a
+store with ``--rows`` analyses spread over ``--users`` users and times
+``recent`` and ``summary`` for random users.
+
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --rows 1000000 --users 10000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from benchmarks._common import print_summary, summarize, write_results
+from history import COLUMNS, HistoryStore
+
+VERDICTS = ('safe', 'caution', 'later', 'avoid')
+TAGS = ('hard', 'sticky', 'sugary', 'acidic', 'hot', 'cold', 'soft', 'crunchy')
+FOODS = ('Pizza', 'Caramel', 'Apple', 'Ice Cream', 'Pretzel', 'Salad')
+
+
+def analysis(rng, users):
+    return (f'user-{rng.randrange(users)}', rng.choice(FOODS), rng.random(), 'tensorflow', rng.choice(VERDICTS),
+            rng.sample(TAGS, rng.randint(0, 3)), 'api')
+
+
+def time_calls(fn, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def synchronous_insert(db, row):
+    user_id, food_name, confidence, source, verdict, tags, route = row
+    with db:
+        db.execute(f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                   (user_id, time.time(), food_name, confidence, source, verdict, json.dumps(tags), route))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--writes', type=int, default=2000, help='Request-path writes to time')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='history-') as directory:
+        store = HistoryStore(os.path.join(directory, 'buffered.db'), flush_interval=3600, flush_rows=args.writes + 1)
+        results['record_buffered'] = time_calls(lambda: store.record(*analysis(rng, args.users)), args.writes)
+        start = time.perf_counter()
+        store.flush()
+        results['record_buffered']['flush_ms'] = (time.perf_counter() - start) * 1000
+
+        HistoryStore(os.path.join(directory, 'synchronous.db'))
+        db = sqlite3.connect(os.path.join(directory, 'synchronous.db'))
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        results['insert_synchronous'] = time_calls(lambda: synchronous_insert(db, analysis(rng, args.users)),
+                                                   args.writes)
+        print_summary('record (write-behind)', results['record_buffered'])
+        print_summary('insert + commit per request', results['insert_synchronous'])
+
+        start = time.perf_counter()
+        for _ in range(args.rows // 10000 + 1):
+            for _ in range(10000):
+                store.record(*analysis(rng, args.users))
+            store.flush()
+        results['fill_rows_per_second'] = args.rows / (time.perf_counter() - start)
+        print(f"Filled {args.rows} rows at {results['fill_rows_per_second']:.0f} rows/s")
+
+        users = [f'user-{rng.randrange(args.users)}' for _ in range(args.queries)]
+        queries = iter(users * 2)
+        results['recent'] = time_calls(lambda: store.recent(next(queries)), args.queries)
+        results['summary'] = time_calls(lambda: store.summary(next(queries)), args.queries)
+        print_summary('recent (50 rows)', results['recent'])
+        print_summary('summary by verdict and tag', results['summary'])
+
+    write_results(args.output, 'history', results, rows=args.rows, users=args.users, writes=args.writes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Micro-benchmark: model forward pass latency at batch sizes 1-32.
+
+    python -m benchmarks.bench_predict --model food101 --backend tflite
+    python -m benchmarks.bench_predict --model efficientnet --batch-sizes 1 8 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks._common import print_summary, summarize, write_results
+from inference_backends import import_runtime
+
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8, 16, 32)
+
+
+def load_model(name, backend=None):
+    if name == 'efficientnet':
+        from classifiers import build_imagenet_classifier
+        tf = import_runtime('keras')
+        return build_imagenet_classifier(tf), f"tensorflow {tf.__version__}"
+
+    from inference_backends import create_backend
+    model = create_backend(backend)
+    return model, model.runtime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', choices=('food101', 'efficientnet'), default='food101')
+    parser.add_argument('--backend', help='food101 inference backend (defaults to INFERENCE_BACKEND)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model, runtime = load_model(args.model, args.backend)
+    print(f"Loaded {args.model} ({runtime}) in {time.perf_counter() - start:.1f}s")
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in args.batch_sizes:
+        inputs = rng.uniform(0, 1, (batch_size, 224, 224, 3)).astype(np.float32)
+        for _ in range(args.warmup):
+            model.predict_on_batch(inputs)
+
+        latencies = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            model.predict_on_batch(inputs)
+            latencies.append(time.perf_counter() - start)
+
+        summary = summarize(latencies)
+        summary['per_image_ms'] = summary['p50_ms'] / batch_size
+        summary['images_per_second'] = batch_size / (summary['p50_ms'] / 1000)
+        results[f'batch_{batch_size}'] = summary
+        print_summary(f"batch {batch_size}", summary)
+
+    write_results(args.output, 'predict', results, model=args.model, runtime=runtime,
+                  iterations=args.iterations)
+
+
+if __name__ == '__main__':
+    main()
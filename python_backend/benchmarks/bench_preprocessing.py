@@ -0,0 +1,123 @@
+"""Decode + resize time and allocations for large phone photos.
+
+Compares the old per-server preprocessing with the shared pipeline in
+``preprocessing.py`` on a synthetic 12 MP JPEG carrying an EXIF rotation.
+
+    python -m benchmarks.bench_preprocessing --repeat 20
+    python -m benchmarks.bench_preprocessing --image photo.jpg
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from benchmarks._common import load_image_bytes, print_summary, summarize, write_results
+from preprocessing import INPUT_SIZE, batch_buffer, prepare_image, preprocess
+
+EXIF_ORIENTATION = 0x0112
+
+
+def with_orientation(image_bytes, orientation=6):
+    image = Image.open(io.BytesIO(image_bytes))
+    exif = image.getexif()
+    exif[EXIF_ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+def legacy_preprocess(image_bytes):
+    # server.py before the shared module: full decode, float64 divide, expand_dims.
+    image = Image.open(io.BytesIO(image_bytes))
+    img = image.convert('RGB').resize(INPUT_SIZE)
+    img_array = np.array(img) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def shared_preprocess(image_bytes):
+    return preprocess(image_bytes, normalization='unit')[None]
+
+
+def shared_preprocess_into_buffer(image_bytes):
+    inputs = batch_buffer(1)
+    preprocess(image_bytes, normalization='unit', out=inputs[0])
+    return inputs
+
+
+def measure(fn, image_bytes, repeat):
+    fn(image_bytes)
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(image_bytes)
+        latencies.append(time.perf_counter() - start)
+
+    # tracemalloc sees NumPy buffers (not libjpeg's), so this is the array
+    # traffic per call; the decoded size below covers the decoder side.
+    tracemalloc.start()
+    fn(image_bytes)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = summarize(latencies)
+    summary['numpy_peak_kb'] = peak / 1024
+    return summary
+
+
+def decoded_size(image_bytes, draft):
+    image = Image.open(io.BytesIO(image_bytes))
+    if draft:
+        image.draft('RGB', (INPUT_SIZE[0] * 2, INPUT_SIZE[1] * 2))
+    return image.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--image', help='JPEG to use instead of a synthetic 12 MP photo')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    image_bytes = load_image_bytes(args.image, width=4032, height=3024, seed=0)
+    if not args.image:
+        image_bytes = with_orientation(image_bytes)
+
+    candidates = {
+        'legacy': legacy_preprocess,
+        'shared': shared_preprocess,
+        'shared_batch_buffer': shared_preprocess_into_buffer,
+    }
+
+    results = {}
+    for label, fn in candidates.items():
+        results[label] = measure(fn, image_bytes, args.repeat)
+        print_summary(label, results[label])
+
+    full, drafted = decoded_size(image_bytes, draft=False), decoded_size(image_bytes, draft=True)
+    results['decode'] = {
+        'full_size': f"{full[0]}x{full[1]}",
+        'draft_size': f"{drafted[0]}x{drafted[1]}",
+        'decoded_mb_full': full[0] * full[1] * 3 / 1e6,
+        'decoded_mb_draft': drafted[0] * drafted[1] * 3 / 1e6,
+    }
+    print_summary('decode', results['decode'])
+
+    # Orientation 6 means the sensor image must be rotated 90 degrees; the
+    # synthetic gradient runs left-to-right, so after rotation it runs top-to-bottom.
+    oriented = np.asarray(prepare_image(image_bytes), dtype=np.float32)
+    results['exif'] = {
+        'orientation': Image.open(io.BytesIO(image_bytes)).getexif().get(EXIF_ORIENTATION, 1),
+        'vertical_gradient': float(oriented[-1, :, 0].mean() - oriented[0, :, 0].mean()),
+        'horizontal_gradient': float(oriented[:, -1, 0].mean() - oriented[:, 0, 0].mean()),
+    }
+    print_summary('exif', results['exif'])
+
+    write_results(args.output, 'preprocessing', results, repeat=args.repeat, bytes=len(image_bytes))
+
+
+if __name__ == '__main__':
+    main()
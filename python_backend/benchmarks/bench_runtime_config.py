@@ -0,0 +1,135 @@
+"""Sweep worker count, TensorFlow thread pools and XLA for a core count.
+
+Each setting starts ``workers`` processes pinned to the first ``--cores``
+cores, as gunicorn would run them, with the runtime_config.py environment
+for that setting. Every process loads the classifier the way the service
+does, warms up, then all run back-to-back forward passes for the same
+``--seconds`` window. Reported per setting: host throughput and per-call
+latency across all workers. ``intra=0`` is TensorFlow's default (every
+core in every worker), the oversubscribed baseline.
+
+    python -m benchmarks.bench_runtime_config --cores 4
+    python -m benchmarks.bench_runtime_config --cores 8 --workers 1 2 4 8 --intra auto 0 1 --jit
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks._common import BACKEND_DIR, print_summary, summarize, write_results
+
+
+def run_worker(args):
+    from classifiers import create_classifier
+    from startup import StartupTracker
+
+    classifier = create_classifier(args.classifier)
+    classifier.load(StartupTracker())
+    if not classifier.loaded:
+        raise SystemExit(f"{args.classifier} classifier did not load: {classifier.error}")
+
+    inputs = np.random.default_rng(os.getpid()).uniform(0, 1, (args.batch_size, 224, 224, 3)).astype(np.float32)
+    for _ in range(args.warmup):
+        classifier.predict_on_batch(inputs)
+
+    print('ready', flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        classifier.predict_on_batch(inputs)
+        latencies.append(time.perf_counter() - start)
+    print(json.dumps(latencies), flush=True)
+
+
+def run_setting(args, workers, intra, inter, jit):
+    env = {
+        **os.environ,
+        'CPU_CORES': str(args.cores),
+        'WEB_CONCURRENCY': str(workers),
+        'TF_INTRA_OP_THREADS': intra,
+        'TF_INTER_OP_THREADS': inter,
+        'TF_JIT_COMPILE': 'true' if jit else 'false',
+        'TF_CPP_MIN_LOG_LEVEL': '2',
+    }
+    command = [sys.executable, '-m', 'benchmarks.bench_runtime_config', '--worker',
+               '--classifier', args.classifier, '--batch-size', str(args.batch_size),
+               '--seconds', str(args.seconds), '--warmup', str(args.warmup)]
+    cores = set(range(args.cores))
+    processes = [
+        subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         text=True, preexec_fn=lambda: os.sched_setaffinity(0, cores))
+        for _ in range(workers)
+    ]
+
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != 'ready':
+                raise RuntimeError(f"Worker exited with {process.wait()}")
+        # Released together, so every worker contends for the cores at once.
+        for process in processes:
+            process.stdin.write('go\n')
+            process.stdin.flush()
+        latencies = [json.loads(process.stdout.readline()) for process in processes]
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+    summary = summarize([latency for worker in latencies for latency in worker])
+    summary['images_per_second'] = sum(len(worker) for worker in latencies) * args.batch_size / args.seconds
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cores', type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument('--workers', type=int, nargs='+', help='Defaults to 1, 2 and one per core')
+    parser.add_argument('--intra', nargs='+', default=('auto', '0'),
+                        help="Intra-op threads per worker: 'auto' (cores / workers), 0 (TensorFlow default) or a count")
+    parser.add_argument('--inter', nargs='+', default=('auto',))
+    parser.add_argument('--jit', action='store_true', help='Also try each setting with TF_JIT_COMPILE')
+    parser.add_argument('--classifier', choices=('food101', 'imagenet'), default='food101')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args)
+
+    workers = sorted({count for count in args.workers or (1, 2, args.cores) if count <= args.cores})
+    results = {}
+    for count, intra, inter, jit in itertools.product(workers, args.intra, args.inter, (False, True) if args.jit else (False,)):
+        name = f"workers={count} intra={intra} inter={inter}" + (' jit' if jit else '')
+        try:
+            results[name] = run_setting(args, count, intra, inter, jit)
+        except Exception as e:
+            print(f"{name}: failed ({e})")
+            continue
+        print_summary(name, results[name])
+
+    if results:
+        fastest = max(results, key=lambda name: results[name]['images_per_second'])
+        steadiest = min(results, key=lambda name: results[name]['p95_ms'])
+        print(f"\nBest throughput on {args.cores} cores: {fastest} "
+              f"({results[fastest]['images_per_second']:.1f} images/s, p95 {results[fastest]['p95_ms']:.1f} ms)")
+        print(f"Best p95 on {args.cores} cores: {steadiest} "
+              f"({results[steadiest]['images_per_second']:.1f} images/s, p95 {results[steadiest]['p95_ms']:.1f} ms)")
+        results['best'] = {'throughput': fastest, 'p95': steadiest}
+
+    write_results(args.output, 'runtime_config', results, cores=args.cores, classifier=args.classifier,
+                  batch_size=args.batch_size, seconds=args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Test-time augmentation: accuracy gained and latency added per image.
+
+Classifies each image once from the plain resize and once from the TTA
+views (one forward pass over the stack, probabilities averaged), timing
+preprocess + predict for both. With ``--dataset`` (one sub-directory per
+Food-101 class, as for fit_calibration.py) it also reports top-1
+accuracy, the share of images the calibrated policy sends to the ChatGPT
+fallback, and each view's own accuracy. Without it, synthetic photos give
+latency only. The calibration thresholds were fitted on single-view
+probabilities; refit them on TTA output before relying on the fallback rate.
+
+    python -m benchmarks.bench_tta --dataset data/food101_holdout --limit 500
+    python -m benchmarks.bench_tta --views resize flip center --images 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks._common import print_summary, summarize, synthetic_corpus, write_results
+from calibration import Calibration
+from fit_calibration import labeled_images, read_classes
+from inference_backends import create_backend
+from preprocessing import TTA_VIEWS, preprocess, preprocess_views
+
+
+def classify(model, calibration, source, views):
+    """Calibrated top-k of one image and the per-view probabilities; plain resize when ``views`` is None."""
+    start = time.perf_counter()
+    if views is None:
+        inputs = preprocess(source, normalization='unit')[None]
+    else:
+        inputs = preprocess_views(source, views, normalization='unit')
+    per_view = np.asarray(model.predict_on_batch(inputs), dtype=np.float32)
+    candidates = calibration.top_k(per_view.mean(axis=0))
+    return time.perf_counter() - start, candidates, per_view
+
+
+def run(model, calibration, samples, views, warmup):
+    for source, _ in samples[:warmup]:
+        classify(model, calibration, source, views)
+
+    latencies, correct, fallbacks, view_correct = [], [], [], []
+    for source, label in samples:
+        seconds, candidates, per_view = classify(model, calibration, source, views)
+        latencies.append(seconds)
+        if label is not None:
+            correct.append(candidates[0][0] == label)
+            fallbacks.append(calibration.needs_fallback(candidates[0][1], candidates))
+            view_correct.append(per_view.argmax(axis=-1) == label)
+
+    summary = summarize(latencies)
+    if correct:
+        correct, fallbacks = np.asarray(correct), np.asarray(fallbacks)
+        summary.update({
+            'top1_accuracy': float(correct.mean()),
+            'fallback_rate': float(fallbacks.mean()),
+            # Accuracy of what is answered without the fallback.
+            'kept_accuracy': float(correct[~fallbacks].mean()) if (~fallbacks).any() else None
+        })
+    return summary, np.asarray(view_correct)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='Held-out labeled image directory')
+    parser.add_argument('--classes', default='models/food101_classes.txt')
+    parser.add_argument('--backend', help='food101 inference backend (defaults to INFERENCE_BACKEND)')
+    parser.add_argument('--calibration', help='Calibration JSON (defaults to CALIBRATION_PATH)')
+    parser.add_argument('--views', nargs='+', default=TTA_VIEWS)
+    parser.add_argument('--limit', type=int, default=300, help='Labeled images to evaluate')
+    parser.add_argument('--images', type=int, default=30, help='Synthetic images without --dataset')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    if args.dataset:
+        samples = labeled_images(args.dataset, read_classes(args.classes))
+        samples = samples[::max(1, len(samples) // args.limit)][:args.limit]
+    else:
+        samples = [(image, None) for image in synthetic_corpus(args.images)]
+
+    model = create_backend(args.backend)
+    calibration = Calibration.load(args.calibration)
+    print(f"{len(samples)} images, {len(args.views)} views, {model.runtime}")
+
+    single, _ = run(model, calibration, samples, None, args.warmup)
+    tta, view_correct = run(model, calibration, samples, list(args.views), args.warmup)
+    print_summary('single view', single)
+    print_summary(f"tta ({len(args.views)} views)", tta)
+
+    results = {'single': single, 'tta': tta, 'added_p50_ms': tta['p50_ms'] - single['p50_ms']}
+    print(f"TTA adds {results['added_p50_ms']:.1f} ms at p50")
+    if view_correct.size:
+        results['view_accuracy'] = {view: float(view_correct[:, index].mean())
+                                    for index, view in enumerate(args.views)}
+        results['accuracy_gain'] = tta['top1_accuracy'] - single['top1_accuracy']
+        # Fewer fallbacks per 1000 scans is what TTA's extra milliseconds buy.
+        results['fallback_calls_saved_per_1000'] = (single['fallback_rate'] - tta['fallback_rate']) * 1000
+        print_summary('per-view top-1 accuracy', results['view_accuracy'])
+        print(f"Accuracy {results['accuracy_gain']:+.3f}, "
+              f"fallback calls saved per 1000 scans: {results['fallback_calls_saved_per_1000']:.0f}")
+
+    write_results(args.output, 'tta', results, views=list(args.views), images=len(samples),
+                  runtime=model.runtime, labeled=bool(args.dataset))
+
+
+if __name__ == '__main__':
+    main()
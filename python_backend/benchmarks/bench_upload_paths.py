@@ -0,0 +1,141 @@
+"""Bytes in, peak RSS and decode time for service.py's /api upload paths.
+
+Compares the base64 JSON body of /api/analyze-food with the multipart and
+raw-bytes bodies of /api/analyze-food/upload. Each path runs in its own
+subprocess so peak RSS is not shared between them. Only request parsing
+and image decoding are measured; no model is loaded.
+
+    python -m benchmarks.bench_upload_paths --width 4032 --height 3024
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+from starlette.requests import Request
+from urllib3 import encode_multipart_formdata
+
+from benchmarks._common import peak_rss_kb, print_summary, summarize, synthetic_jpeg, write_results
+
+PATHS = ('json_base64', 'multipart', 'octet_stream')
+USER_CONTEXT = {'hasBraces': True, 'dietRestrictions': ['softOnly'], 'recentProcedures': []}
+
+
+def build_request(path, image_bytes):
+    if path == 'json_base64':
+        body = json.dumps({
+            'imageBase64': base64.b64encode(image_bytes).decode('ascii'),
+            'userContext': USER_CONTEXT
+        }).encode()
+        headers = {'content-type': 'application/json'}
+    elif path == 'multipart':
+        body, content_type = encode_multipart_formdata({
+            'image': ('food.jpg', image_bytes, 'image/jpeg'),
+            'userContext': json.dumps(USER_CONTEXT)
+        })
+        headers = {'content-type': content_type}
+    else:
+        body = image_bytes
+        headers = {'content-type': 'application/octet-stream', 'x-user-context': json.dumps(USER_CONTEXT)}
+
+    headers['content-length'] = str(len(body))
+    return body, headers
+
+
+def make_request(body, headers):
+    """An ASGI request whose body arrives in one message, as a buffered proxy delivers it."""
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': '/',
+        'headers': [(name.encode(), value.encode()) for name, value in headers.items()]
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return Request(scope, receive)
+
+
+async def decode(path, request):
+    # Mirrors the parsing done by the corresponding service.py route.
+    if path == 'json_base64':
+        data = await request.json()
+        image = Image.open(io.BytesIO(base64.b64decode(data['imageBase64'])))
+    elif path == 'multipart':
+        form = await request.form()
+        image = Image.open(form['image'].file)
+        json.loads(form['userContext'])
+    else:
+        image = Image.open(io.BytesIO(await request.body()))
+        json.loads(request.headers['x-user-context'])
+
+    image.load()
+    return image.size
+
+
+def run_worker(path, image_path, iterations):
+    with open(image_path, 'rb') as f:
+        image_bytes = f.read()
+    baseline_rss = peak_rss_kb()
+
+    latencies = []
+    body_size = 0
+    for _ in range(iterations):
+        body, headers = build_request(path, image_bytes)
+        body_size = len(body)
+        request = make_request(body, headers)
+        start = time.perf_counter()
+        asyncio.run(decode(path, request))
+        latencies.append(time.perf_counter() - start)
+
+    peak_rss = peak_rss_kb()
+    result = summarize(latencies)
+    result.update({
+        'image_bytes': len(image_bytes),
+        'body_bytes': body_size,
+        'peak_rss_kb': peak_rss,
+        'rss_growth_kb': peak_rss - baseline_rss
+    })
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--worker', choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument('--image', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.image, args.iterations)
+        return
+
+    results = {}
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+        image_file.write(synthetic_jpeg(args.width, args.height))
+        image_file.flush()
+
+        for path in PATHS:
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_upload_paths', '--worker', path,
+                 '--image', image_file.name, '--iterations', str(args.iterations)],
+                check=True, capture_output=True, text=True
+            )
+            results[path] = json.loads(completed.stdout.strip().splitlines()[-1])
+            print_summary(path, results[path])
+
+    write_results(args.output, 'upload_paths', results, width=args.width, height=args.height)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmark: verdict logic of both response shapes.
+
+/api/*: ``determine_verdict`` for Food-101 class names (memoized path),
+free-text names (tagged per call) and the unmemoized ``compute_verdict``.
+/analyze-food: ``determine_dental_safety`` + ``get_safety_reasons`` and
+the whole ``build_analysis`` step on decoded ImageNet candidates.
+
+    python -m benchmarks.bench_verdict --repeat 200
+"""
+import argparse
+import itertools
+import timeit
+
+from benchmarks._common import print_summary, write_results
+from benchmarks.check_food_tags_parity import FREE_TEXT_NAMES, food101_names
+
+USER_CONTEXTS = [
+    {'hasBraces': False, 'dietRestrictions': [], 'recentProcedures': []},
+    {'hasBraces': True, 'dietRestrictions': [], 'recentProcedures': []},
+    {'hasBraces': True, 'dietRestrictions': ['softOnly', 'noSticky'], 'recentProcedures': []},
+    {'hasBraces': False, 'dietRestrictions': ['noHot'], 'recentProcedures': ['extraction']},
+]
+
+APP_CONTEXTS = [(None, None, None), ('true', None, None), ('true', 'soft', 'extraction')]
+
+IMAGENET_FOODS = ['pizza', 'cheeseburger', 'ice_cream', 'bagel', 'pretzel', 'banana', 'carbonara',
+                  'guacamole', 'hotdog', 'french_loaf', 'chocolate_sauce', 'mashed_potato']
+
+
+def imagenet_classifications(count):
+    from classifiers import format_food_name
+
+    foods = itertools.cycle(IMAGENET_FOODS)
+    classifications = []
+    for _ in range(count):
+        candidates = [(format_food_name(next(foods)), 0.6 - rank * 0.1) for rank in range(5)]
+        classifications.append((candidates[0][0], candidates[0][1], 'tensorflow', candidates))
+    return classifications
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    import service
+    import verdicts
+    from food_tags import food_tags
+
+    class_names = food101_names()
+    verdicts.set_class_names(class_names)
+    cases = [(name, context) for name in class_names for context in USER_CONTEXTS]
+    free_text = [(name, context) for name in FREE_TEXT_NAMES for context in USER_CONTEXTS]
+    tag_sets = [food_tags(food) for food in IMAGENET_FOODS]
+    classifications = imagenet_classifications(len(cases))
+
+    def server_verdicts(items):
+        return [
+            verdicts.determine_verdict(name, context['hasBraces'], context['dietRestrictions'],
+                                       context['recentProcedures'])
+            for name, context in items
+        ]
+
+    def server_uncached(items):
+        return [
+            verdicts.compute_verdict(food_tags(name), context['hasBraces'], context['dietRestrictions'],
+                                     context['recentProcedures'])
+            for name, context in items
+        ]
+
+    def app_safety():
+        return [
+            verdicts.get_safety_reasons(
+                verdicts.determine_dental_safety(tags, braces, restrictions), tags, braces, treatment
+            )
+            for tags in tag_sets for braces, restrictions, treatment in APP_CONTEXTS
+        ]
+
+    candidates = {
+        'server_determine_verdict_classes': (lambda: server_verdicts(cases), len(cases)),
+        'server_determine_verdict_free_text': (lambda: server_verdicts(free_text), len(free_text)),
+        'server_compute_verdict_uncached': (lambda: server_uncached(cases), len(cases)),
+        'app_determine_dental_safety': (app_safety, len(tag_sets) * len(APP_CONTEXTS)),
+        'app_build_analysis': (
+            lambda: [service.build_analysis(*row, 'true', None, None) for row in classifications],
+            len(classifications)
+        ),
+    }
+
+    results = {}
+    for label, (fn, calls) in candidates.items():
+        seconds = min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat
+        results[label] = {'calls': calls, 'per_call_us': seconds / calls * 1e6}
+        print_summary(label, results[label])
+
+    write_results(args.output, 'verdict', results, repeat=args.repeat)
+
+
+if __name__ == '__main__':
+    main()
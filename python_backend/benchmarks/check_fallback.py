@@ -0,0 +1,89 @@
+"""Exercise ChatGPTFallback against the local OpenAI stub.
+
+Checks the happy path, the latency budget (including the late-result
+callback), the circuit breaker opening and recovering, and the
+concurrency limit. Exits non-zero on failure.
+
+    python -m benchmarks.check_fallback
+"""
+import sys
+import threading
+import time
+
+from benchmarks.openai_stub import StubConfig, start_stub
+from chatgpt_fallback import CircuitBreaker, ChatGPTFallback
+
+
+def check(condition, message, failures):
+    print(f"  [{'ok' if condition else 'FAIL'}] {message}")
+    if not condition:
+        failures.append(message)
+
+
+def main():
+    failures = []
+    config = StubConfig(food_name='Pizza')
+    server, url = start_stub(config)
+
+    fallback = ChatGPTFallback('test-key', url=url, budget=0.5, timeout=5, max_concurrency=2,
+                               failure_threshold=2, slow_seconds=1.0, cooldown=0.5)
+
+    print("happy path")
+    result = fallback.identify('aGVsbG8=', {})
+    check(result == {'foodName': 'Pizza', 'confidence': 0.85}, f"returns stub answer ({result})", failures)
+
+    print("latency budget")
+    config.latency = 1.0
+    late = threading.Event()
+    start = time.monotonic()
+    result = fallback.identify('aGVsbG8=', {}, on_late_result=lambda _: late.set())
+    waited = time.monotonic() - start
+    check(result is None, "returns None when the budget runs out", failures)
+    check(waited < 0.8, f"caller waited {waited:.2f}s for a 0.5s budget", failures)
+    check(late.wait(3), "late result is delivered to the callback", failures)
+
+    print("circuit breaker")
+    config.latency = 0.0
+    config.status = 500
+    for _ in range(2):
+        fallback.identify('aGVsbG8=', {})
+    check(fallback.breaker.state == CircuitBreaker.OPEN, "opens after consecutive failures", failures)
+
+    sent = config.requests
+    start = time.monotonic()
+    result = fallback.identify('aGVsbG8=', {})
+    check(result is None and config.requests == sent, "skips the upstream while open", failures)
+    check(time.monotonic() - start < 0.05, "open circuit answers immediately", failures)
+
+    config.status = 200
+    time.sleep(0.6)
+    result = fallback.identify('aGVsbG8=', {})
+    check(result is not None and fallback.breaker.state == CircuitBreaker.CLOSED,
+          "half-open probe closes the circuit again", failures)
+
+    print("concurrency limit")
+    config.latency = 1.0
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(fallback.identify('aGVsbG8=', {}, budget=2.0)))
+        for _ in range(4)
+    ]
+    sent = config.requests
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    in_flight = config.requests - sent
+    for thread in threads:
+        thread.join()
+    check(in_flight <= 2, f"at most 2 upstream calls in flight (saw {in_flight})", failures)
+
+    server.shutdown()
+
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll fallback checks passed")
+
+
+if __name__ == '__main__':
+    main()
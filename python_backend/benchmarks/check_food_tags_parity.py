@@ -0,0 +1,263 @@
+"""Parity checks for the compiled food-tag matcher.
+
+Compares food_tags against frozen copies of the substring scans it
+replaced in server.py (determine_verdict) and app.py
+(analyze_food_properties, is_food_related), then compares the verdicts
+both route shapes give every Food-101 class, under every combination of
+context flags, against the verdicts the legacy tags gave. A verdict may
+only change if it is listed in INTENTIONAL_VERDICT_CHANGES, and never to
+a looser one for a softOnly or extraction user. Exits non-zero on any
+unexpected difference; run_suite runs it before the benchmarks and stops
+there when it fails.
+
+    python -m benchmarks.check_food_tags_parity
+    python -m benchmarks.check_food_tags_parity --verbose
+"""
+import argparse
+import itertools
+import os
+import sys
+
+from food_tags import FOOD_PROPERTIES, TAG_ORDER, KeywordMatcher, exclusive, food_tags, food_tags_many
+from verdicts import compute_verdict, determine_dental_safety
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+
+LEGACY_SERVER_KEYWORDS = (
+    ('hard', ['nuts', 'candy', 'popcorn', 'chips', 'cracker', 'carrot', 'apple']),
+    ('sticky', ['caramel', 'taffy', 'gum', 'gummy', 'toffee']),
+    ('chewy', ['bagel', 'jerky', 'steak', 'tough']),
+    ('hot', ['soup', 'coffee', 'tea']),
+    ('cold', ['ice cream', 'popsicle', 'frozen']),
+    ('sugary', ['candy', 'cake', 'cookie', 'soda', 'chocolate']),
+    ('acidic', ['orange', 'lemon', 'lime', 'tomato', 'soda']),
+    ('soft', ['banana', 'yogurt', 'oatmeal', 'smoothie', 'mashed']),
+)
+
+LEGACY_FOOD_KEYWORDS = [
+    'banana', 'orange', 'lemon', 'pineapple', 'strawberry', 'apple', 'pomegranate',
+    'fig', 'granny_smith', 'custard_apple',
+    'broccoli', 'cauliflower', 'mushroom', 'bell_pepper', 'cucumber', 'zucchini',
+    'spaghetti_squash', 'acorn_squash', 'butternut_squash', 'artichoke', 'cabbage',
+    'corn', 'ear',
+    'cheeseburger', 'hamburger', 'hotdog', 'meat_loaf', 'pizza', 'chicken',
+    'carbonara', 'burrito', 'trifle', 'consomme', 'guacamole',
+    'bagel', 'pretzel', 'french_loaf', 'bread', 'croissant', 'dough',
+    'popcorn', 'chip', 'chocolate', 'ice_cream', 'ice_lolly', 'frozen',
+    'cupcake', 'cookie', 'pie', 'cake', 'cream', 'custard', 'pudding',
+    'espresso', 'cup', 'pitcher', 'wine_bottle', 'beer_bottle', 'eggnog',
+    'sushi', 'plate', 'bowl', 'tray', 'platter'
+]
+
+LEGACY_APP_KEYWORDS = {
+    'hard': ['apple', 'carrot', 'nuts', 'chips', 'crackers', 'pretzel', 'bagel',
+             'raw vegetables', 'granola', 'popcorn', 'hard candy', 'ice'],
+    'soft': ['yogurt', 'pudding', 'soup', 'smoothie', 'mashed potato', 'pasta',
+             'bread', 'banana', 'avocado', 'fish', 'eggs', 'oatmeal', 'rice'],
+    'cold': ['ice cream', 'frozen', 'smoothie', 'cold', 'refrigerated'],
+    'hot': ['soup', 'coffee', 'tea', 'pizza', 'hot', 'cooked', 'baked'],
+    'sugary': ['candy', 'cake', 'cookie', 'chocolate', 'donut', 'ice cream',
+               'soda', 'juice', 'fruit', 'dessert', 'sweet'],
+    'sticky': ['caramel', 'taffy', 'gum', 'honey', 'syrup', 'dried fruit'],
+    'acidic': ['lemon', 'lime', 'orange', 'grapefruit', 'tomato', 'vinegar',
+               'soda', 'wine', 'pickles', 'citrus'],
+    'chewy': ['gum', 'caramel', 'taffy', 'dried meat', 'bagel', 'tough meat'],
+}
+
+# Legacy tags the shared knowledge base drops on purpose: the old substring
+# scans matched inside other words ('nuts' in 'donuts', 'gum' in 'gumbo',
+# 'ice' in 'iced').
+INTENTIONAL_REMOVALS = {
+    'Donuts': {'hard'},
+    'Pineapple': {'hard'},
+    'Gumbo': {'sticky', 'chewy'},
+    'Iced Coffee': {'hard'},
+}
+
+# (shape, class) -> why its verdicts differ from the legacy ones. Every
+# entry is stricter than before in every context it changes.
+INTENTIONAL_VERDICT_CHANGES = {
+    ('api', 'Donuts'): "Sticky, chewy dough instead of 'hard' from 'nuts' in 'donuts': braces, softOnly and "
+                       "extraction still avoid, and noSticky now asks for caution",
+    ('api', 'Fried Calamari'): 'Crisp fried coating is hard, as Fried Rice already was on the multipart shape',
+    ('api', 'Fried Rice'): "Kept hard, as app.py tagged it, now from 'fried' rather than 'ice' in 'rice'",
+    ('api', 'Hot Dog'): 'Served hot, as app.py already tagged it: later for noHot, avoid after an extraction',
+    ('api', 'Ice Cream'): "Hard, from app.py's 'ice': avoid with braces, softOnly and after an extraction, "
+                          "as the multipart shape already did",
+    ('api', 'Pizza'): 'Served hot, as app.py already tagged it: later for noHot, avoid after an extraction',
+    ('multipart', 'Fried Calamari'): 'Crisp fried coating is hard',
+    ('multipart', 'Steak'): 'Chewy as server.py tagged it, not only hot: avoid instead of later',
+}
+
+VERDICT_SEVERITY = {'safe': 0, 'caution': 1, 'later': 2, 'avoid': 3}
+
+API_CONTEXTS = [
+    (has_braces, restrictions, procedures)
+    for has_braces in (False, True)
+    for restrictions in itertools.chain.from_iterable(
+        itertools.combinations(('softOnly', 'noSticky', 'noHot', 'noCold'), count) for count in range(5)
+    )
+    for procedures in ((), ('extraction',))
+]
+
+MULTIPART_CONTEXTS = [
+    (has_braces, ','.join(restrictions) or None)
+    for has_braces in (None, 'true')
+    for restrictions in itertools.chain.from_iterable(
+        itertools.combinations(('softonly', 'nohard', 'nosticky', 'nochewy', 'nohot', 'nocold'), count)
+        for count in range(7)
+    )
+]
+
+FREE_TEXT_NAMES = [
+    'Caramel Popcorn', 'Gummy Bears', 'Hard Candy', 'Orange Soda', 'Mashed Potatoes',
+    'Beef Jerky', 'Iced Coffee', 'Frozen Yogurt Bar', 'Carrot Sticks', 'Rice Cakes',
+    'Pineapple', 'Gumbo', 'Sweet Tea', 'Toffee Apple', 'Lemon Sorbet', 'Tough Meat',
+    'Chocolate Chip Cookies', 'Ice Cream Sandwich', 'Banana Smoothie', 'Tomato Soup',
+]
+
+IMAGENET_NAMES = [
+    'granny_smith', 'custard_apple', 'ice_lolly', 'hotdog', 'meat_loaf', 'french_loaf',
+    'wine_bottle', 'beer_bottle', 'bearskin', 'pear', 'cup', 'teapot', 'plate_rack',
+    'corn', 'ear', 'chiffonier', 'dough', 'trifle', 'tabby', 'pizza', 'goldfish',
+]
+
+
+def legacy_server_tags(food_name):
+    food_lower = food_name.lower()
+    return [tag for tag, words in LEGACY_SERVER_KEYWORDS if any(word in food_lower for word in words)]
+
+
+def legacy_app_tags(food_name):
+    # app.py chose hard or soft, and cold or hot, but never both.
+    food_lower = food_name.lower()
+    matched = {tag: any(word in food_lower for word in words) for tag, words in LEGACY_APP_KEYWORDS.items()}
+    matched['soft'] &= not matched['hard']
+    matched['hot'] &= not matched['cold']
+    return [tag for tag in ('hard', 'soft', 'cold', 'hot', 'sugary', 'sticky', 'acidic', 'chewy') if matched[tag]]
+
+
+def legacy_is_food_related(class_name):
+    class_lower = class_name.lower()
+    return any(keyword in class_lower for keyword in LEGACY_FOOD_KEYWORDS)
+
+
+def reference_tags(food_name):
+    """Naive scan over the shared knowledge base, one regex per keyword."""
+    import re
+
+    text = food_name.lower().replace('_', ' ')
+    found = {
+        tag for tag, keywords in FOOD_PROPERTIES.items()
+        for keyword in keywords
+        if re.search(rf'\b{re.escape(keyword)}(?:e?s)?\b', text)
+    }
+    return exclusive([tag for tag in TAG_ORDER if tag in found])
+
+
+def food101_names():
+    path = os.path.join(MODELS_DIR, 'food101_classes.txt')
+    with open(path) as f:
+        return [line.strip().replace('_', ' ').title() for line in f if line.strip()]
+
+
+def verdict_changes(name):
+    """(shape, context, legacy verdict, new verdict) for every context where the verdict changed."""
+    tags, server_tags, app_tags = food_tags(name), legacy_server_tags(name), legacy_app_tags(name)
+    changes = []
+    for has_braces, restrictions, procedures in API_CONTEXTS:
+        legacy = compute_verdict(server_tags, has_braces, restrictions, procedures)[0]
+        new = compute_verdict(tags, has_braces, restrictions, procedures)[0]
+        if new != legacy:
+            context = {'hasBraces': has_braces, 'dietRestrictions': list(restrictions), 'recentProcedures': list(procedures)}
+            changes.append(('api', context, legacy, new))
+    for has_braces, restrictions in MULTIPART_CONTEXTS:
+        legacy = determine_dental_safety(app_tags, has_braces, restrictions)
+        new = determine_dental_safety(tags, has_braces, restrictions)
+        if new != legacy:
+            changes.append(('multipart', {'has_braces': has_braces, 'dietary_restrictions': restrictions}, legacy, new))
+    return changes
+
+
+def protected(shape, context):
+    """Whether the context belongs to a softOnly or extraction user, whose verdicts must never loosen."""
+    if shape == 'api':
+        return 'softOnly' in context['dietRestrictions'] or 'extraction' in context['recentProcedures']
+    return 'softonly' in (context['dietary_restrictions'] or '').split(',')
+
+
+def check_verdicts(names):
+    failures = []
+    changed = set()
+    for name in names:
+        for shape, context, legacy, new in verdict_changes(name):
+            changed.add((shape, name))
+            looser = VERDICT_SEVERITY[new] < VERDICT_SEVERITY[legacy]
+            if looser and protected(shape, context):
+                failures.append(f"{shape} verdict for {name!r} loosened {legacy} -> {new} under {context}")
+            elif looser or (shape, name) not in INTENTIONAL_VERDICT_CHANGES:
+                failures.append(f"{shape} verdict for {name!r} changed {legacy} -> {new} under {context}")
+
+    for shape, name in sorted(set(INTENTIONAL_VERDICT_CHANGES) - changed):
+        failures.append(f"{shape} verdicts for {name!r} are listed as changed but match the legacy ones")
+    return failures
+
+
+def check(failures, label, found):
+    print(f"  [{'ok' if not found else 'FAIL'}] {label}")
+    failures += found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='Also list tags added and intentional verdict changes')
+    args = parser.parse_args()
+
+    failures = []
+    names = food101_names() + FREE_TEXT_NAMES
+    classes = food101_names()
+
+    check(failures, 'compiled matcher matches the reference scan', [
+        f"matcher != reference scan for {name!r}: {food_tags(name)} vs {reference_tags(name)}"
+        for name in names if food_tags(name) != reference_tags(name)
+    ])
+    check(failures, 'no legacy tags lost beyond INTENTIONAL_REMOVALS', [
+        f"{name!r} lost legacy {source} tags {sorted(missing)}"
+        for name in names
+        for source, legacy_tags in (('server', legacy_server_tags), ('app', legacy_app_tags))
+        for missing in [set(legacy_tags(name)) - set(food_tags(name)) - INTENTIONAL_REMOVALS.get(name, set())]
+        if missing
+    ])
+    check(failures, 'food_tags_many agrees with food_tags',
+          [] if food_tags_many(names) == [food_tags(name) for name in names]
+          else ['food_tags_many disagrees with food_tags'])
+    check(failures, f"{len(classes)} classes x {len(API_CONTEXTS)} /api and {len(MULTIPART_CONTEXTS)} multipart "
+                    f"contexts: verdicts match or are listed, never looser for softOnly or extraction",
+          check_verdicts(classes))
+
+    imagenet_matcher = KeywordMatcher({keyword: {'food'} for keyword in LEGACY_FOOD_KEYWORDS}, whole_words=False)
+    check(failures, 'is_food_related unchanged for ImageNet classes', [
+        f"is_food_related differs for {class_name!r}"
+        for class_name in IMAGENET_NAMES
+        if imagenet_matcher.search(class_name) != legacy_is_food_related(class_name)
+    ])
+
+    if args.verbose:
+        print("\nTags added relative to the legacy server.py scan:")
+        for name in names:
+            added = sorted(set(food_tags(name)) - set(legacy_server_tags(name)))
+            if added:
+                print(f"  {name:28} +{added}")
+        print("\nIntentional verdict changes:")
+        for (shape, name), reason in sorted(INTENTIONAL_VERDICT_CHANGES.items()):
+            print(f"  {shape:9} {name:16} {reason}")
+
+    if failures:
+        print(f"\n{len(failures)} parity failure(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll food tag parity checks passed")
+
+if __name__ == '__main__':
+    main()
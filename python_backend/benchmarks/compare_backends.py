@@ -0,0 +1,161 @@
+"""Accuracy delta, latency and RSS of the Keras vs TFLite inference backends.
+
+The labeled set is a directory with one sub-directory per Food-101 class
+(``apple_pie/``, ``pizza/`` ...) holding images. Without ``--dataset``,
+synthetic images are used and only agreement between backends is reported.
+Each backend runs in its own subprocess so RSS and import cost are not
+shared.
+
+    python -m benchmarks.compare_backends --dataset data/food101_val --limit 500
+    python -m benchmarks.compare_backends --backend keras:models/food101_model.keras \\
+        --backend tflite:models/food101_int8.tflite
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from benchmarks._common import peak_rss_kb, print_summary, summarize, synthetic_jpeg, write_results
+
+DEFAULT_BACKENDS = ('keras', 'tflite')
+
+
+def current_rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return None
+
+
+def labeled_images(dataset, classes, limit):
+    index = {name: position for position, name in enumerate(classes)}
+    samples = []
+    for class_name in sorted(os.listdir(dataset)):
+        class_dir = os.path.join(dataset, class_name)
+        if class_name not in index or not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            samples.append((os.path.join(class_dir, name), index[class_name]))
+
+    # Interleave classes so a --limit still covers many of them.
+    samples.sort(key=lambda sample: (zlib.crc32(os.path.basename(sample[0]).encode()) % 1000, sample[0]))
+    return samples[:limit] if limit else samples
+
+
+def run_worker(spec, manifest_path, probs_path):
+    import_start = time.perf_counter()
+    rss_before = current_rss_kb()
+    from inference_backends import create_backend
+    from preprocessing import preprocess
+
+    name, _, model_path = spec.partition(':')
+    backend = create_backend(name, model_path or None)
+    load_time = time.perf_counter() - import_start
+    rss_loaded = current_rss_kb()
+
+    with open(manifest_path) as f:
+        paths = [sample[0] for sample in json.load(f)]
+
+    backend.predict_on_batch(preprocess(paths[0], normalization='unit')[np.newaxis])
+
+    latencies, rows = [], []
+    for path in paths:
+        inputs = preprocess(path, normalization='unit')[np.newaxis]
+        start = time.perf_counter()
+        outputs = backend.predict_on_batch(inputs)
+        latencies.append(time.perf_counter() - start)
+        rows.append(np.asarray(outputs, dtype=np.float32)[0])
+
+    np.save(probs_path, np.stack(rows))
+
+    result = summarize(latencies)
+    result.update({
+        'runtime': backend.runtime,
+        'load_seconds': load_time,
+        'rss_before_load_kb': rss_before,
+        'rss_after_load_kb': rss_loaded,
+        'peak_rss_kb': peak_rss_kb(),
+    })
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='Labeled image directory (one folder per class)')
+    parser.add_argument('--classes', default='models/food101_classes.txt')
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--backend', action='append',
+                        help='name[:model_path]; repeatable, default keras and tflite')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--manifest', help=argparse.SUPPRESS)
+    parser.add_argument('--probs', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.manifest, args.probs)
+        return
+
+    with open(args.classes) as f:
+        classes = [line.strip() for line in f if line.strip()]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.dataset:
+            samples = labeled_images(args.dataset, classes, args.limit)
+        else:
+            samples = []
+            for index in range(min(args.limit, 50)):
+                path = os.path.join(workdir, f'synthetic{index}.jpg')
+                with open(path, 'wb') as f:
+                    f.write(synthetic_jpeg(640, 480, seed=index))
+                samples.append((path, None))
+
+        manifest_path = os.path.join(workdir, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            json.dump(samples, f)
+
+        labels = np.array([label if label is not None else -1 for _, label in samples])
+        results, probabilities = {}, {}
+
+        for spec in args.backend or DEFAULT_BACKENDS:
+            probs_path = os.path.join(workdir, f'{len(probabilities)}.npy')
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.compare_backends', '--worker', spec,
+                 '--manifest', manifest_path, '--probs', probs_path],
+                capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                print(f"{spec} failed:\n{completed.stderr.strip()}")
+                continue
+
+            results[spec] = json.loads(completed.stdout.strip().splitlines()[-1])
+            probabilities[spec] = np.load(probs_path)
+
+            if args.dataset:
+                results[spec]['top1_accuracy'] = float(np.mean(probabilities[spec].argmax(axis=1) == labels))
+
+    reference = next(iter(probabilities), None)
+    for spec, probs in probabilities.items():
+        if spec == reference:
+            continue
+        results[spec]['top1_agreement'] = float(np.mean(probs.argmax(axis=1) == probabilities[reference].argmax(axis=1)))
+        results[spec]['mean_abs_prob_delta'] = float(np.mean(np.abs(probs - probabilities[reference])))
+        if args.dataset:
+            results[spec]['accuracy_delta'] = results[spec]['top1_accuracy'] - results[reference]['top1_accuracy']
+
+    for spec, summary in results.items():
+        print_summary(spec, summary)
+
+    write_results(args.output, 'compare_backends', results,
+                  dataset=args.dataset, samples=len(samples), reference=reference)
+
+
+if __name__ == '__main__':
+    main()
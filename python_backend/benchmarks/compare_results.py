@@ -0,0 +1,85 @@
+"""Compare two benchmark runs written by ``run_suite`` or any single benchmark.
+
+Prints every numeric metric present in both runs with its relative change.
+Latency-like metrics (``*_ms``, ``*_us``, ``*_kb``, ``*_mb``) are flagged when they grow
+by more than ``--threshold``; throughput-like ones when they shrink by more.
+
+    python -m benchmarks.compare_results results/baseline results/20240101-120000
+    python -m benchmarks.compare_results old/loadgen.json new/loadgen.json --threshold 0.05
+"""
+import argparse
+import json
+import os
+import sys
+
+LOWER_IS_BETTER = ('_ms', '_us', '_kb', '_mb', '_seconds', 'errors')
+
+
+def load_run(path):
+    """Map ``benchmark.json`` file names to their ``results`` payloads."""
+    if os.path.isdir(path):
+        files = sorted(name for name in os.listdir(path) if name.endswith('.json'))
+        paths = [os.path.join(path, name) for name in files]
+    else:
+        paths = [path]
+
+    run = {}
+    for file_path in paths:
+        with open(file_path) as f:
+            run[os.path.splitext(os.path.basename(file_path))[0]] = json.load(f).get('results', {})
+    return run
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def compare(old, new, threshold):
+    rows, regressions = [], []
+    for benchmark in sorted(set(old) & set(new)):
+        old_metrics = dict(flatten(old[benchmark]))
+        for metric, new_value in flatten(new[benchmark]):
+            if metric not in old_metrics or metric.endswith('count'):
+                continue
+            old_value = old_metrics[metric]
+            change = (new_value - old_value) / old_value if old_value else None
+            name = f"{benchmark}.{metric}"
+            rows.append((name, old_value, new_value, change))
+
+            if change is None:
+                continue
+            lower_is_better = any(part in metric for part in LOWER_IS_BETTER)
+            if (change > threshold) if lower_is_better else (change < -threshold):
+                regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline', help='Result directory or JSON file')
+    parser.add_argument('candidate', help='Result directory or JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change counted as a regression')
+    args = parser.parse_args()
+
+    rows, regressions = compare(load_run(args.baseline), load_run(args.candidate), args.threshold)
+    if not rows:
+        print('No metrics in common')
+        return
+
+    width = max(len(name) for name, *_ in rows)
+    for name, old_value, new_value, change in rows:
+        marker = ' !' if name in regressions else ''
+        delta = f"{change:+.1%}" if change is not None else 'n/a'
+        print(f"{name:<{width}}  {old_value:>12.2f}  {new_value:>12.2f}  {delta:>8}{marker}")
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
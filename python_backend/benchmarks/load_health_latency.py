@@ -0,0 +1,109 @@
+"""/health latency of app.py while /analyze-food inferences are running.
+
+Measures /health on an idle server first, then again while --concurrency
+clients keep uploading images. With inference off the event loop the two
+distributions should be close; 503 rejections are counted separately.
+
+    python -m benchmarks.load_health_latency --url http://localhost:8000 --concurrency 32
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from benchmarks._common import load_image_bytes, print_summary, summarize, write_results
+
+
+def poll_health(url, duration, interval):
+    session = requests.Session()
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        session.get(f"{url}/health", timeout=30).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(interval)
+
+    return latencies
+
+
+def upload_loop(url, image_bytes, stop, statuses, latencies, lock):
+    session = requests.Session()
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"{url}/analyze-food",
+                files={'file': ('food.jpg', image_bytes, 'image/jpeg')},
+                timeout=120
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+
+        if status == 503:
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--image', help='JPEG to upload (default: synthetic)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    image_bytes = load_image_bytes(args.image)
+
+    idle = poll_health(args.url, min(args.duration, 5.0), args.interval)
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    statuses = Counter()
+    analyze_latencies = []
+    workers = [
+        threading.Thread(
+            target=upload_loop,
+            args=(args.url, image_bytes, stop, statuses, analyze_latencies, lock),
+            daemon=True
+        )
+        for _ in range(args.concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+
+    loaded = poll_health(args.url, args.duration, args.interval)
+
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    results = {
+        'health_idle': summarize(idle),
+        'health_under_load': summarize(loaded),
+        'analyze_food': summarize(analyze_latencies, args.duration),
+        'analyze_status_counts': {str(status): count for status, count in statuses.items()}
+    }
+
+    print_summary('/health (idle)', results['health_idle'])
+    print_summary('/health (under load)', results['health_under_load'])
+    print_summary('/analyze-food (200s)', results['analyze_food'])
+    print(f"status counts: {results['analyze_status_counts']}")
+    write_results(args.output, 'load_health_latency', results,
+                  url=args.url, concurrency=args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
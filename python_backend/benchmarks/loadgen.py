@@ -0,0 +1,120 @@
+"""End-to-end load generator for the service's two route shapes.
+
+``server`` posts raw bytes to /api/analyze-food/upload on the gunicorn
+deployment (server.py); ``app`` posts multipart to /analyze-food on the
+local ImageNet server (app.py). Replays a corpus of synthetic JPEGs (or
+``--image-dir``) with ``--concurrency`` closed-loop clients and reports
+throughput and p50/p95/p99 latency per target. Servers are started
+locally on a free port unless a URL is given.
+
+    python -m benchmarks.loadgen --requests 400 --concurrency 8
+    python -m benchmarks.loadgen --target server --server-url http://localhost:5000 --output results/server.json
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks._common import print_summary, running_server, summarize, synthetic_corpus, write_results
+
+ROUTES = {
+    'server': lambda session, url, image: session.post(
+        f"{url}/api/analyze-food/upload", data=image, headers={'Content-Type': 'image/jpeg'}, timeout=120
+    ),
+    'app': lambda session, url, image: session.post(
+        f"{url}/analyze-food", files={'file': ('food.jpg', image, 'image/jpeg')}, timeout=120
+    ),
+}
+
+
+def load_corpus(image_dir, size, seed):
+    if not image_dir:
+        return synthetic_corpus(size, seed=seed)
+
+    corpus = []
+    for name in sorted(os.listdir(image_dir)):
+        if name.lower().endswith(('.jpg', '.jpeg')):
+            with open(os.path.join(image_dir, name), 'rb') as f:
+                corpus.append(f.read())
+    return corpus[:size] if size else corpus
+
+
+def run_load(target, url, corpus, total_requests, concurrency, warmup):
+    post = ROUTES[target]
+    local = threading.local()
+    counter = itertools.count()
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    for image in corpus[:warmup]:
+        post(session(), url, image)
+
+    def client():
+        while True:
+            index = next(counter)
+            if index >= total_requests:
+                return
+            start = time.perf_counter()
+            try:
+                status = post(session(), url, corpus[index % len(corpus)]).status_code
+            except requests.RequestException:
+                status = 'connection_error'
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(latencies, wall_time)
+    summary['errors'] = {str(status): count for status, count in statuses.items() if status != 200}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', nargs='+', choices=tuple(ROUTES), default=list(ROUTES))
+    parser.add_argument('--server-url', help='Use a running server.py instead of starting one')
+    parser.add_argument('--app-url', help='Use a running app.py instead of starting one')
+    parser.add_argument('--image-dir', help='Replay these JPEGs instead of synthetic ones')
+    parser.add_argument('--corpus-size', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.image_dir, args.corpus_size, args.seed)
+    urls = {'server': args.server_url, 'app': args.app_url}
+
+    results = {}
+    for target in args.target:
+        if urls[target]:
+            results[target] = run_load(target, urls[target], corpus, args.requests, args.concurrency, args.warmup)
+        else:
+            with running_server(target) as url:
+                results[target] = run_load(target, url, corpus, args.requests, args.concurrency, args.warmup)
+        print_summary(f"{target} ({args.concurrency} clients)", results[target])
+
+    write_results(args.output, 'loadgen', results, requests=args.requests, concurrency=args.concurrency,
+                  corpus=len(corpus), image_dir=args.image_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Per-worker memory of gunicorn with local models vs the shared model server.
+
+Starts ``gunicorn server:app`` once with every worker loading its own
+model (``INFERENCE_BACKEND=<backend>``) and once with
+``INFERENCE_BACKEND=remote``, warms every worker with a few requests, then
+reads RSS and PSS (shared pages split across the processes that map them)
+for the master, each worker and the model server.
+
+    python -m benchmarks.measure_worker_rss --workers 4 --backend keras
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks._common import print_summary, synthetic_jpeg, write_results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def memory_kb(pid):
+    usage = {}
+    for path, keys in ((f'/proc/{pid}/status', ('VmRSS',)), (f'/proc/{pid}/smaps_rollup', ('Pss',))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key = line.split(':')[0]
+                    if key in keys:
+                        usage[key.lower()] = int(line.split()[1])
+        except OSError:
+            pass
+    return {'rss_kb': usage.get('vmrss'), 'pss_kb': usage.get('pss')}
+
+
+def command_line(pid):
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return f.read().replace(b'\0', b' ').decode()
+    except OSError:
+        return ''
+
+
+def wait_for_health(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/api/health", timeout=2).json().get('model_loaded'):
+                return
+        except (requests.RequestException, ValueError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} did not report a loaded model within {timeout:.0f}s")
+
+
+def measure(mode, backend, workers, warmup_requests, timeout):
+    env = dict(os.environ)
+    port = free_port()
+    if mode == 'remote':
+        env.update({'INFERENCE_BACKEND': 'remote', 'MODEL_SERVER_BACKEND': backend,
+                    'MODEL_SERVER_SOCKET': f'/tmp/brightbite-bench-{port}.sock'})
+    else:
+        env['INFERENCE_BACKEND'] = backend
+
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'server:app', '--workers', str(workers),
+         '--bind', f'127.0.0.1:{port}', '--timeout', str(int(timeout))],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    try:
+        wait_for_health(url, timeout)
+        session = requests.Session()
+        for index in range(warmup_requests * workers):
+            session.post(f"{url}/api/analyze-food/upload", data=synthetic_jpeg(640, 480, seed=index),
+                         headers={'Content-Type': 'image/jpeg'}, timeout=60)
+
+        result = {'master': memory_kb(master.pid), 'workers': [], 'model_server': None}
+        for pid in children(master.pid):
+            if 'model_server.py' in command_line(pid):
+                result['model_server'] = memory_kb(pid)
+            else:
+                result['workers'].append(memory_kb(pid))
+
+        processes = [result['master']] + result['workers'] + ([result['model_server']] if result['model_server'] else [])
+        worker_rss = [usage['rss_kb'] for usage in result['workers'] if usage['rss_kb']]
+        return {
+            'workers': len(result['workers']),
+            'mean_worker_rss_mb': sum(worker_rss) / len(worker_rss) / 1024 if worker_rss else None,
+            'model_server_rss_mb': (result['model_server']['rss_kb'] / 1024) if result['model_server'] else None,
+            'total_rss_mb': sum(usage['rss_kb'] or 0 for usage in processes) / 1024,
+            'total_pss_mb': sum(usage['pss_kb'] or 0 for usage in processes) / 1024,
+            'processes': result
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--backend', default='keras', help='Backend the model is served with (keras or tflite)')
+    parser.add_argument('--warmup-requests', type=int, default=3, help='Requests per worker before measuring')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('local', 'remote'):
+        results[mode] = measure(mode, args.backend, args.workers, args.warmup_requests, args.timeout)
+        print_summary(f"{mode} ({args.backend})", {key: value for key, value in results[mode].items()
+                                                   if key != 'processes'})
+
+    write_results(args.output, 'worker_rss', results, workers=args.workers, backend=args.backend)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers every POST with a fixed food name after an optional delay, or with
+an error status, so the ChatGPT fallback can be exercised without network
+access or cost. Point the server at it with:
+
+    python -m benchmarks.openai_stub --port 8099 --latency 0.5 &
+    OPENAI_API_KEY=test OPENAI_API_URL=http://127.0.0.1:8099/v1/chat/completions python server.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubConfig:
+    def __init__(self, food_name='Pizza', latency=0.0, status=200):
+        self.food_name = food_name
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            self.rfile.read(length)
+            config.requests += 1
+
+            if config.latency:
+                time.sleep(config.latency)
+
+            if config.status == 200:
+                body = json.dumps({
+                    'choices': [{'message': {'role': 'assistant', 'content': config.food_name}}]
+                }).encode()
+            else:
+                body = json.dumps({'error': {'message': 'stub error'}}).encode()
+
+            self.send_response(config.status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(config, host='127.0.0.1', port=0):
+    """Start the stub on a background thread; returns (server, url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--food', default='Pizza')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--status', type=int, default=200)
+    args = parser.parse_args()
+
+    server, url = start_stub(StubConfig(args.food, args.latency, args.status), port=args.port)
+    print(f"OpenAI stub listening at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Replay a labeled image set through the old and calibrated fallback policies.
+
+Counts how many images each policy would send to ChatGPT and the accuracy
+it would reach, with the fallback assumed right ``--fallback-accuracy`` of
+the time. Use a labeled set that was not used by ``fit_calibration.py``.
+
+    python -m benchmarks.replay_fallback_policy --dataset data/food101_test --limit 2000
+    python -m benchmarks.replay_fallback_policy --predictions test.npz --calibration models/calibration.json
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks._common import print_summary, write_results
+from calibration import CALIBRATION_PATH, DEFAULT_CONFIDENCE_THRESHOLD, TOP_K, Calibration
+from fit_calibration import collect_predictions, load_predictions, read_classes
+
+
+def replay(probabilities, labels, calibration, fallback_accuracy, top_k):
+    calibrated = calibration.calibrate(probabilities)
+    order = np.argsort(-calibrated, axis=1)
+    top1 = calibrated[np.arange(len(labels)), order[:, 0]]
+    top2 = calibrated[np.arange(len(labels)), order[:, 1]]
+
+    keep = (top1 >= calibration.confidence_threshold) & (top1 - top2 >= calibration.margin_threshold)
+    correct = order[:, 0] == labels
+    fallbacks = int((~keep).sum())
+
+    return {
+        'images': int(len(labels)),
+        'fallback_calls': fallbacks,
+        'fallback_rate': fallbacks / len(labels),
+        'local_accuracy': float(correct[keep].mean()) if keep.any() else None,
+        'expected_accuracy': float((correct & keep).mean() + fallback_accuracy * fallbacks / len(labels)),
+        'model_top1_accuracy': float(correct.mean()),
+        f'top{top_k}_recall': float(np.mean(np.any(order[:, :top_k] == labels[:, None], axis=1))),
+        'mean_confidence': float(top1.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='Labeled image directory (one folder per class)')
+    parser.add_argument('--predictions', help='Probabilities saved by fit_calibration.py --save-predictions')
+    parser.add_argument('--classes', default='models/food101_classes.txt')
+    parser.add_argument('--backend', help='Inference backend (defaults to INFERENCE_BACKEND)')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--calibration', default=CALIBRATION_PATH)
+    parser.add_argument('--fallback-accuracy', type=float, default=0.9)
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    if args.predictions:
+        probabilities, labels = load_predictions(args.predictions)
+    elif args.dataset:
+        probabilities, labels = collect_predictions(
+            args.dataset, read_classes(args.classes), args.backend, limit=args.limit
+        )
+    else:
+        parser.error('pass --dataset or --predictions')
+
+    policies = {
+        'legacy': Calibration(1.0, DEFAULT_CONFIDENCE_THRESHOLD, 0.0),
+        'calibrated': Calibration.load(args.calibration),
+    }
+
+    results = {}
+    for label, calibration in policies.items():
+        results[label] = replay(probabilities, labels, calibration, args.fallback_accuracy, args.top_k)
+        results[label].update({
+            'temperature': calibration.temperature,
+            'confidence_threshold': calibration.confidence_threshold,
+            'margin_threshold': calibration.margin_threshold,
+        })
+        print_summary(label, results[label])
+
+    saved = results['legacy']['fallback_calls'] - results['calibrated']['fallback_calls']
+    accuracy_delta = results['calibrated']['expected_accuracy'] - results['legacy']['expected_accuracy']
+    print(f"Fallback calls saved: {saved} ({saved / len(labels):.1%} of images), "
+          f"accuracy change {accuracy_delta:+.3f}")
+
+    write_results(args.output, 'fallback_policy', results,
+                  dataset=args.dataset, calibration=args.calibration, fallback_accuracy=args.fallback_accuracy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Run the offline benchmark suite and collect the JSON results in one directory.
+
+Each benchmark runs in its own interpreter so model loads and caches from
+one cannot skew the next. The CHECKS run first; if one fails, no benchmark
+runs and the suite exits non-zero. Compare two runs with ``compare_results``.
+
+    python -m benchmarks.run_suite
+    python -m benchmarks.run_suite --quick --skip loadgen --results-dir results/baseline
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks._common import BACKEND_DIR
+
+# Correctness gates: a faster build that changes answers is not compared.
+CHECKS = {
+    'food_tags_parity': ['benchmarks.check_food_tags_parity'],
+}
+
+SUITE = {
+    'preprocessing': ['benchmarks.bench_preprocessing'],
+    'verdict': ['benchmarks.bench_verdict'],
+    'predict_food101': ['benchmarks.bench_predict', '--model', 'food101'],
+    'predict_efficientnet': ['benchmarks.bench_predict', '--model', 'efficientnet'],
+    'embedding_index': ['benchmarks.bench_embedding_index'],
+    'tta': ['benchmarks.bench_tta'],
+    'runtime_config': ['benchmarks.bench_runtime_config'],
+    'history': ['benchmarks.bench_history'],
+    'loadgen': ['benchmarks.loadgen'],
+}
+
+# Smaller runs for a quick before/after check.
+QUICK_ARGS = {
+    'preprocessing': ['--repeat', '5'],
+    'verdict': ['--repeat', '50'],
+    'predict_food101': ['--iterations', '5'],
+    'predict_efficientnet': ['--iterations', '5'],
+    'embedding_index': ['--sizes', '10000', '--dim', '256', '--queries', '30'],
+    'tta': ['--images', '10'],
+    'runtime_config': ['--seconds', '3'],
+    'history': ['--rows', '20000', '--writes', '500'],
+    'loadgen': ['--requests', '50', '--corpus-size', '16'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results-dir', help='Defaults to results/<timestamp>')
+    parser.add_argument('--only', nargs='+', choices=tuple(SUITE))
+    parser.add_argument('--skip', nargs='+', choices=tuple(SUITE), default=[])
+    parser.add_argument('--quick', action='store_true', help='Fewer iterations and requests')
+    args = parser.parse_args()
+
+    results_dir = args.results_dir or os.path.join('results', time.strftime('%Y%m%d-%H%M%S'))
+    names = [name for name in (args.only or SUITE) if name not in args.skip]
+
+    for name, command in CHECKS.items():
+        print(f"\n=== check: {name} ===", flush=True)
+        if subprocess.run([sys.executable, '-m', *command], cwd=BACKEND_DIR).returncode != 0:
+            print(f"Check {name} failed; not running the benchmarks")
+            sys.exit(1)
+
+    failed = []
+    for name in names:
+        output = os.path.abspath(os.path.join(results_dir, f"{name}.json"))
+        command = [sys.executable, '-m', *SUITE[name], '--output', output]
+        if args.quick:
+            command += QUICK_ARGS[name]
+
+        print(f"\n=== {name} ===", flush=True)
+        if subprocess.run(command, cwd=BACKEND_DIR).returncode != 0:
+            failed.append(name)
+
+    print(f"\nResults in {results_dir}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Build or extend the reference embedding index (see embedding_index.py).
+
+    python build_embedding_index.py --dataset data/reference_foods
+    python build_embedding_index.py --dataset data/new_foods --append
+    python build_embedding_index.py --train-ivf --ivf-lists 1024 --pq-subvectors 32
+
+The dataset has one sub-directory per food (``pho/``, ``mochi/`` ...);
+the directory name becomes the food's display name. Images are embedded
+with the ImageNet classifier's pooled EfficientNetB0 features. ``--append``
+adds images to an existing index, new foods included, without touching the
+existing rows or retraining IVF-PQ. ``--train-ivf`` fits IVF-PQ on the
+index for large reference sets; small ones are searched exactly.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from classifiers import ImageNetClassifier, class_display_name
+from embedding_index import EMBEDDING_INDEX_PATH, append_embeddings, create_index, read_metadata, train_ivf
+from preprocessing import batch_buffer, preprocess
+from startup import StartupTracker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def labeled_images(dataset):
+    samples = []
+    for food in sorted(os.listdir(dataset)):
+        food_dir = os.path.join(dataset, food)
+        if not os.path.isdir(food_dir):
+            continue
+        for name in sorted(os.listdir(food_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(food_dir, name), class_display_name(food)))
+    return samples
+
+
+def embed_dataset(dataset, output, batch_size=32):
+    classifier = ImageNetClassifier()
+    classifier.load(StartupTracker('embedding model', log=print))
+
+    samples = labeled_images(dataset)
+    count = 0
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        inputs = batch_buffer(len(chunk))
+        kept = []
+        for row, (path, food) in enumerate(chunk):
+            try:
+                preprocess(path, normalization=classifier.normalization, out=inputs[row])
+                kept.append(row)
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+
+        if kept:
+            outputs = classifier.predict_on_batch(inputs if len(kept) == len(chunk) else inputs[kept])
+            embeddings = np.stack([classifier.embedding(row) for row in classifier.split_batch(outputs)])
+            count = append_embeddings(output, embeddings, [chunk[row][1] for row in kept])
+
+        print(f"  {min(start + batch_size, len(samples))}/{len(samples)} images", end='\r')
+
+    print()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='Labeled reference image directory')
+    parser.add_argument('--output', default=EMBEDDING_INDEX_PATH)
+    parser.add_argument('--append', action='store_true', help='Add to the existing index instead of replacing it')
+    parser.add_argument('--dim', type=int, default=1280, help='Embedding dimension (EfficientNetB0 avg_pool)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--train-ivf', action='store_true', help='Fit IVF-PQ on the index')
+    parser.add_argument('--ivf-lists', type=int, help='Coarse lists (default: 4 * sqrt(rows))')
+    parser.add_argument('--pq-subvectors', type=int, default=32)
+    args = parser.parse_args()
+
+    if not args.dataset and not args.train_ivf:
+        parser.error('pass --dataset and/or --train-ivf')
+
+    if args.dataset:
+        if not args.append or not os.path.exists(os.path.join(args.output, 'index.json')):
+            create_index(args.output, ImageNetClassifier.name, args.dim)
+
+        start = time.perf_counter()
+        count = embed_dataset(args.dataset, args.output, args.batch_size)
+        metadata = read_metadata(args.output)
+        print(f"Index has {count} images of {len(metadata['labels'])} foods "
+              f"({time.perf_counter() - start:.1f}s)")
+
+    if args.train_ivf:
+        count = read_metadata(args.output)['count']
+        lists = args.ivf_lists or max(1, int(4 * np.sqrt(count)))
+        start = time.perf_counter()
+        train_ivf(args.output, lists, args.pq_subvectors)
+        print(f"IVF-PQ trained: {lists} lists, {args.pq_subvectors} bytes per image "
+              f"({time.perf_counter() - start:.1f}s)")
+
+    print(f"Embedding index written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
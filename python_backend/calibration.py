@@ -0,0 +1,197 @@
+"""Temperature-scaled top-k probabilities and the ChatGPT fallback policy.
+
+The Food-101 model's softmax scores are over-confident on some classes
+and under-confident on others, so a fixed ``confidence < 0.7`` rule sends
+many images to the paid fallback that the model had right. A single
+temperature fitted offline (``fit_calibration.py``) on held-out labeled
+images rescales the scores so they track accuracy, and the fallback then
+fires on calibrated confidence and the top-1/top-2 margin.
+
+Without ``models/calibration.json`` the temperature is 1 and the policy is
+the old ``confidence < 0.7`` rule, so behaviour only changes once a
+calibration has been fitted.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_PATH = os.environ.get('CALIBRATION_PATH', 'models/calibration.json')
+TOP_K = int(os.environ.get('TOP_K', 5))
+DEFAULT_CONFIDENCE_THRESHOLD = 0.7
+
+_EPSILON = 1e-12
+
+
+def softmax(logits, axis=-1):
+    shifted = logits - np.max(logits, axis=axis, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / np.sum(exp, axis=axis, keepdims=True)
+
+
+def apply_temperature(probabilities, temperature):
+    """Rescale softmax outputs as if their logits had been divided by ``temperature``."""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if temperature == 1.0:
+        return probabilities
+    return softmax(np.log(np.clip(probabilities, _EPSILON, 1.0)) / temperature)
+
+
+def negative_log_likelihood(probabilities, labels):
+    picked = probabilities[np.arange(len(labels)), labels]
+    return float(-np.mean(np.log(np.clip(picked, _EPSILON, 1.0))))
+
+
+def expected_calibration_error(probabilities, labels, bins=15):
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    bin_index = np.clip(np.digitize(confidence, edges[1:-1]), 0, bins - 1)
+
+    error = 0.0
+    for index in range(bins):
+        mask = bin_index == index
+        if mask.any():
+            error += mask.mean() * abs(correct[mask].mean() - confidence[mask].mean())
+    return float(error)
+
+
+def fit_temperature(probabilities, labels, low=0.05, high=20.0, iterations=60):
+    """Temperature minimizing NLL on a labeled set (golden-section search on log T)."""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    labels = np.asarray(labels)
+    log_probabilities = np.log(np.clip(probabilities, _EPSILON, 1.0))
+
+    def loss(log_temperature):
+        return negative_log_likelihood(softmax(log_probabilities / np.exp(log_temperature)), labels)
+
+    ratio = (np.sqrt(5.0) - 1.0) / 2.0
+    a, b = np.log(low), np.log(high)
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    loss_c, loss_d = loss(c), loss(d)
+
+    for _ in range(iterations):
+        if loss_c < loss_d:
+            b, d, loss_d = d, c, loss_c
+            c = b - ratio * (b - a)
+            loss_c = loss(c)
+        else:
+            a, c, loss_c = c, d, loss_d
+            d = a + ratio * (b - a)
+            loss_d = loss(d)
+
+    return float(np.exp((a + b) / 2.0))
+
+
+def policy_outcome(probabilities, labels, confidence_threshold, margin_threshold, fallback_accuracy):
+    """Fallback rate and expected accuracy of one threshold pair on a labeled set.
+
+    ``fallback_accuracy`` is how often the fallback names the food correctly;
+    images the policy keeps local count as correct when the top-1 matches.
+    """
+    top_two = np.sort(probabilities, axis=1)[:, -2:]
+    keep = (top_two[:, 1] >= confidence_threshold) & (top_two[:, 1] - top_two[:, 0] >= margin_threshold)
+    correct = probabilities.argmax(axis=1) == labels
+
+    fallback_rate = float(1.0 - keep.mean())
+    accuracy = float((correct & keep).mean() + fallback_accuracy * fallback_rate)
+    return fallback_rate, accuracy
+
+
+def choose_thresholds(probabilities, labels, target_accuracy, fallback_accuracy,
+                      confidence_grid=None, margin_grid=None):
+    """Cheapest (confidence, margin) pair whose expected accuracy meets ``target_accuracy``.
+
+    Returns ``(confidence_threshold, margin_threshold, fallback_rate, accuracy)``.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    labels = np.asarray(labels)
+    confidence_grid = np.linspace(0.0, 0.99, 100) if confidence_grid is None else confidence_grid
+    margin_grid = np.linspace(0.0, 0.5, 26) if margin_grid is None else margin_grid
+
+    top_two = np.sort(probabilities, axis=1)[:, -2:]
+    top1, margin = top_two[:, 1], top_two[:, 1] - top_two[:, 0]
+    correct = probabilities.argmax(axis=1) == labels
+
+    best = None
+    for confidence_threshold in confidence_grid:
+        confident = top1 >= confidence_threshold
+        # keep[m, i]: sample i stays local under margin threshold m
+        keep = confident[None, :] & (margin[None, :] >= margin_grid[:, None])
+        fallback_rate = 1.0 - keep.mean(axis=1)
+        accuracy = (keep & correct[None, :]).mean(axis=1) + fallback_accuracy * fallback_rate
+
+        for index in np.flatnonzero(accuracy >= target_accuracy - 1e-9):
+            candidate = (float(fallback_rate[index]), -float(accuracy[index]),
+                         float(confidence_threshold), float(margin_grid[index]))
+            if best is None or candidate < best:
+                best = candidate
+
+    if best is None:
+        return 0.99, float(margin_grid[-1]), 1.0, float(fallback_accuracy)
+
+    fallback_rate, negative_accuracy, confidence_threshold, margin_threshold = best
+    return confidence_threshold, margin_threshold, fallback_rate, -negative_accuracy
+
+
+class Calibration:
+    def __init__(self, temperature=1.0, confidence_threshold=DEFAULT_CONFIDENCE_THRESHOLD,
+                 margin_threshold=0.0, metadata=None):
+        self.temperature = float(temperature)
+        self.confidence_threshold = float(confidence_threshold)
+        self.margin_threshold = float(margin_threshold)
+        self.metadata = metadata or {}
+
+    def calibrate(self, probabilities):
+        return apply_temperature(probabilities, self.temperature)
+
+    def top_k(self, probabilities, k=None):
+        """(index, calibrated probability) pairs for the k most likely classes, best first."""
+        calibrated = self.calibrate(probabilities)
+        k = min(k or TOP_K, calibrated.shape[-1])
+        indices = np.argpartition(-calibrated, k - 1)[:k]
+        indices = indices[np.argsort(-calibrated[indices])]
+        return [(int(index), float(calibrated[index])) for index in indices]
+
+    def needs_fallback(self, confidence, candidates=()):
+        if confidence < self.confidence_threshold:
+            return True
+        runner_up = candidates[1][1] if len(candidates) > 1 else 0.0
+        return confidence - runner_up < self.margin_threshold
+
+    def to_dict(self):
+        return {
+            'temperature': self.temperature,
+            'confidence_threshold': self.confidence_threshold,
+            'margin_threshold': self.margin_threshold,
+            **self.metadata
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or CALIBRATION_PATH
+        if not os.path.exists(path):
+            return cls()
+
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            metadata = {key: value for key, value in data.items()
+                        if key not in ('temperature', 'confidence_threshold', 'margin_threshold')}
+            return cls(
+                data.get('temperature', 1.0),
+                data.get('confidence_threshold', DEFAULT_CONFIDENCE_THRESHOLD),
+                data.get('margin_threshold', 0.0),
+                metadata
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable calibration at {path}: {e}")
+            return cls()
@@ -0,0 +1,244 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_URL = os.environ.get('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
+FALLBACK_BUDGET_SECONDS = float(os.environ.get('FALLBACK_BUDGET_SECONDS', 4.0))
+FALLBACK_TIMEOUT_SECONDS = float(os.environ.get('FALLBACK_TIMEOUT_SECONDS', 15.0))
+FALLBACK_MAX_CONCURRENCY = int(os.environ.get('FALLBACK_MAX_CONCURRENCY', 4))
+FALLBACK_FAILURE_THRESHOLD = int(os.environ.get('FALLBACK_FAILURE_THRESHOLD', 5))
+FALLBACK_SLOW_SECONDS = float(os.environ.get('FALLBACK_SLOW_SECONDS', 8.0))
+FALLBACK_COOLDOWN_SECONDS = float(os.environ.get('FALLBACK_COOLDOWN_SECONDS', 30.0))
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after repeated failures, then probes it again.
+
+    Closed: calls flow. After ``failure_threshold`` consecutive failures it
+    opens and every call is refused for ``cooldown`` seconds. It then lets a
+    single probe through (half-open); success closes it, failure reopens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            return False
+
+    def cancel_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ChatGPTFallback:
+    """ChatGPT Vision food identification with a latency budget.
+
+    Calls go through a pooled keep-alive session on a small thread pool. The
+    caller waits at most ``budget`` seconds; if the call is still running it
+    gets None and should keep its own answer, while the call finishes in the
+    background and hands its result to ``on_late_result``. A semaphore caps
+    concurrent upstream calls and a circuit breaker skips the upstream
+    entirely while it is failing or slow.
+    """
+
+    def __init__(self, api_key, url=None, budget=None, timeout=None, max_concurrency=None,
+                 failure_threshold=None, slow_seconds=None, cooldown=None):
+        self.api_key = api_key
+        self.url = url or OPENAI_API_URL
+        self.budget = FALLBACK_BUDGET_SECONDS if budget is None else budget
+        self.timeout = timeout or FALLBACK_TIMEOUT_SECONDS
+        self.slow_seconds = FALLBACK_SLOW_SECONDS if slow_seconds is None else slow_seconds
+        self.max_concurrency = max_concurrency or FALLBACK_MAX_CONCURRENCY
+
+        self.breaker = CircuitBreaker(
+            FALLBACK_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold,
+            FALLBACK_COOLDOWN_SECONDS if cooldown is None else cooldown
+        )
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='fallback')
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self.calls = metrics.counter('fallback_calls_total', 'Fallback calls sent upstream')
+        self.successes = metrics.counter('fallback_success_total', 'Fallback calls that returned a food name')
+        self.failures = metrics.counter('fallback_failures_total', 'Fallback calls that errored or timed out upstream')
+        self.budget_exceeded = metrics.counter(
+            'fallback_budget_exceeded_total', 'Requests that stopped waiting for the fallback'
+        )
+        self.skipped_open = metrics.counter('fallback_skipped_circuit_open_total', 'Fallbacks skipped by the breaker')
+        self.skipped_busy = metrics.counter(
+            'fallback_skipped_concurrency_total', 'Fallbacks skipped because all slots were busy'
+        )
+        self.latency = metrics.histogram('fallback_latency_seconds', 'Upstream fallback call duration')
+
+    @property
+    def configured(self):
+        return bool(self.api_key)
+
+    def identify(self, image_base64, user_context, budget=None, on_late_result=None):
+        if not self.api_key:
+            return None
+
+        deadline = time.monotonic() + (self.budget if budget is None else budget)
+
+        if not self.breaker.allow():
+            self.skipped_open.inc()
+            return None
+
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.skipped_busy.inc()
+            self.breaker.cancel_probe()
+            return None
+
+        try:
+            future = self._executor.submit(self._call, image_base64, user_context)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            self.budget_exceeded.inc()
+            if on_late_result is not None:
+                future.add_done_callback(lambda done: self._deliver_late(done, on_late_result))
+            return None
+
+    def _deliver_late(self, future, on_late_result):
+        try:
+            result = future.result()
+            if result:
+                on_late_result(result)
+        except Exception as e:
+            logger.warning(f"Late fallback result dropped: {e}")
+
+    def _call(self, image_base64, user_context):
+        prompt = "Identify this food item. Respond with just the food name."
+
+        if user_context.get('hasBraces'):
+            prompt += " Note: This is for someone with braces."
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {
+            "model": "gpt-4o",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:image/jpeg;base64,{image_base64}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 50
+        }
+
+        self.calls.inc()
+        start = time.monotonic()
+        try:
+            response = self._session.post(self.url, headers=headers, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._record(start, ok=False)
+            logger.warning(f"ChatGPT Vision error: {e}")
+            return None
+
+        if response.status_code != 200:
+            self._record(start, ok=False)
+            logger.warning(f"ChatGPT API error: {response.status_code}")
+            return None
+
+        elapsed = self._record(start, ok=True)
+
+        result = response.json()
+        food_name = result['choices'][0]['message']['content'].strip()
+        logger.info(f"ChatGPT Vision identified {food_name} in {elapsed:.2f}s")
+        return {
+            'foodName': food_name,
+            'confidence': 0.85
+        }
+
+    def _record(self, start, ok):
+        elapsed = time.monotonic() - start
+        self.latency.observe(elapsed)
+
+        # A slow success still counts against the breaker: the point is to stop
+        # paying for an upstream that cannot answer inside the budget.
+        if ok and elapsed <= self.slow_seconds:
+            self.successes.inc()
+            self.breaker.record_success()
+        else:
+            if ok:
+                self.successes.inc()
+            else:
+                self.failures.inc()
+            self.breaker.record_failure()
+
+        return elapsed
+
+    def status(self):
+        return {
+            'configured': self.configured,
+            'circuit': self.breaker.state,
+            'budget_seconds': self.budget,
+            'max_concurrency': self.max_concurrency
+        }
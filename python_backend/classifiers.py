@@ -0,0 +1,369 @@
+"""Classifier backends behind the analysis service.
+
+``CLASSIFIER`` picks the model every analyze route uses:
+
+- ``food101``: the Food-101 model, run by the ``INFERENCE_BACKEND`` from
+  inference_backends.py (keras, tflite or the shared remote model server),
+  with calibrated top-k scores from calibration.py.
+- ``imagenet``: Keras EfficientNetB0 with ImageNet weights; food-related
+  ImageNet labels are ranked ahead of the rest.
+- ``fallback``: no local model; every image goes to the ChatGPT fallback.
+
+A classifier loads and warms up on the startup thread (``load``), runs
+``predict_on_batch`` on a preprocessed float32 batch and turns one row of
+output into ``(food_name, confidence, candidates)`` with ``decode``. A
+model that also yields an image embedding returns it from ``embedding``
+for the nearest-neighbour lookup in embedding_index.py. Until ``load``
+succeeds ``model`` is None and the service answers in fallback mode.
+
+Single-image predictions go through the classifier's own ``batcher``, so
+a model swapped in by a reload (see model_versions.py) never shares a
+batch with the one it replaces; ``close`` stops it once the old model is
+out of service.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from batching import MicroBatcher
+from calibration import TOP_K, Calibration
+from food_tags import KeywordMatcher
+from inference_backends import INFERENCE_BACKEND, backend_model_path, create_backend, import_runtime
+from preprocessing import INPUT_SIZE
+from runtime_config import predict_function
+
+logger = logging.getLogger(__name__)
+
+CLASSIFIER = os.environ.get('CLASSIFIER', 'food101')
+FOOD_CLASSES_PATH = os.environ.get('FOOD_CLASSES_PATH', 'models/food101_classes.txt')
+
+
+class Classifier:
+    name = None
+    # Reported as the result ``source`` when this classifier answers.
+    source = 'tensorflow'
+    # Pixel scaling passed to preprocessing.preprocess.
+    normalization = 'unit'
+
+    def __init__(self):
+        self.model = None
+        self.runtime = None
+        self.calibration = Calibration()
+        # Display names the verdict table is pre-computed for (see verdicts.py).
+        self.labels = []
+        # Why ``load`` failed, when it did.
+        self.error = None
+        # Set for models loaded from a versioned directory (see model_versions.py).
+        self.version = None
+        self.input_size = INPUT_SIZE
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.model is not None
+
+    @property
+    def cache_name(self):
+        """Prefix for result cache keys: each model, and each version of one, names images differently."""
+        return self.name if self.version is None else f"{self.name}@{self.version}"
+
+    @property
+    def batcher(self):
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(self.predict_on_batch, name=self.name)
+        return self._batcher
+
+    def close(self):
+        if self._batcher is not None:
+            self._batcher.close()
+
+    def load(self, tracker):
+        """Load and warm up the model, timing each step on ``tracker``."""
+        raise NotImplementedError
+
+    def predict_on_batch(self, inputs):
+        return self.model.predict_on_batch(inputs)
+
+    def decode(self, output):
+        raise NotImplementedError
+
+    def split_batch(self, outputs):
+        """Per-image outputs of a ``predict_on_batch`` result, as ``decode`` takes them."""
+        # Multi-output models return one array per output; regroup them by row.
+        return list(zip(*outputs)) if isinstance(outputs, tuple) else list(outputs)
+
+    def average_views(self, outputs):
+        """One output, as ``decode`` takes it, from the per-view outputs of a TTA stack.
+
+        The models end in a softmax, so the mean is over probabilities.
+        """
+        if isinstance(outputs[0], tuple):
+            return tuple(np.mean(np.stack(parts), axis=0) for parts in zip(*outputs))
+        return np.mean(np.stack(outputs), axis=0)
+
+    def embedding(self, output):
+        """Image embedding for embedding_index.py, if this model produces one."""
+        return None
+
+    def status(self):
+        return {
+            'name': self.name,
+            'loaded': self.loaded,
+            'runtime': self.runtime,
+            'version': self.version,
+            'error': self.error
+        }
+
+
+def class_display_name(class_name):
+    return class_name.replace('_', ' ').title()
+
+
+def read_food_classes(path):
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return [line.strip() for line in f if line.strip()]
+        logger.warning(f"Food classes not found at {path}")
+        return ['apple_pie', 'pizza', 'hamburger', 'ice_cream', 'salad']
+    except Exception as e:
+        logger.error(f"Error loading food classes: {e}")
+        return ['unknown']
+
+
+class Food101Classifier(Classifier):
+    name = 'food101'
+    normalization = 'unit'
+
+    def __init__(self, backend=None, model_path=None, classes_path=None, calibration_path=None):
+        super().__init__()
+        self.backend = backend or INFERENCE_BACKEND
+        self.model_path = model_path or backend_model_path(self.backend)
+        self.classes = read_food_classes(classes_path or FOOD_CLASSES_PATH)
+        self.labels = [class_display_name(name) for name in self.classes]
+        self.calibration = Calibration.load(calibration_path)
+        logger.info(f"Loaded {len(self.classes)} food classes")
+
+    @classmethod
+    def from_manifest(cls, directory, manifest):
+        """A classifier for the model version in ``directory``, described by its manifest."""
+        calibration = manifest.get('calibration')
+        classifier = cls(
+            backend=manifest.get('backend'),
+            model_path=os.path.join(directory, manifest['model']),
+            classes_path=os.path.join(directory, manifest['classes']),
+            calibration_path=os.path.join(directory, calibration) if calibration else None
+        )
+        if not calibration:
+            # The service-wide calibration was fitted on another model.
+            classifier.calibration = Calibration()
+        classifier.version = manifest['version']
+        classifier.normalization = manifest['normalization']
+        classifier.input_size = tuple(manifest['input_size'])
+        return classifier
+
+    def load(self, tracker):
+        if not os.path.exists(self.model_path):
+            logger.warning(f"Model not found at {self.model_path}, running in fallback mode")
+            return
+
+        logger.info(f"Loading {self.backend} model from {self.model_path}...")
+        with tracker.stage('import'):
+            import_runtime(self.backend)
+        with tracker.stage('weight_load'):
+            model = create_backend(self.backend, self.model_path)
+        with tracker.stage('first_inference'):
+            model.predict_on_batch(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32))
+
+        # Published only after the first forward pass, so requests never pay for tracing.
+        self.model = model
+        self.runtime = model.runtime
+        logger.info(f"Model loaded ({model.runtime}), input {model.input_shape}, output {model.output_shape}")
+
+    def decode(self, output):
+        """Top-1 name, its calibrated probability and the top-k (name, probability) pairs."""
+        candidates = [
+            (self.labels[index], probability)
+            for index, probability in self.calibration.top_k(output, TOP_K)
+            if index < len(self.labels)
+        ]
+
+        if not candidates:
+            return "Unknown Food", float(np.max(output)), []
+
+        food_name, confidence = candidates[0]
+        return food_name, confidence, candidates
+
+    def status(self):
+        return {
+            **super().status(),
+            'inference_backend': self.backend,
+            'model_path': self.model_path,
+            'calibration': self.calibration.to_dict()
+        }
+
+
+FOOD_KEYWORDS = [
+    'banana', 'orange', 'lemon', 'pineapple', 'strawberry', 'apple', 'pomegranate',
+    'fig', 'granny_smith', 'custard_apple',
+    'broccoli', 'cauliflower', 'mushroom', 'bell_pepper', 'cucumber', 'zucchini',
+    'spaghetti_squash', 'acorn_squash', 'butternut_squash', 'artichoke', 'cabbage',
+    'corn', 'ear',
+    'cheeseburger', 'hamburger', 'hotdog', 'meat_loaf', 'pizza', 'chicken',
+    'carbonara', 'burrito', 'trifle', 'consomme', 'guacamole',
+    'bagel', 'pretzel', 'french_loaf', 'bread', 'croissant', 'dough',
+    'popcorn', 'chip', 'chocolate', 'ice_cream', 'ice_lolly', 'frozen',
+    'cupcake', 'cookie', 'pie', 'cake', 'cream', 'custard', 'pudding',
+    'espresso', 'cup', 'pitcher', 'wine_bottle', 'beer_bottle', 'eggnog',
+    'sushi', 'plate', 'bowl', 'tray', 'platter'
+]
+
+food_keyword_matcher = KeywordMatcher({keyword: {'food'} for keyword in FOOD_KEYWORDS}, whole_words=False)
+
+FOOD_NAME_MAPPINGS = {
+    'Cheeseburger': 'Cheeseburger',
+    'Hamburger': 'Hamburger',
+    'Hotdog': 'Hot Dog',
+    'Hot Dog': 'Hot Dog',
+    'French Loaf': 'Bread',
+    'Bagel': 'Bagel',
+    'Pretzel': 'Pretzel',
+    'Croissant': 'Croissant',
+    'Granny Smith': 'Apple',
+    'Lemon': 'Lemon',
+    'Orange': 'Orange',
+    'Banana': 'Banana',
+    'Pomegranate': 'Pomegranate',
+    'Fig': 'Fig',
+    'Pineapple': 'Pineapple',
+    'Strawberry': 'Strawberries',
+    'Mushroom': 'Mushrooms',
+    'Bell Pepper': 'Bell Pepper',
+    'Head Cabbage': 'Cabbage',
+    'Cauliflower': 'Cauliflower',
+    'Zucchini': 'Zucchini',
+    'Spaghetti Squash': 'Squash',
+    'Acorn Squash': 'Squash',
+    'Butternut Squash': 'Squash',
+    'Cucumber': 'Cucumber',
+    'Artichoke': 'Artichoke',
+    'Ear': 'Corn',
+    'Broccoli': 'Broccoli',
+    'Popcorn': 'Popcorn',
+    'Chocolate Sauce': 'Chocolate',
+    'Ice Cream': 'Ice Cream',
+    'Ice Lolly': 'Popsicle',
+    'Pizza': 'Pizza',
+    'Burrito': 'Burrito',
+    'Meat Loaf': 'Meatloaf',
+    'Carbonara': 'Pasta Carbonara',
+    'Guacamole': 'Guacamole',
+    'Cupcake': 'Cupcake',
+    'Custard Apple': 'Custard',
+    'Trifle': 'Trifle'
+}
+
+
+def is_food_related(class_name):
+    return food_keyword_matcher.search(class_name)
+
+
+def format_food_name(raw_name):
+    formatted = raw_name.replace('_', ' ').title()
+    return FOOD_NAME_MAPPINGS.get(formatted, formatted)
+
+
+def build_imagenet_classifier(tf):
+    base_model = tf.keras.applications.EfficientNetB0(
+        weights='imagenet',
+        input_shape=INPUT_SIZE + (3,),
+        include_top=True
+    )
+
+    # Expose the pooled features alongside the predictions so a single
+    # forward pass yields both.
+    return tf.keras.Model(
+        inputs=base_model.input,
+        outputs=[base_model.get_layer('avg_pool').output, base_model.output]
+    )
+
+
+class ImageNetClassifier(Classifier):
+    name = 'imagenet'
+    # Keras EfficientNet rescales inside the model, so inputs stay in [0, 255].
+    normalization = 'raw'
+
+    def __init__(self):
+        super().__init__()
+        self._decode_predictions = None
+        self._predict = None
+
+    def load(self, tracker):
+        with tracker.stage('import'):
+            tf = import_runtime('keras')
+        with tracker.stage('weight_load'):
+            model = build_imagenet_classifier(tf)
+            self._predict = predict_function(tf, model)
+        with tracker.stage('first_inference'):
+            self._decode_predictions = tf.keras.applications.imagenet_utils.decode_predictions
+            features, predictions = self._predict(np.zeros((1,) + INPUT_SIZE + (3,), dtype=np.float32))
+            # decode_predictions fetches the ImageNet class index on first use.
+            self._decode_predictions(np.asarray(predictions), top=10)
+
+        self.model = model
+        self.runtime = f"tensorflow {tf.__version__}"
+        logger.info(f"EfficientNetB0 ImageNet classifier loaded ({self.runtime})")
+
+    def predict_on_batch(self, inputs):
+        features, predictions = self._predict(inputs)
+        return np.asarray(features), np.asarray(predictions)
+
+    def embedding(self, output):
+        features, predictions = output
+        return features
+
+    def decode(self, output):
+        """Food-related labels first, each formatted once; falls back to the raw top labels."""
+        features, predictions = output
+        decoded = self._decode_predictions(np.expand_dims(predictions, 0), top=10)[0]
+
+        food = [(format_food_name(label), float(score)) for _, label, score in decoded if is_food_related(label)]
+        ranked = food or [(format_food_name(label), float(score)) for _, label, score in decoded]
+
+        # Several labels format to the same name ('Acorn Squash', 'Butternut Squash').
+        candidates, seen = [], set()
+        for name, score in ranked:
+            if name not in seen:
+                seen.add(name)
+                candidates.append((name, score))
+
+        food_name, confidence = candidates[0]
+        return food_name, confidence, candidates[:TOP_K]
+
+
+class FallbackClassifier(Classifier):
+    """No local model: results come from the ChatGPT fallback alone."""
+
+    name = 'fallback'
+
+    def load(self, tracker):
+        logger.info("No local classifier configured, every image goes to the fallback")
+
+
+CLASSIFIERS = {
+    'food101': Food101Classifier,
+    'imagenet': ImageNetClassifier,
+    'fallback': FallbackClassifier,
+}
+
+
+def create_classifier(name=None):
+    name = name or CLASSIFIER
+    if name not in CLASSIFIERS:
+        raise ValueError(f"Unknown classifier '{name}', expected one of {', '.join(CLASSIFIERS)}")
+    return CLASSIFIERS[name]()
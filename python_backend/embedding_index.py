@@ -0,0 +1,342 @@
+"""Nearest-neighbour food lookup over reference image embeddings.
+
+The ImageNet classifier's pooled EfficientNetB0 features are kept as
+image embeddings. ``build_embedding_index.py`` embeds a labeled reference
+set offline into ``EMBEDDING_INDEX_PATH``; when the model is unsure, the
+service looks for close reference images there before paying for the
+ChatGPT fallback. A new local food only needs its embeddings appended,
+not a retrained model.
+
+An index is a directory:
+
+- ``index.json``: model name, dimension, row count, label names and the
+  IVF-PQ settings when present. ``count`` is written last, so a reader
+  never maps rows an interrupted append did not finish.
+- ``vectors.f32``: L2-normalized float32 rows, memory-mapped, so the
+  process only holds the pages a search touches.
+- ``labels.i32``: the label of each row.
+- Optional IVF-PQ (``train_ivf``) for large sets: rows are grouped under
+  coarse k-means centroids (``ivf_centroids.npy``) and their residuals
+  compressed to one byte per sub-vector (``pq_codebooks.npy``,
+  ``pq_codes.u8``, ``ivf_lists.i32``). A search scores only the rows of
+  the ``EMBEDDING_NPROBE`` closest lists from the codes, then re-ranks the
+  best few with the exact vectors. Appended rows are encoded with the
+  trained quantizers, so appends never retrain.
+
+Without an index nothing changes.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_INDEX_PATH = os.environ.get('EMBEDDING_INDEX_PATH', 'models/embedding_index')
+# Neighbours that vote on the label.
+EMBEDDING_NEIGHBOURS = int(os.environ.get('EMBEDDING_NEIGHBOURS', 10))
+# Cosine similarity the closest reference image needs before its label is used.
+EMBEDDING_MIN_SIMILARITY = float(os.environ.get('EMBEDDING_MIN_SIMILARITY', 0.8))
+EMBEDDING_NPROBE = int(os.environ.get('EMBEDDING_NPROBE', 16))
+
+# Rows scored per matrix product in an exact scan; bounds the memory a
+# scan of a large memory-mapped index needs.
+SCAN_CHUNK_ROWS = 65536
+# IVF-PQ candidates re-ranked with exact vectors, per neighbour requested.
+RERANK_FACTOR = 8
+PQ_CENTROIDS = 256
+IVF_TRAIN_SAMPLES = 65536
+
+METADATA_FILE = 'index.json'
+VECTORS_FILE = 'vectors.f32'
+LABELS_FILE = 'labels.i32'
+LISTS_FILE = 'ivf_lists.i32'
+CODES_FILE = 'pq_codes.u8'
+CENTROIDS_FILE = 'ivf_centroids.npy'
+CODEBOOKS_FILE = 'pq_codebooks.npy'
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def nearest_centroids(data, centroids):
+    """Index of the closest centroid (L2) for each row of ``data``."""
+    # argmin |x - c|^2 == argmax x.c - |c|^2 / 2
+    half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    assignment = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), SCAN_CHUNK_ROWS):
+        chunk = np.asarray(data[start:start + SCAN_CHUNK_ROWS], dtype=np.float32)
+        assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T - half_norms, axis=1)
+    return assignment
+
+
+def kmeans(data, k, iterations=20, seed=0):
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        assignment = nearest_centroids(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, data)
+
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random rows rather than leaving them dead.
+        if not filled.all():
+            centroids[~filled] = data[rng.choice(len(data), int((~filled).sum()))]
+
+    return centroids
+
+
+def top_k(scores, k):
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    positions = np.argpartition(-scores, k - 1)[:k]
+    return positions[np.argsort(-scores[positions])]
+
+
+def read_metadata(path):
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def write_metadata(path, metadata):
+    target = os.path.join(path, METADATA_FILE)
+    with open(target + '.tmp', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(target + '.tmp', target)
+
+
+def map_rows(path, name, dtype, count, width=None):
+    shape = (count,) if width is None else (count, width)
+    if count == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(os.path.join(path, name), dtype=dtype, mode='r', shape=shape)
+
+
+class IVFPQ:
+    def __init__(self, centroids, codebooks, list_ids, codes):
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.list_ids = list_ids
+        self.codes = codes
+        self.subvectors, _, self.sub_dim = codebooks.shape
+
+        # Inverted lists: rows sorted by list, with each list's slice of them.
+        self.order = np.argsort(list_ids, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(list_ids[self.order], np.arange(len(centroids) + 1))
+
+    def candidates(self, query, nprobe, limit):
+        """Rows from the ``nprobe`` closest lists, ranked by their PQ-approximated similarity."""
+        centroid_scores = self.centroids @ query
+        half_norms = 0.5 * np.einsum('ij,ij->i', self.centroids, self.centroids)
+        probe = top_k(centroid_scores - half_norms, nprobe)
+        rows = np.concatenate([self.order[self.offsets[list_id]:self.offsets[list_id + 1]] for list_id in probe])
+        if len(rows) == 0:
+            return rows
+
+        # query . (centroid + residual) = query . centroid + sum of per-sub-vector lookups.
+        lookup = np.einsum('mkd,md->mk', self.codebooks, query.reshape(self.subvectors, self.sub_dim))
+        approximate = centroid_scores[self.list_ids[rows]] + lookup[np.arange(self.subvectors), self.codes[rows]].sum(1)
+        return rows[top_k(approximate, limit)]
+
+    def encode(self, vectors):
+        list_ids = nearest_centroids(vectors, self.centroids)
+        residuals = vectors - self.centroids[list_ids]
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for m in range(self.subvectors):
+            part = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codes[:, m] = nearest_centroids(part, self.codebooks[m])
+        return list_ids, codes
+
+
+class EmbeddingIndex:
+    def __init__(self, path, metadata):
+        self.path = path
+        self.model = metadata['model']
+        self.dim = metadata['dim']
+        self.count = metadata['count']
+        self.labels = metadata['labels']
+
+        self.vectors = map_rows(path, VECTORS_FILE, np.float32, self.count, self.dim)
+        self.label_ids = map_rows(path, LABELS_FILE, np.int32, self.count)
+
+        self.ivf = None
+        settings = metadata.get('ivf')
+        if settings and self.count:
+            self.ivf = IVFPQ(
+                np.load(os.path.join(path, CENTROIDS_FILE)),
+                np.load(os.path.join(path, CODEBOOKS_FILE)),
+                # Codes and list ids are small; keep them resident.
+                np.array(map_rows(path, LISTS_FILE, np.int32, self.count)),
+                np.array(map_rows(path, CODES_FILE, np.uint8, self.count, settings['subvectors']))
+            )
+
+    @classmethod
+    def load(cls, path=None, model=None):
+        """The index at ``path``, or None when there is none or it was built for another model."""
+        path = path or EMBEDDING_INDEX_PATH
+        if not os.path.exists(os.path.join(path, METADATA_FILE)):
+            return None
+
+        try:
+            index = cls(path, read_metadata(path))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable embedding index at {path}: {e}")
+            return None
+
+        if model is not None and index.model != model:
+            logger.warning(f"Ignoring embedding index at {path}: built for {index.model}, serving {model}")
+            return None
+
+        logger.info(f"Loaded embedding index: {index.count} images of {len(index.labels)} foods"
+                    f"{' (IVF-PQ)' if index.ivf else ''}")
+        return index
+
+    def search(self, embedding, k=None, nprobe=None):
+        """(row, cosine similarity) of the k closest reference images, best first."""
+        k = k or EMBEDDING_NEIGHBOURS
+        query = normalize(embedding).reshape(-1)
+
+        if self.ivf is not None:
+            rows = np.sort(self.ivf.candidates(query, nprobe or EMBEDDING_NPROBE, k * RERANK_FACTOR))
+            scores = self.vectors[rows] @ query
+        else:
+            rows = None
+            scores = np.empty(self.count, dtype=np.float32)
+            for start in range(0, self.count, SCAN_CHUNK_ROWS):
+                scores[start:start + SCAN_CHUNK_ROWS] = self.vectors[start:start + SCAN_CHUNK_ROWS] @ query
+
+        best = top_k(scores, k)
+        if rows is not None:
+            return [(int(rows[position]), float(scores[position])) for position in best]
+        return [(int(position), float(scores[position])) for position in best]
+
+    def nearest(self, embedding, k=None):
+        """Top-1 food, its similarity and (food, similarity) candidates; None if nothing is close enough.
+
+        Neighbours vote with their similarity, so one stray near-duplicate
+        does not outvote several close images of another food.
+        """
+        neighbours = self.search(embedding, k)
+        if not neighbours or neighbours[0][1] < EMBEDDING_MIN_SIMILARITY:
+            return None
+
+        votes, best = {}, {}
+        for row, similarity in neighbours:
+            label = self.labels[self.label_ids[row]]
+            votes[label] = votes.get(label, 0.0) + similarity
+            best[label] = max(best.get(label, 0.0), similarity)
+
+        # Foods whose closest image is not close either are not plausible alternatives.
+        ranked = sorted(votes, key=votes.get, reverse=True)
+        candidates = [(label, best[label]) for label in ranked if best[label] >= EMBEDDING_MIN_SIMILARITY]
+        food_name, similarity = candidates[0]
+        return food_name, similarity, candidates
+
+    def status(self):
+        return {
+            'path': self.path,
+            'model': self.model,
+            'images': self.count,
+            'foods': len(self.labels),
+            'ivf_pq': self.ivf is not None
+        }
+
+
+def create_index(path, model, dim):
+    os.makedirs(path, exist_ok=True)
+    for name in (VECTORS_FILE, LABELS_FILE, LISTS_FILE, CODES_FILE):
+        open(os.path.join(path, name), 'wb').close()
+    write_metadata(path, {'model': model, 'dim': int(dim), 'count': 0, 'labels': [], 'ivf': None})
+
+
+def append_embeddings(path, embeddings, labels):
+    """Add rows to an existing index; returns the new row count.
+
+    New label names are added to the label table. With IVF-PQ the rows are
+    encoded with the trained quantizers, so nothing is retrained.
+    """
+    metadata = read_metadata(path)
+    vectors = normalize(embeddings)
+    if vectors.shape[1] != metadata['dim']:
+        raise ValueError(f"Embeddings have dimension {vectors.shape[1]}, index expects {metadata['dim']}")
+
+    label_table = metadata['labels']
+    positions = {label: position for position, label in enumerate(label_table)}
+    label_ids = np.empty(len(labels), dtype=np.int32)
+    for row, label in enumerate(labels):
+        if label not in positions:
+            positions[label] = len(label_table)
+            label_table.append(label)
+        label_ids[row] = positions[label]
+
+    # Data first, then the row count, so readers only see complete rows.
+    # Truncate to the recorded count in case an earlier append died half way.
+    count = metadata['count']
+    write_rows(path, VECTORS_FILE, count, vectors)
+    write_rows(path, LABELS_FILE, count, label_ids)
+
+    if metadata.get('ivf'):
+        quantizer = IVFPQ(
+            np.load(os.path.join(path, CENTROIDS_FILE)), np.load(os.path.join(path, CODEBOOKS_FILE)),
+            np.zeros(0, dtype=np.int32), np.zeros((0, metadata['ivf']['subvectors']), dtype=np.uint8)
+        )
+        list_ids, codes = quantizer.encode(vectors)
+        write_rows(path, LISTS_FILE, count, list_ids)
+        write_rows(path, CODES_FILE, count, codes)
+
+    metadata['count'] = count + len(vectors)
+    write_metadata(path, metadata)
+    return metadata['count']
+
+
+def write_rows(path, name, count, rows):
+    rows = np.ascontiguousarray(rows)
+    row_bytes = rows.itemsize * int(np.prod(rows.shape[1:], dtype=np.int64))
+    with open(os.path.join(path, name), 'r+b') as f:
+        f.truncate(count * row_bytes)
+        f.seek(count * row_bytes)
+        f.write(rows.tobytes())
+
+
+def train_ivf(path, lists, subvectors, samples=IVF_TRAIN_SAMPLES, iterations=20, seed=0):
+    """Fit the coarse centroids and PQ codebooks on a sample of the index, then encode every row."""
+    metadata = read_metadata(path)
+    dim, count = metadata['dim'], metadata['count']
+    if dim % subvectors:
+        raise ValueError(f"Dimension {dim} is not divisible into {subvectors} sub-vectors")
+    if count == 0:
+        raise ValueError("Cannot train IVF-PQ on an empty index")
+
+    vectors = map_rows(path, VECTORS_FILE, np.float32, count, dim)
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(count, min(samples, count), replace=False))])
+
+    centroids = kmeans(sample, lists, iterations, seed)
+    residuals = sample - centroids[nearest_centroids(sample, centroids)]
+    sub_dim = dim // subvectors
+    codebooks = np.zeros((subvectors, PQ_CENTROIDS, sub_dim), dtype=np.float32)
+    for m in range(subvectors):
+        trained = kmeans(residuals[:, m * sub_dim:(m + 1) * sub_dim], PQ_CENTROIDS, iterations, seed + m + 1)
+        codebooks[m, :len(trained)] = trained
+
+    np.save(os.path.join(path, CENTROIDS_FILE), centroids)
+    np.save(os.path.join(path, CODEBOOKS_FILE), codebooks)
+
+    quantizer = IVFPQ(centroids, codebooks, np.zeros(0, dtype=np.int32), np.zeros((0, subvectors), dtype=np.uint8))
+    for start in range(0, count, SCAN_CHUNK_ROWS):
+        list_ids, codes = quantizer.encode(np.asarray(vectors[start:start + SCAN_CHUNK_ROWS]))
+        write_rows(path, LISTS_FILE, start, list_ids)
+        write_rows(path, CODES_FILE, start, codes)
+
+    metadata['ivf'] = {'lists': len(centroids), 'subvectors': subvectors, 'trained_on': len(sample)}
+    write_metadata(path, metadata)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Convert the Food-101 Keras model to TensorFlow Lite.
+
+    python export_model.py
+    python export_model.py --quantize dynamic
+    python export_model.py --quantize int8 --calibration-dir data/calibration --samples 300
+
+``int8`` is full-integer post-training quantization: activation ranges come
+from running ``--samples`` calibration images (any JPEG/PNG files under
+``--calibration-dir``, preprocessed exactly like the server does) through
+the float model. Inputs and outputs stay float32 unless ``--int8-io`` is
+given; ``TFLiteBackend`` handles both. Serve the result with
+``INFERENCE_BACKEND=tflite``.
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+
+from inference_backends import KERAS_MODEL_PATH, TFLITE_MODEL_PATH
+from preprocessing import preprocess
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def find_images(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def representative_dataset(paths):
+    def generate():
+        for path in paths:
+            try:
+                yield [preprocess(path, normalization='unit')[np.newaxis]]
+            except Exception as e:
+                print(f"Skipping calibration image {path}: {e}")
+    return generate
+
+
+def convert(model, quantize='none', calibration_paths=(), int8_io=False):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs calibration images (--calibration-dir)")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(calibration_paths)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if int8_io:
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=KERAS_MODEL_PATH)
+    parser.add_argument('--output', default=TFLITE_MODEL_PATH)
+    parser.add_argument('--quantize', choices=('none', 'dynamic', 'float16', 'int8'), default='none')
+    parser.add_argument('--calibration-dir', help='Directory of representative food images for int8')
+    parser.add_argument('--samples', type=int, default=200, help='Calibration images to use')
+    parser.add_argument('--int8-io', action='store_true', help='Make the model inputs/outputs int8 as well')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    calibration_paths = []
+    if args.calibration_dir:
+        calibration_paths = find_images(args.calibration_dir)
+        random.Random(args.seed).shuffle(calibration_paths)
+        calibration_paths = calibration_paths[:args.samples]
+        print(f"Using {len(calibration_paths)} calibration images from {args.calibration_dir}")
+
+    print(f"Loading {args.model} (TensorFlow {tf.__version__})...")
+    model = tf.keras.models.load_model(args.model)
+
+    print(f"Converting with quantize={args.quantize}...")
+    tflite_model = convert(model, args.quantize, calibration_paths, args.int8_io)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'wb') as f:
+        f.write(tflite_model)
+
+    print(f"Wrote {args.output} ({len(tflite_model) / 1e6:.1f} MB, "
+          f"Keras file {os.path.getsize(args.model) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Fit temperature scaling and fallback thresholds on a held-out labeled set.
+
+    python fit_calibration.py --dataset data/food101_holdout --save-predictions holdout.npz
+    python fit_calibration.py --predictions holdout.npz --fallback-accuracy 0.9
+
+The dataset has one sub-directory per Food-101 class (``apple_pie/`` ...)
+and must not overlap the training images. The temperature minimizes NLL.
+The thresholds are the cheapest confidence/margin pair whose expected
+accuracy is at least that of the old ``raw confidence < 0.7`` rule, with
+the fallback assumed right ``--fallback-accuracy`` of the time. The
+result goes to ``models/calibration.json``, which the Food-101 classifier reads at startup.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from calibration import (
+    CALIBRATION_PATH, DEFAULT_CONFIDENCE_THRESHOLD, Calibration, apply_temperature, choose_thresholds,
+    expected_calibration_error, fit_temperature, negative_log_likelihood, policy_outcome
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def read_classes(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def labeled_images(dataset, classes):
+    index = {name: position for position, name in enumerate(classes)}
+    samples = []
+    for class_name in sorted(os.listdir(dataset)):
+        class_dir = os.path.join(dataset, class_name)
+        if class_name not in index or not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(class_dir, name), index[class_name]))
+    return samples
+
+
+def collect_predictions(dataset, classes, backend_name=None, batch_size=32, limit=None):
+    """Run the served model over a labeled directory; returns (probabilities, labels)."""
+    from inference_backends import create_backend
+    from preprocessing import batch_buffer, preprocess
+
+    samples = labeled_images(dataset, classes)
+    if limit:
+        samples = samples[::max(1, len(samples) // limit)][:limit]
+
+    backend = create_backend(backend_name)
+    rows, labels = [], []
+
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        inputs = batch_buffer(len(chunk))
+        kept = []
+        for row, (path, label) in enumerate(chunk):
+            try:
+                preprocess(path, normalization='unit', out=inputs[row])
+                kept.append(row)
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+
+        if kept:
+            outputs = backend.predict_on_batch(inputs if len(kept) == len(chunk) else inputs[kept])
+            rows.extend(np.asarray(outputs, dtype=np.float32))
+            labels.extend(chunk[row][1] for row in kept)
+
+        print(f"  {min(start + batch_size, len(samples))}/{len(samples)} images", end='\r')
+
+    print()
+    return np.stack(rows), np.asarray(labels)
+
+
+def load_predictions(path):
+    data = np.load(path)
+    return data['probabilities'], data['labels']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='Held-out labeled image directory')
+    parser.add_argument('--predictions', help='Reuse probabilities saved with --save-predictions')
+    parser.add_argument('--save-predictions', help='Save model probabilities and labels to this .npz')
+    parser.add_argument('--classes', default='models/food101_classes.txt')
+    parser.add_argument('--backend', help='Inference backend (defaults to INFERENCE_BACKEND)')
+    parser.add_argument('--limit', type=int, help='Use at most this many images')
+    parser.add_argument('--fallback-accuracy', type=float, default=0.9,
+                        help='How often the ChatGPT fallback names the food correctly')
+    parser.add_argument('--output', default=CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    if args.predictions:
+        probabilities, labels = load_predictions(args.predictions)
+    elif args.dataset:
+        probabilities, labels = collect_predictions(
+            args.dataset, read_classes(args.classes), args.backend, limit=args.limit
+        )
+        if args.save_predictions:
+            np.savez_compressed(args.save_predictions, probabilities=probabilities, labels=labels)
+            print(f"Predictions saved to {args.save_predictions}")
+    else:
+        parser.error('pass --dataset or --predictions')
+
+    probabilities = probabilities.astype(np.float64)
+    print(f"Fitting on {len(labels)} images, top-1 accuracy {np.mean(probabilities.argmax(axis=1) == labels):.3f}")
+
+    temperature = fit_temperature(probabilities, labels)
+    calibrated = apply_temperature(probabilities, temperature)
+
+    legacy_rate, legacy_accuracy = policy_outcome(
+        probabilities, labels, DEFAULT_CONFIDENCE_THRESHOLD, 0.0, args.fallback_accuracy
+    )
+    confidence_threshold, margin_threshold, fallback_rate, accuracy = choose_thresholds(
+        calibrated, labels, legacy_accuracy, args.fallback_accuracy
+    )
+
+    report = {
+        'fitted_on': int(len(labels)),
+        'fitted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'fallback_accuracy_assumed': args.fallback_accuracy,
+        'nll_before': negative_log_likelihood(probabilities, labels),
+        'nll_after': negative_log_likelihood(calibrated, labels),
+        'ece_before': expected_calibration_error(probabilities, labels),
+        'ece_after': expected_calibration_error(calibrated, labels),
+        'legacy_fallback_rate': legacy_rate,
+        'legacy_expected_accuracy': legacy_accuracy,
+        'fallback_rate': fallback_rate,
+        'expected_accuracy': accuracy
+    }
+
+    calibration = Calibration(temperature, confidence_threshold, margin_threshold, report)
+    calibration.save(args.output)
+
+    print(f"Temperature {temperature:.3f}: NLL {report['nll_before']:.3f} -> {report['nll_after']:.3f}, "
+          f"ECE {report['ece_before']:.3f} -> {report['ece_after']:.3f}")
+    print(f"Fallback when calibrated confidence < {confidence_threshold:.2f} or margin < {margin_threshold:.2f}")
+    print(f"Fallback rate {legacy_rate:.1%} -> {fallback_rate:.1%} at expected accuracy "
+          f"{legacy_accuracy:.3f} -> {accuracy:.3f}")
+    print(f"Calibration written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Shared food-property knowledge base and a compiled keyword matcher.
+
+Both servers tag foods from this one table. Keywords match whole words,
+optionally pluralised, so 'cookie' matches 'cookies' but 'tea' does not
+match 'steak', 'nuts' does not match 'donuts' and 'gum' does not match
+'gumbo'. A food that is hard is never also soft, and one that is cold is
+never also hot: "Fish And Chips" is hard, not soft because of the fish.
+"""
+import bisect
+import re
+
+TAG_ORDER = ('hard', 'sticky', 'chewy', 'hot', 'cold', 'sugary', 'acidic', 'soft')
+
+FOOD_PROPERTIES = {
+    'hard': [
+        'nuts', 'candy', 'hard candy', 'popcorn', 'chips', 'cracker', 'carrot', 'apple',
+        'pretzel', 'bagel', 'raw vegetables', 'granola', 'ice', 'rice cake', 'fried'
+    ],
+    'sticky': ['caramel', 'taffy', 'gum', 'gummy', 'toffee', 'honey', 'syrup', 'dried fruit', 'donut'],
+    'chewy': ['bagel', 'jerky', 'steak', 'tough', 'dried meat', 'gum', 'gummy', 'caramel', 'taffy', 'donut'],
+    'hot': ['soup', 'coffee', 'tea', 'pizza', 'hot', 'cooked', 'baked', 'steak'],
+    'cold': ['ice cream', 'popsicle', 'frozen', 'smoothie', 'cold', 'refrigerated'],
+    'sugary': [
+        'candy', 'cake', 'cheesecake', 'cupcake', 'pancake', 'shortcake', 'cookie', 'soda',
+        'chocolate', 'donut', 'ice cream', 'juice', 'fruit', 'dessert', 'sweet'
+    ],
+    'acidic': [
+        'orange', 'lemon', 'lime', 'grapefruit', 'tomato', 'vinegar', 'soda', 'wine',
+        'pickle', 'citrus'
+    ],
+    'soft': [
+        'banana', 'yogurt', 'oatmeal', 'smoothie', 'mashed', 'pudding', 'soup', 'pasta',
+        'bread', 'avocado', 'fish', 'egg', 'rice'
+    ],
+}
+
+# The first tag of each pair wins over the second.
+EXCLUSIVE_TAGS = (('hard', 'soft'), ('cold', 'hot'))
+
+
+class KeywordMatcher:
+    """Finds every keyword in a text with one regex pass.
+
+    ``keyword_labels`` maps each keyword to the labels it implies. The
+    keywords are compiled into a single alternation, longest first, inside
+    a lookahead so matches may overlap. At any position only the longest
+    keyword is reported, so each keyword also carries the labels of every
+    shorter keyword that would have matched at the same position.
+    """
+
+    def __init__(self, keyword_labels, whole_words=True, label_order=None):
+        normalized = {}
+        for keyword, labels in keyword_labels.items():
+            normalized.setdefault(self._normalize(keyword), set()).update(labels)
+        keyword_labels = normalized
+
+        keywords = sorted(keyword_labels, key=len, reverse=True)
+        alternation = '|'.join(re.escape(keyword) for keyword in keywords)
+
+        if whole_words:
+            self._pattern = re.compile(rf'\b(?=({alternation})(?:e?s)?\b)')
+            suffix = r'(?:e?s)?\b'
+        else:
+            self._pattern = re.compile(f'(?=({alternation}))')
+            suffix = ''
+
+        self._labels = {
+            keyword: frozenset().union(*(
+                keyword_labels[other] for other in keywords
+                if re.match(re.escape(other) + suffix, keyword)
+            ))
+            for keyword in keywords
+        }
+        self._rank = {label: index for index, label in enumerate(label_order or ())}
+
+    def _ordered(self, labels):
+        return sorted(labels, key=lambda label: self._rank.get(label, len(self._rank)))
+
+    def _normalize(self, text):
+        return text.lower().replace('_', ' ')
+
+    def search(self, text):
+        return self._pattern.search(self._normalize(text)) is not None
+
+    def labels(self, text):
+        found = set()
+        for match in self._pattern.finditer(self._normalize(text)):
+            found |= self._labels[match.group(1)]
+        return self._ordered(found)
+
+    def labels_many(self, texts):
+        """Label a list of texts with a single scan over their concatenation."""
+        texts = [self._normalize(text) for text in texts]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+
+        found = [set() for _ in texts]
+        for match in self._pattern.finditer('\n'.join(texts)):
+            found[bisect.bisect_right(starts, match.start()) - 1] |= self._labels[match.group(1)]
+
+        return [self._ordered(labels) for labels in found]
+
+
+def _invert(properties):
+    keyword_tags = {}
+    for tag, keywords in properties.items():
+        for keyword in keywords:
+            keyword_tags.setdefault(keyword, set()).add(tag)
+    return keyword_tags
+
+
+tag_matcher = KeywordMatcher(_invert(FOOD_PROPERTIES), label_order=TAG_ORDER)
+
+
+def exclusive(tags):
+    for first, second in EXCLUSIVE_TAGS:
+        if first in tags and second in tags:
+            tags.remove(second)
+    return tags
+
+
+def food_tags(food_name):
+    return exclusive(tag_matcher.labels(food_name))
+
+
+def food_tags_many(food_names):
+    return [exclusive(tags) for tags in tag_matcher.labels_many(food_names)]
@@ -0,0 +1,52 @@
+"""Gunicorn settings for service.py (picked up automatically from this directory).
+
+The app is ASGI, so each worker is a uvicorn worker running one event
+loop; model work runs on its bounded inference pool (see inference_pool.py).
+With ``INFERENCE_BACKEND=remote`` the master starts ``model_server.py``
+before forking workers and waits until it answers, so TensorFlow and the
+model are loaded once per host; workers only hold a socket and a small
+shared memory block each, and the worker count defaults to the core count
+(CPU affinity and cgroup quota, see runtime_config.py).
+With any other backend every worker loads its own model, so the default
+stays at one worker.
+"""
+import os
+import subprocess
+import sys
+
+from inference_backends import INFERENCE_BACKEND
+from runtime_config import worker_count
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+workers = worker_count(shared_model=INFERENCE_BACKEND == 'remote')
+# Workers size their TensorFlow thread pools from it (see runtime_config.py).
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+MODEL_SERVER_START_TIMEOUT = float(os.environ.get('MODEL_SERVER_START_TIMEOUT', 300))
+
+_model_server = None
+
+
+def on_starting(server):
+    global _model_server
+
+    if INFERENCE_BACKEND != 'remote':
+        return
+
+    from model_server import MODEL_SERVER_SOCKET, wait_until_ready
+
+    server.log.info("Starting model server...")
+    _model_server = subprocess.Popen([sys.executable, 'model_server.py', '--socket', MODEL_SERVER_SOCKET])
+    info = wait_until_ready(MODEL_SERVER_SOCKET, timeout=MODEL_SERVER_START_TIMEOUT, process=_model_server)
+    server.log.info(f"Model server ready (pid {info['pid']}, {info['backend']})")
+
+
+def on_exit(server):
+    if _model_server is not None and _model_server.poll() is None:
+        _model_server.terminate()
+        try:
+            _model_server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _model_server.kill()
@@ -0,0 +1,224 @@
+"""Per-user analysis history for dentist reports.
+
+Every analysis made for a known user (``userId`` in the userContext,
+``user_id`` on the multipart routes, or an ``X-User-Id`` header) is
+appended to a SQLite file in WAL mode at ``HISTORY_PATH``. Requests never
+wait on the database: ``record`` only appends to an in-memory buffer, and
+a background thread writes the buffer in one transaction every
+``HISTORY_FLUSH_INTERVAL_SECONDS`` or as soon as ``HISTORY_FLUSH_ROWS``
+rows are waiting. If the disk falls behind, at most
+``HISTORY_MAX_BUFFERED`` rows wait and the oldest are dropped (and
+counted). The buffer is flushed on shutdown.
+
+Rows are never updated or deleted. ``recent`` and ``summary`` read
+through an index on (user_id, ts) and include rows still in the buffer,
+so a report requested right after a scan already shows it. Every gunicorn
+worker on the host appends to the same file.
+
+Reading and writing history both need a token, and the history routes
+answer 404 until one is configured. A caller holding ``HISTORY_TOKEN`` (a
+reporting backend) may read any user's history. A caller holding
+``user_token(id)``, the hex HMAC-SHA256 of the user id under
+``HISTORY_SECRET``, may read only that user's, so it can be handed to the
+user's own client. An analysis is recorded only when its request carries
+a token that could read the history it names; otherwise it is answered
+and not recorded.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = os.environ.get('HISTORY_PATH', '')
+HISTORY_FLUSH_INTERVAL_SECONDS = float(os.environ.get('HISTORY_FLUSH_INTERVAL_SECONDS', 1.0))
+HISTORY_FLUSH_ROWS = int(os.environ.get('HISTORY_FLUSH_ROWS', 500))
+HISTORY_MAX_BUFFERED = int(os.environ.get('HISTORY_MAX_BUFFERED', 10000))
+HISTORY_RECENT_LIMIT = int(os.environ.get('HISTORY_RECENT_LIMIT', 50))
+HISTORY_MAX_RECENT_LIMIT = 500
+HISTORY_TOKEN = os.environ.get('HISTORY_TOKEN', '')
+HISTORY_SECRET = os.environ.get('HISTORY_SECRET', '')
+
+COLUMNS = ('user_id', 'ts', 'food_name', 'confidence', 'source', 'verdict', 'tags', 'route')
+
+written = metrics.counter('history_rows_written_total', 'Analysis history rows written to disk')
+dropped = metrics.counter('history_rows_dropped_total', 'Analysis history rows dropped from a full buffer')
+flush_seconds = metrics.histogram('history_flush_seconds', 'Time to write one batch of analysis history')
+
+
+def user_token(user_id, secret=None):
+    """The token that lets a caller read ``user_id``'s history, and no one else's."""
+    secret = HISTORY_SECRET if secret is None else secret
+    return hmac.new(secret.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()
+
+
+class HistoryStore:
+    def __init__(self, path=None, flush_interval=None, flush_rows=None, max_buffered=None):
+        self.path = HISTORY_PATH if path is None else path
+        self.flush_interval = HISTORY_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+        self.flush_rows = HISTORY_FLUSH_ROWS if flush_rows is None else flush_rows
+        self.max_buffered = HISTORY_MAX_BUFFERED if max_buffered is None else max_buffered
+
+        self._buffer = deque()
+        self._wake = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._local = threading.local()
+
+        if self.path:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            db = self._connection()
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS analyses ('
+                'id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, ts REAL NOT NULL, food_name TEXT NOT NULL, '
+                'confidence REAL, source TEXT, verdict TEXT, tags TEXT NOT NULL, route TEXT)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS analyses_user_ts ON analyses (user_id, ts)')
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, user_id, food_name, confidence, source, verdict, tags, route):
+        if not self.enabled or not user_id:
+            return
+
+        row = (str(user_id), time.time(), food_name, confidence, source, verdict, json.dumps(list(tags)), route)
+        with self._wake:
+            if len(self._buffer) >= self.max_buffered:
+                self._buffer.popleft()
+                dropped.inc()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.flush_rows:
+                self._wake.notify()
+
+    def recent(self, user_id, limit=None, before=None):
+        """The user's latest analyses, newest first, optionally older than ``before`` (epoch seconds)."""
+        limit = min(limit or HISTORY_RECENT_LIMIT, HISTORY_MAX_RECENT_LIMIT)
+        before = before if before is not None else float('inf')
+
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM analyses WHERE user_id = ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (user_id, before, limit)
+        ).fetchall()
+        rows += [row for row in self._buffered(user_id) if row[1] < before]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return [self._entry(row) for row in rows[:limit]]
+
+    def summary(self, user_id, since=None, until=None):
+        """Analysis counts for the user between ``since`` and ``until``, by verdict and by tag."""
+        since = since if since is not None else 0.0
+        until = until if until is not None else float('inf')
+        db = self._connection()
+
+        verdicts = Counter(dict(db.execute(
+            'SELECT verdict, COUNT(*) FROM analyses WHERE user_id = ? AND ts >= ? AND ts < ? GROUP BY verdict',
+            (user_id, since, until)
+        ).fetchall()))
+        tags = Counter(dict(db.execute(
+            'SELECT tag.value, COUNT(*) FROM analyses, json_each(analyses.tags) AS tag '
+            'WHERE user_id = ? AND ts >= ? AND ts < ? GROUP BY tag.value',
+            (user_id, since, until)
+        ).fetchall()))
+
+        for row in self._buffered(user_id):
+            if since <= row[1] < until:
+                verdicts[row[5]] += 1
+                tags.update(json.loads(row[6]))
+
+        return {
+            'total': sum(verdicts.values()),
+            'verdicts': dict(verdicts.most_common()),
+            'tags': dict(tags.most_common())
+        }
+
+    def flush(self):
+        with self._wake:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if not rows:
+            return 0
+
+        start = time.perf_counter()
+        db = self._connection()
+        try:
+            with db:
+                db.executemany(
+                    f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                )
+        except sqlite3.Error as e:
+            # Put the batch back for the next flush rather than lose it.
+            logger.error(f"Writing {len(rows)} history rows failed: {e}")
+            with self._wake:
+                self._buffer.extendleft(reversed(rows))
+                while len(self._buffer) > self.max_buffered:
+                    self._buffer.popleft()
+                    dropped.inc()
+            return 0
+
+        flush_seconds.observe(time.perf_counter() - start)
+        written.inc(len(rows))
+        return len(rows)
+
+    def close(self):
+        if not self.enabled or self._closed:
+            return
+        self._closed = True
+        with self._wake:
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._wake:
+            buffered = len(self._buffer)
+        return {
+            'enabled': self.enabled,
+            'path': self.path or None,
+            'buffered': buffered,
+            'flush_interval_seconds': self.flush_interval,
+            'flush_rows': self.flush_rows
+        }
+
+    def _run(self):
+        while not self._closed:
+            with self._wake:
+                if len(self._buffer) < self.flush_rows:
+                    self._wake.wait(self.flush_interval)
+            self.flush()
+
+    def _buffered(self, user_id):
+        with self._wake:
+            return [row for row in self._buffer if row[0] == user_id]
+
+    def _connection(self):
+        # One connection per thread: WAL lets readers run while the writer commits.
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(zip(COLUMNS, row))
+        entry['tags'] = json.loads(entry['tags'])
+        return entry
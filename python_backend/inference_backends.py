@@ -0,0 +1,265 @@
+"""Interchangeable inference backends for the Food-101 classifier.
+
+Every backend exposes the slice of the Keras model API the servers use:
+``predict_on_batch(inputs)`` on a float32 (batch, 224, 224, 3) array plus
+``input_shape`` and ``output_shape``. ``INFERENCE_BACKEND`` picks one:
+
+- ``keras``: the full TensorFlow model from ``models/food101_model.keras``.
+- ``tflite``: a converted model (see ``export_model.py``) run by the
+  TFLite interpreter. ``tflite_runtime`` is used when installed so the
+  process never imports TensorFlow at all; otherwise ``tf.lite`` is used.
+- ``remote``: a ``model_server.py`` process on the same host that owns the
+  model; tensors travel through shared memory.
+
+Thread pools and XLA compilation for the local runtimes are set by
+runtime_config.py.
+"""
+import os
+import threading
+
+import numpy as np
+
+from runtime_config import configure_tensorflow, predict_function, tflite_threads
+
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+KERAS_MODEL_PATH = os.environ.get('KERAS_MODEL_PATH', 'models/food101_model.keras')
+TFLITE_MODEL_PATH = os.environ.get('TFLITE_MODEL_PATH', 'models/food101_model.tflite')
+TFLITE_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', 0)) or None
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.environ.get('MODEL_SERVER_CONNECT_TIMEOUT', 10))
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path=None):
+        import tensorflow as tf
+
+        configure_tensorflow(tf)
+        self.model_path = model_path or KERAS_MODEL_PATH
+        self.runtime = f"tensorflow {tf.__version__}"
+        self.model = tf.keras.models.load_model(self.model_path)
+        self._predict = predict_function(tf, self.model)
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    @property
+    def output_shape(self):
+        return self.model.output_shape
+
+    def predict_on_batch(self, inputs):
+        return np.asarray(self._predict(inputs))
+
+
+def load_tflite_interpreter(model_path, num_threads=None):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        runtime = 'tflite_runtime'
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+        runtime = f"tensorflow {tf.__version__}"
+
+    return Interpreter(model_path=model_path, num_threads=num_threads), runtime
+
+
+class TFLiteBackend:
+    """Runs a .tflite model, quantizing inputs and dequantizing outputs as needed.
+
+    Models exported with ``--quantize int8`` may have int8 input and output
+    tensors; callers still pass float32 and get float32 probabilities. One
+    interpreter is not thread-safe, so calls are serialized; the batcher
+    already funnels single-image traffic through one thread.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path=None, num_threads=None):
+        self.model_path = model_path or TFLITE_MODEL_PATH
+        self.interpreter, self.runtime = load_tflite_interpreter(
+            self.model_path, num_threads or TFLITE_NUM_THREADS or tflite_threads()
+        )
+        self.interpreter.allocate_tensors()
+
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(dim) for dim in self._input['shape'][1:])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(dim) for dim in self._output['shape'][1:])
+
+    @property
+    def quantized(self):
+        return self._input['dtype'] != np.float32
+
+    def _resize(self, batch_size):
+        if batch_size == self._batch_size:
+            return
+        self.interpreter.resize_tensor_input(self._input['index'], [batch_size] + list(self._input['shape'][1:]))
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def _quantize(self, inputs):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return np.asarray(inputs, dtype=np.float32)
+
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(inputs / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, outputs):
+        if self._output['dtype'] == np.float32:
+            return outputs
+
+        scale, zero_point = self._output['quantization']
+        return (outputs.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, inputs):
+        with self._lock:
+            self._resize(len(inputs))
+            self.interpreter.set_tensor(self._input['index'], self._quantize(inputs))
+            self.interpreter.invoke()
+            outputs = self.interpreter.get_tensor(self._output['index'])
+            return self._dequantize(outputs)
+
+
+class RemoteBackend:
+    """Sends batches to a local ``model_server.py`` process.
+
+    Each calling thread gets its own socket connection and shared memory
+    block (sized for ``MODEL_SERVER_ROWS`` images), so threads never wait on
+    each other here; batches larger than the block are sent in chunks.
+    """
+
+    name = 'remote'
+
+    def __init__(self, socket_path=None, rows=None):
+        from model_server import MODEL_SERVER_ROWS, MODEL_SERVER_SOCKET, wait_until_ready
+
+        self.socket_path = socket_path or MODEL_SERVER_SOCKET
+        self.rows = rows or MODEL_SERVER_ROWS
+        self.info = wait_until_ready(self.socket_path, timeout=MODEL_SERVER_CONNECT_TIMEOUT)
+        self.runtime = f"{self.info['backend']} via model server pid {self.info['pid']} ({self.info['runtime']})"
+        self._local = threading.local()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(self.info['input_shape'])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(self.info['output_shape'])
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = _ModelServerConnection(self.socket_path, self.rows, self.info)
+            self._local.connection = connection
+        return connection
+
+    def predict_on_batch(self, inputs):
+        connection = self._connection()
+        try:
+            return connection.predict(inputs)
+        except OSError:
+            # The model server restarted; reconnect once with a fresh block.
+            connection.close()
+            self._local.connection = None
+            return self._connection().predict(inputs)
+
+
+class _ModelServerConnection:
+    def __init__(self, socket_path, rows, info):
+        import socket
+        from model_server import SharedBatch, recv_message, send_message
+
+        self._send, self._recv = send_message, recv_message
+        self.batch = SharedBatch.create(rows, info['input_shape'], info['output_shape'])
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(socket_path)
+            self._call({'op': 'attach', 'shm': self.batch.shm.name, 'rows': rows})
+        except Exception:
+            self.close()
+            raise
+
+    def _call(self, message):
+        self._send(self.sock, message)
+        reply = self._recv(self.sock)
+        if 'error' in reply:
+            raise RuntimeError(f"Model server error: {reply['error']}")
+        return reply
+
+    def predict(self, inputs):
+        rows = self.batch.rows
+        outputs = np.empty((len(inputs),) + self.batch.outputs.shape[1:], dtype=np.float32)
+
+        for start in range(0, len(inputs), rows):
+            chunk = inputs[start:start + rows]
+            self.batch.inputs[:len(chunk)] = chunk
+            self._call({'op': 'predict', 'rows': len(chunk)})
+            outputs[start:start + len(chunk)] = self.batch.outputs[:len(chunk)]
+
+        return outputs
+
+    def close(self):
+        try:
+            self.sock.close()
+        finally:
+            self.batch.close()
+            self.batch.shm.unlink()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def import_runtime(name=None):
+    """Import the heavy runtime a backend needs, so its cost can be timed on its own."""
+    name = name or INFERENCE_BACKEND
+    if name == 'keras':
+        import tensorflow
+        configure_tensorflow(tensorflow)
+        return tensorflow
+    if name == 'tflite':
+        try:
+            import tflite_runtime.interpreter
+            return tflite_runtime.interpreter
+        except ImportError:
+            import tensorflow
+            return tensorflow
+    return None
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'remote': RemoteBackend,
+}
+
+
+def backend_model_path(name=None):
+    name = name or INFERENCE_BACKEND
+    if name == 'remote':
+        from model_server import MODEL_SERVER_SOCKET
+        return MODEL_SERVER_SOCKET
+    return TFLITE_MODEL_PATH if name == 'tflite' else KERAS_MODEL_PATH
+
+
+def create_backend(name=None, model_path=None):
+    name = name or INFERENCE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path)
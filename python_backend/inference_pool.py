@@ -0,0 +1,69 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 8))
+INFERENCE_MAX_PENDING = int(os.environ.get('INFERENCE_MAX_PENDING', 16))
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', 1))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool that rejects work instead of queueing it without limit.
+
+    At most ``max_workers`` jobs run at once and ``max_pending`` more may
+    wait; anything beyond that raises QueueFullError immediately so the
+    caller can shed load rather than let latency pile up.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, name='inference'):
+        self.max_workers = max_workers or INFERENCE_WORKERS
+        self.max_pending = INFERENCE_MAX_PENDING if max_pending is None else max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self.rejected = metrics.counter(f'{name}_rejected_total', 'Jobs rejected because the queue was full')
+        self.completed = metrics.counter(f'{name}_completed_total', 'Jobs that ran to completion')
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            self.rejected.inc()
+            raise QueueFullError(f"{self._in_flight} jobs already queued or running")
+
+        with self._lock:
+            self._in_flight += 1
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if _future is not None:
+            self.completed.inc()
+
+    async def run(self, fn, *args, **kwargs):
+        # Run in a copy of the caller's context, as asyncio.to_thread does, so
+        # request-scoped state such as stage timings follows the job.
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(self.submit(context.run, fn, *args, **kwargs))
@@ -0,0 +1,348 @@
+"""Job mode for the analyze-food routes: submit now, fetch the result later.
+
+A client opts in with ``Prefer: respond-async`` (or ``?job=true``). The
+POST validates the upload, queues it and answers ``202`` with a job id
+and a ``Location`` to poll; a GET on that location long-polls for up to
+``?wait=`` seconds (default ``JOB_POLL_TIMEOUT_SECONDS``) and returns the
+job's status, plus the usual analysis result once it is done. A slow
+ChatGPT fallback then costs the client a second request instead of a
+timed-out one, and no HTTP worker waits on inference.
+
+``JOB_WORKERS`` threads per process run the jobs, independently of the
+inference pool the synchronous routes use, so job throughput is tuned
+separately from connection count. At most ``JOB_MAX_QUEUED`` jobs wait;
+beyond that a submit raises QueueFullError. Every job, finished or not,
+is dropped ``JOB_TTL_SECONDS`` after it was submitted.
+
+Jobs live in process memory unless ``JOB_STORE_PATH`` names a SQLite file.
+With the file, every gunicorn worker on the host claims from the same
+queue and can answer a poll for a job another worker accepted; each
+process still runs at most ``JOB_WORKERS`` jobs.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from inference_pool import QueueFullError
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_MAX_QUEUED = int(os.environ.get('JOB_MAX_QUEUED', 256))
+JOB_TTL_SECONDS = float(os.environ.get('JOB_TTL_SECONDS', 600))
+JOB_STORE_PATH = os.environ.get('JOB_STORE_PATH', '')
+# Longest a single GET waits; below the iOS client's 30 s request timeout.
+JOB_POLL_TIMEOUT_SECONDS = float(os.environ.get('JOB_POLL_TIMEOUT_SECONDS', 20))
+# How often waiters and idle workers re-check a store other processes write to.
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', 0.25))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+FINISHED = (DONE, FAILED)
+
+PURGE_INTERVAL_SECONDS = 5.0
+
+submitted = metrics.counter('jobs_submitted_total', 'Analysis jobs accepted')
+finished = metrics.counter('jobs_finished_total', 'Analysis jobs finished, by status', labels=('status',))
+queue_seconds = metrics.histogram('job_queue_seconds', 'Time analysis jobs waited for a worker')
+
+
+def job_mode(prefer=None, job=None):
+    """True when the client asked for a job, via ``?job=`` or ``Prefer: respond-async``."""
+    if job:
+        return job.lower() in ('1', 'true', 'yes')
+    return 'respond-async' in (prefer or '').lower()
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def add(self, job, max_queued):
+        with self._lock:
+            if len(self._queue) >= max_queued:
+                return False
+            self._jobs[job['id']] = job
+            self._queue.append(job['id'])
+            return True
+
+    def claim(self, now):
+        with self._lock:
+            while self._queue:
+                job = self._jobs.get(self._queue.popleft())
+                # Purged, or expired and about to be, while it waited.
+                if job is None or job['expires_at'] <= now:
+                    continue
+                job.update(status=RUNNING, started_at=now)
+                return dict(job)
+        return None
+
+    def finish(self, job_id, status, result, error, now):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, finished_at=now, image=None)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {key: value for key, value in job.items() if key != 'image'} if job else None
+
+    def purge(self, now):
+        with self._lock:
+            expired = {job_id for job_id, job in self._jobs.items() if job['expires_at'] <= now}
+            for job_id in expired:
+                del self._jobs[job_id]
+            if expired:
+                # Otherwise dead ids count against max_queued until a worker pops them.
+                self._queue = deque(job_id for job_id in self._queue if job_id not in expired)
+            return len(expired)
+
+    def counts(self):
+        with self._lock:
+            queued = len(self._queue)
+            return {'queued': queued, 'total': len(self._jobs)}
+
+
+class SqliteJobStore:
+    COLUMNS = ('id', 'kind', 'params', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at',
+               'expires_at')
+
+    def __init__(self, path):
+        # Autocommit, so claim() can take the write lock with BEGIN IMMEDIATE.
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, image BLOB, status TEXT NOT NULL, '
+            'result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, '
+            'expires_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+        self._lock = threading.Lock()
+
+    def add(self, job, max_queued):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                queued = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND expires_at > ?", (job['created_at'],)
+                ).fetchone()[0]
+                if queued >= max_queued:
+                    return False
+                self._db.execute(
+                    'INSERT INTO jobs (id, kind, params, image, status, created_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (job['id'], job['kind'], json.dumps(job['params']), job['image'], job['status'],
+                     job['created_at'], job['expires_at'])
+                )
+                return True
+            finally:
+                self._db.execute('COMMIT')
+
+    def claim(self, now):
+        # BEGIN IMMEDIATE serializes claims across processes, so each job runs once.
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    "SELECT id, kind, params, image, created_at FROM jobs "
+                    "WHERE status = 'queued' AND expires_at > ? ORDER BY created_at LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (now, row[0]))
+            finally:
+                self._db.execute('COMMIT')
+
+        job_id, kind, params, image, created_at = row
+        return {'id': job_id, 'kind': kind, 'params': json.loads(params), 'image': image, 'status': RUNNING,
+                'created_at': created_at, 'started_at': now}
+
+    def finish(self, job_id, status, result, error, now):
+        with self._lock:
+            self._db.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, image = NULL WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None, error, now, job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(self.COLUMNS, row))
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def purge(self, now):
+        with self._lock:
+            return self._db.execute('DELETE FROM jobs WHERE expires_at <= ?', (now,)).rowcount
+
+    def counts(self):
+        with self._lock:
+            queued, total = self._db.execute(
+                "SELECT COUNT(*) FILTER (WHERE status = 'queued'), COUNT(*) FROM jobs"
+            ).fetchone()
+        return {'queued': queued, 'total': total}
+
+
+class JobQueue:
+    """Runs ``handler(kind, image, params)`` on worker threads for queued jobs.
+
+    ``kind`` names the route shape the result is built for; ``image`` is
+    the uploaded bytes and ``params`` the JSON-serializable request options.
+    The handler's return value becomes the job's ``result``; an exception
+    fails the job with its message.
+    """
+
+    def __init__(self, handler, workers=None, max_queued=None, ttl=None, path=None):
+        self.handler = handler
+        self.workers = JOB_WORKERS if workers is None else workers
+        self.max_queued = JOB_MAX_QUEUED if max_queued is None else max_queued
+        self.ttl = JOB_TTL_SECONDS if ttl is None else ttl
+        path = JOB_STORE_PATH if path is None else path
+        self.store = SqliteJobStore(path) if path else MemoryJobStore()
+
+        self._wake = threading.Condition()
+        self._waiters = {}
+        self._waiters_lock = threading.Lock()
+        self._threads = []
+        self._last_purge = 0.0
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, kind, image, params):
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'params': params,
+            'image': bytes(image),
+            'status': QUEUED,
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': now + self.ttl
+        }
+
+        self._purge(now)
+        if not self.store.add(job, self.max_queued):
+            raise QueueFullError(f"{self.max_queued} jobs already queued")
+
+        submitted.inc()
+        with self._wake:
+            self._wake.notify()
+        return job['id']
+
+    def get(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job['expires_at'] <= time.time():
+            return None
+        return job
+
+    async def wait(self, job_id, timeout):
+        """The job once it has finished, or as it stands after ``timeout`` seconds; None if unknown."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max(0.0, timeout)
+
+        while True:
+            # Watch before reading, so a job finishing in between still wakes us.
+            waiter = self._watch(job_id, loop)
+            try:
+                job = self.get(job_id)
+                remaining = deadline - loop.time()
+                if job is None or job['status'] in FINISHED or remaining <= 0:
+                    return job
+
+                # Jobs finished by another process only show up on the next read.
+                try:
+                    await asyncio.wait_for(waiter, min(remaining, JOB_POLL_INTERVAL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                self._unwatch(job_id, waiter)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_queued': self.max_queued,
+            'ttl_seconds': self.ttl,
+            'store': 'sqlite' if isinstance(self.store, SqliteJobStore) else 'memory',
+            **self.store.counts()
+        }
+
+    def _run(self):
+        while True:
+            job = self.store.claim(time.time())
+            if job is None:
+                with self._wake:
+                    self._wake.wait(JOB_POLL_INTERVAL_SECONDS)
+                self._purge(time.time())
+                continue
+
+            queue_seconds.observe(job['started_at'] - job['created_at'])
+            try:
+                result, error, status = self.handler(job['kind'], job['image'], job['params']), None, DONE
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                result, error, status = None, str(e), FAILED
+
+            self.store.finish(job['id'], status, result, error, time.time())
+            finished.labels(status=status).inc()
+            self._notify(job['id'])
+
+    def _purge(self, now):
+        if now - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        purged = self.store.purge(now)
+        if purged:
+            logger.info(f"Dropped {purged} expired jobs")
+
+    def _watch(self, job_id, loop):
+        waiter = loop.create_future()
+        with self._waiters_lock:
+            self._waiters.setdefault(job_id, []).append((loop, waiter))
+        return waiter
+
+    def _unwatch(self, job_id, waiter):
+        with self._waiters_lock:
+            waiters = self._waiters.get(job_id, [])
+            self._waiters[job_id] = [entry for entry in waiters if entry[1] is not waiter]
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+
+    def _notify(self, job_id):
+        with self._waiters_lock:
+            waiters = list(self._waiters.get(job_id, []))
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
@@ -0,0 +1,193 @@
+"""In-process counters and histograms, exported as JSON or Prometheus text.
+
+Metrics are created through the module-level ``metrics`` registry.
+Passing ``labels=('stage',)`` returns a family whose series are picked
+with ``.labels(stage='predict')``.
+"""
+import bisect
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+    def render(self, labels=''):
+        return [f"{self.name}{_label_set(labels)} {_format_value(self._value)}"]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text='', buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            buckets['+Inf' if bound == float('inf') else str(bound)] = cumulative
+
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else None,
+            'buckets': buckets
+        }
+
+    def render(self, labels=''):
+        snapshot = self.snapshot()
+        prefix = labels + ',' if labels else ''
+        lines = [
+            f"{self.name}_bucket{{{prefix}le=\"{bound}\"}} {count}"
+            for bound, count in snapshot['buckets'].items()
+        ]
+        lines.append(f"{self.name}_sum{_label_set(labels)} {_format_value(snapshot['sum'])}")
+        lines.append(f"{self.name}_count{_label_set(labels)} {snapshot['count']}")
+        return lines
+
+
+class LabeledMetric:
+    """A counter or histogram split into one series per label combination."""
+
+    def __init__(self, name, help_text, kind, labelnames, factory):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **values):
+        key = tuple(str(values[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = self._factory()
+        return series
+
+    def _items(self):
+        with self._lock:
+            return list(self._series.items())
+
+    def snapshot(self):
+        return {
+            ','.join(f"{name}={value}" for name, value in zip(self.labelnames, key)): series.snapshot()
+            for key, series in self._items()
+        }
+
+    def render(self, labels=''):
+        lines = []
+        for key, series in self._items():
+            label_text = ','.join(
+                f'{name}="{_escape_label(value)}"' for name, value in zip(self.labelnames, key)
+            )
+            lines.extend(series.render(label_text))
+        return lines
+
+
+def _label_set(labels):
+    return f"{{{labels}}}" if labels else ''
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text='', labels=None):
+        if labels:
+            return self._get_or_create(
+                name, lambda: LabeledMetric(name, help_text, 'counter', labels, lambda: Counter(name, help_text))
+            )
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_LATENCY_BUCKETS, labels=None):
+        if labels:
+            return self._get_or_create(
+                name,
+                lambda: LabeledMetric(name, help_text, 'histogram', labels, lambda: Histogram(name, help_text, buckets))
+            )
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def _all(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self._all()}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in sorted(self._all(), key=lambda metric: metric.name):
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+metrics = MetricsRegistry()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""One process that owns the Food-101 model for every gunicorn worker.
+
+Workers run ``INFERENCE_BACKEND=remote`` (``RemoteBackend`` in
+``inference_backends.py``). Each worker thread creates one shared memory
+block, tells the model server its name once, and from then on writes its
+preprocessed batch into the block and sends a few bytes of JSON over a
+unix socket; the server runs the batch and writes probabilities back into
+the same block. No tensor is ever pickled or copied through the socket,
+and TensorFlow plus the weights exist once per host instead of once per
+worker. Requests from all workers go through one MicroBatcher, so
+concurrent single-image requests from different workers share forward
+passes too.
+
+    python model_server.py --backend keras --socket /tmp/brightbite-model.sock
+
+``gunicorn.conf.py`` starts and stops it automatically.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import time
+from concurrent.futures import wait
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+MODEL_SERVER_SOCKET = os.environ.get('MODEL_SERVER_SOCKET', '/tmp/brightbite-model.sock')
+MODEL_SERVER_BACKEND = os.environ.get('MODEL_SERVER_BACKEND', 'keras')
+MODEL_SERVER_ROWS = int(os.environ.get('MODEL_SERVER_ROWS', 16))
+
+_HEADER = struct.Struct('!I')
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Model server connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+class SharedBatch:
+    """Input and output arrays laid out back to back in one shared memory block."""
+
+    def __init__(self, shm, rows, input_shape, output_shape):
+        self.shm = shm
+        self.rows = rows
+        input_size = rows * int(np.prod(input_shape)) * 4
+
+        self.inputs = np.ndarray((rows,) + tuple(input_shape), dtype=np.float32, buffer=shm.buf)
+        self.outputs = np.ndarray((rows,) + tuple(output_shape), dtype=np.float32,
+                                  buffer=shm.buf, offset=input_size)
+
+    @staticmethod
+    def size(rows, input_shape, output_shape):
+        return rows * (int(np.prod(input_shape)) + int(np.prod(output_shape))) * 4
+
+    @classmethod
+    def create(cls, rows, input_shape, output_shape):
+        shm = shared_memory.SharedMemory(create=True, size=cls.size(rows, input_shape, output_shape))
+        return cls(shm, rows, input_shape, output_shape)
+
+    @classmethod
+    def attach(cls, name, rows, input_shape, output_shape):
+        shm = shared_memory.SharedMemory(name=name)
+        # The creating worker owns the block; without this the server's
+        # resource tracker would unlink it when the server exits.
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, rows, input_shape, output_shape)
+
+    def close(self):
+        self.inputs = self.outputs = None
+        self.shm.close()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, backend, socket_path):
+        self.backend = backend
+        self.input_shape = tuple(int(dim) for dim in backend.input_shape[1:])
+        self.output_shape = tuple(int(dim) for dim in backend.output_shape[1:])
+        self.batcher = MicroBatcher(backend.predict_on_batch, name='model_server')
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ModelServerHandler)
+
+    def info(self):
+        return {
+            'backend': self.backend.name,
+            'runtime': self.backend.runtime,
+            'input_shape': list(self.input_shape),
+            'output_shape': list(self.output_shape),
+            'pid': os.getpid()
+        }
+
+    def predict(self, batch, rows):
+        futures = [self.batcher.submit(batch.inputs[index]) for index in range(rows)]
+        wait(futures)
+        for index, future in enumerate(futures):
+            batch.outputs[index] = future.result()
+
+
+class ModelServerHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        batch = None
+        try:
+            while True:
+                try:
+                    message = recv_message(self.request)
+                except ConnectionError:
+                    return
+
+                op = message.get('op')
+                try:
+                    if op == 'info':
+                        send_message(self.request, self.server.info())
+                    elif op == 'attach':
+                        if batch is not None:
+                            batch.close()
+                        batch = SharedBatch.attach(
+                            message['shm'], message['rows'], self.server.input_shape, self.server.output_shape
+                        )
+                        send_message(self.request, {'ok': True})
+                    elif op == 'predict':
+                        rows = int(message['rows'])
+                        if batch is None or not 0 < rows <= batch.rows:
+                            raise ValueError(f"Bad predict request for {rows} rows")
+                        self.server.predict(batch, rows)
+                        send_message(self.request, {'ok': True, 'rows': rows})
+                    else:
+                        raise ValueError(f"Unknown op '{op}'")
+                except Exception as e:
+                    logger.warning(f"Model server request failed: {e}")
+                    send_message(self.request, {'error': str(e)})
+        finally:
+            if batch is not None:
+                batch.close()
+
+
+def wait_until_ready(socket_path, timeout=120.0, process=None):
+    """Block until a model server answers on ``socket_path``; returns its info."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Model server exited with code {process.returncode}")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(socket_path)
+                send_message(sock, {'op': 'info'})
+                return recv_message(sock)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Model server at {socket_path} not ready after {timeout:.0f}s")
+            time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default=MODEL_SERVER_BACKEND, help='keras or tflite')
+    parser.add_argument('--model', help='Model path (defaults to the backend default)')
+    parser.add_argument('--socket', default=MODEL_SERVER_SOCKET)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from inference_backends import create_backend
+    from runtime_config import set_process_count
+
+    # The only process on the host running the model gets every core.
+    set_process_count(1)
+
+    start = time.perf_counter()
+    backend = create_backend(args.backend, args.model)
+    server = ModelServer(backend, args.socket)
+
+    # Trace the graph before any worker depends on us.
+    server.backend.predict_on_batch(np.zeros((1,) + server.input_shape, dtype=np.float32))
+    logger.info(f"Model server ready on {args.socket} ({backend.runtime}, "
+                f"{time.perf_counter() - start:.1f}s)")
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""Versioned Food-101 models, reloaded without restarting the service.
+
+With ``MODEL_DIR`` set, the Food-101 classifier is loaded from a version
+directory under it instead of the fixed ``KERAS_MODEL_PATH``::
+
+    models/food101/
+        CURRENT                   name of the version to serve
+        2026-09-12/
+            manifest.json
+            model.keras
+            classes.txt
+            calibration.json      optional
+        2026-10-03/
+            ...
+
+``manifest.json`` describes the version: ``model`` (file name), ``classes``
+(default ``classes.txt``), ``input_size`` (default ``[224, 224]``),
+``normalization`` (default ``unit``), and optionally ``backend`` (keras or
+tflite, default ``INFERENCE_BACKEND``), ``calibration`` and ``version``
+(default the directory name). ``publish_model.py`` writes one. The served
+version is ``MODEL_VERSION`` when set, else the one ``CURRENT`` names, else
+the newest by name.
+
+A reload (the admin endpoint, or the watcher when ``CURRENT`` changes and
+``MODEL_WATCH_INTERVAL_SECONDS`` is set) builds and warms the new model on a
+background thread while the old one keeps serving, then the service swaps
+it in with one assignment. Requests already running finish on the model
+they started with. Each gunicorn worker reloads on its own; the watcher is
+what makes every worker follow a change.
+
+A version can instead be loaded as a shadow (``MODEL_SHADOW_VERSION`` or
+the admin endpoint): on ``MODEL_SHADOW_SAMPLE_RATE`` of single-image
+requests it classifies the same image off the request path, and top-1
+agreement and latency against the active model are reported.
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from classifiers import Food101Classifier
+from metrics import metrics
+from preprocessing import INPUT_SIZE, NORMALIZATION_SCALES
+from startup import StartupTracker
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get('MODEL_DIR', '')
+MODEL_VERSION = os.environ.get('MODEL_VERSION', '')
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get('MODEL_WATCH_INTERVAL_SECONDS', 0))
+MODEL_SHADOW_VERSION = os.environ.get('MODEL_SHADOW_VERSION', '')
+MODEL_SHADOW_SAMPLE_RATE = float(os.environ.get('MODEL_SHADOW_SAMPLE_RATE', 0.05))
+# Sampled requests beyond this many waiting comparisons are not compared.
+MODEL_SHADOW_MAX_PENDING = int(os.environ.get('MODEL_SHADOW_MAX_PENDING', 4))
+
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+
+shadow_comparisons = metrics.counter(
+    'model_shadow_comparisons_total', 'Requests classified by both the active and the shadow model',
+    labels=('agreement',)
+)
+shadow_seconds = metrics.histogram(
+    'model_shadow_classify_seconds', 'Preprocess, predict and decode time on shadowed requests', labels=('model',)
+)
+reloads = metrics.counter('model_reloads_total', 'Model reloads, by outcome', labels=('status',))
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def read_manifest(directory):
+    """The version's manifest with defaults filled in; raises ManifestError if it cannot be served."""
+    path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Cannot read {path}: {e}")
+
+    manifest = {
+        'version': os.path.basename(os.path.normpath(directory)),
+        'classes': 'classes.txt',
+        'input_size': list(INPUT_SIZE),
+        'normalization': 'unit',
+        **manifest
+    }
+
+    if 'model' not in manifest:
+        raise ManifestError(f"{path} does not name a model file")
+    if manifest['normalization'] not in NORMALIZATION_SCALES:
+        raise ManifestError(f"{path}: unknown normalization '{manifest['normalization']}'")
+    if len(manifest['input_size']) != 2:
+        raise ManifestError(f"{path}: input_size must be [width, height]")
+    if manifest.get('backend') not in (None, 'keras', 'tflite'):
+        # The model server loads its own model; reload it by restarting it.
+        raise ManifestError(f"{path}: versioned models run in-process, not on backend '{manifest['backend']}'")
+    for key in ('model', 'classes', 'calibration'):
+        if manifest.get(key) and not os.path.exists(os.path.join(directory, manifest[key])):
+            raise ManifestError(f"{path}: {key} file {manifest[key]} is missing")
+    return manifest
+
+
+def list_versions(model_dir=None):
+    model_dir = model_dir or MODEL_DIR
+    try:
+        names = os.listdir(model_dir)
+    except OSError:
+        return []
+    return sorted(name for name in names if os.path.isfile(os.path.join(model_dir, name, MANIFEST_NAME)))
+
+
+def resolve_version(model_dir=None, version=None):
+    """The version to serve: ``version``, else MODEL_VERSION, else CURRENT, else the newest."""
+    model_dir = model_dir or MODEL_DIR
+    version = version or MODEL_VERSION
+    if not version:
+        try:
+            with open(os.path.join(model_dir, CURRENT_NAME)) as f:
+                version = f.read().strip()
+        except OSError:
+            versions = list_versions(model_dir)
+            version = versions[-1] if versions else None
+
+    if not version:
+        raise ManifestError(f"No model versions under {model_dir}")
+    if version not in list_versions(model_dir):
+        raise ManifestError(f"No model version '{version}' under {model_dir}")
+    return version
+
+
+def set_current(model_dir, version):
+    """Point CURRENT at ``version``; written to a temporary file and renamed, so watchers never read half of it."""
+    descriptor, path = tempfile.mkstemp(dir=model_dir, prefix='.current-')
+    with os.fdopen(descriptor, 'w') as f:
+        f.write(version + '\n')
+    os.replace(path, os.path.join(model_dir, CURRENT_NAME))
+
+
+def versioned_classifier(model_dir=None, version=None):
+    """An unloaded Food101Classifier for the resolved version under ``model_dir``."""
+    model_dir = model_dir or MODEL_DIR
+    version = resolve_version(model_dir, version)
+    directory = os.path.join(model_dir, version)
+    return Food101Classifier.from_manifest(directory, read_manifest(directory))
+
+
+class ModelReloader:
+    """Loads one model at a time on a background thread, then hands it to ``activate``.
+
+    ``load(version, tracker)`` returns a loaded classifier (or raises);
+    ``activate(classifier, shadow)`` puts it into service. A reload started
+    with ``publish`` points CURRENT at the version once it is serving, so a
+    version that fails to load is never the one other workers and the next
+    start follow.
+    """
+
+    def __init__(self, load, activate, model_dir=None):
+        self.load = load
+        self.activate = activate
+        self.model_dir = model_dir or MODEL_DIR
+        self.state = 'idle'
+        self.version = None
+        self.shadow = False
+        self.error = None
+        self.stages = {}
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self.state == 'loading'
+
+    def start(self, version=None, shadow=False, publish=False):
+        """Begin loading ``version``; False if another load is still running."""
+        with self._lock:
+            if self.busy:
+                return False
+            self.state, self.version, self.shadow, self.error, self.stages = 'loading', version, shadow, None, {}
+
+        publish = publish and bool(version) and not shadow
+        threading.Thread(target=self._run, args=(version, shadow, publish), name='model-reload', daemon=True).start()
+        return True
+
+    def _run(self, version, shadow, publish):
+        tracker = StartupTracker(f"model {version or 'reload'}")
+        try:
+            model = self.load(version, tracker)
+            with tracker.stage('swap'):
+                self.activate(model, shadow)
+            if publish:
+                try:
+                    set_current(self.model_dir, version)
+                except OSError as e:
+                    logger.warning(f"Could not point {self.model_dir}/CURRENT at {version}: {e}")
+            self.state = 'done'
+            reloads.labels(status='done').inc()
+            logger.info(f"Model {model.version or model.name} {'shadowing' if shadow else 'active'}: {tracker.summary()}")
+        except Exception as e:
+            self.state, self.error = 'failed', str(e)
+            reloads.labels(status='failed').inc()
+            logger.exception(f"Loading model {version or ''} failed, keeping the current one: {e}")
+        finally:
+            self.stages = {name: round(seconds, 3) for name, seconds in tracker.stages.items()}
+            self.finished_at = time.time()
+
+    def status(self):
+        return {
+            'state': self.state,
+            'version': self.version,
+            'shadow': self.shadow,
+            'error': self.error,
+            'stages': self.stages,
+            'finished_at': self.finished_at
+        }
+
+
+class ModelWatcher:
+    """Calls ``on_change(version)`` when the version MODEL_DIR resolves to changes."""
+
+    def __init__(self, on_change, model_dir=None, interval=None):
+        self.on_change = on_change
+        self.model_dir = model_dir or MODEL_DIR
+        self.interval = MODEL_WATCH_INTERVAL_SECONDS if interval is None else interval
+        self._thread = None
+
+    def start(self, current):
+        if self._thread or not self.model_dir or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(current,), name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def _run(self, last):
+        while True:
+            time.sleep(self.interval)
+            try:
+                version = resolve_version(self.model_dir)
+            except ManifestError as e:
+                logger.warning(f"Model watcher: {e}")
+                continue
+            if version != last:
+                last = version
+                logger.info(f"Model watcher: {self.model_dir} now resolves to {version}")
+                self.on_change(version)
+
+
+class ShadowComparison:
+    """Classifies a sample of requests with a second model, off the request path.
+
+    ``classify(model, image)`` returns ``(food_name, ...)`` as the service's
+    own model call does; only top-1 names are compared.
+    """
+
+    def __init__(self, model, classify, sample_rate=None, max_pending=None):
+        self.model = model
+        self.classify = classify
+        self.sample_rate = MODEL_SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.max_pending = MODEL_SHADOW_MAX_PENDING if max_pending is None else max_pending
+        self.compared = self.agreed = self.skipped = self.failed = 0
+        self.active_seconds = self.shadow_seconds = 0.0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+
+    def maybe_compare(self, image, result, seconds):
+        """Queue a comparison for a sampled request, given the active model's result and time."""
+        if random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += 1
+                return
+            self._pending += 1
+        # The request goes on using its image; the shadow gets its own copy.
+        self._pool.submit(self._compare, image.copy(), result, seconds)
+
+    def _compare(self, image, result, seconds):
+        try:
+            start = time.perf_counter()
+            shadow_result = self.classify(self.model, image)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Shadow model {self.model.version} failed: {e}")
+            with self._lock:
+                self.failed += 1
+                self._pending -= 1
+            return
+
+        agreed = shadow_result[0] == result[0]
+        shadow_comparisons.labels(agreement='agree' if agreed else 'disagree').inc()
+        shadow_seconds.labels(model='active').observe(seconds)
+        shadow_seconds.labels(model='shadow').observe(elapsed)
+        if not agreed:
+            logger.debug(f"Shadow {self.model.version} says {shadow_result[0]}, active model {result[0]}")
+
+        with self._lock:
+            self.compared += 1
+            self.agreed += agreed
+            self.active_seconds += seconds
+            self.shadow_seconds += elapsed
+            self._pending -= 1
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.model.close()
+
+    def status(self):
+        with self._lock:
+            compared = self.compared
+            return {
+                'version': self.model.version,
+                'sample_rate': self.sample_rate,
+                'compared': compared,
+                'agreement': self.agreed / compared if compared else None,
+                'active_mean_ms': self.active_seconds / compared * 1000 if compared else None,
+                'shadow_mean_ms': self.shadow_seconds / compared * 1000 if compared else None,
+                'skipped': self.skipped,
+                'failed': self.failed
+            }
@@ -0,0 +1,214 @@
+"""Image decoding and preprocessing shared by both servers.
+
+Phone photos are 12 MP or more while the classifiers take 224x224, so
+JPEGs are decoded with ``Image.draft`` to let libjpeg downscale by up to
+8x during the decode itself. EXIF orientation is applied before resizing,
+and pixels are written as float32 straight into a caller-supplied (or
+thread-local, preallocated) batch buffer instead of going through a
+float64 temporary.
+
+Decoding and resize/normalize are timed as the ``image_decode`` and
+``preprocess`` request stages (see request_timing.py).
+
+With test-time augmentation (``TTA``) an image becomes several views
+instead of one squashed resize: a horizontal flip, an aspect-preserving
+letterbox and crops of the image resized on its shorter side, so a plate
+that fills part of the frame is also seen undistorted and up close. The
+views come from at most three resizes; flips and crops are array slices,
+and the whole stack is normalized in one pass.
+"""
+import io
+import os
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from request_timing import stage
+
+INPUT_SIZE = (224, 224)
+
+# Ask libjpeg for at least twice the target size so the final resize still
+# has enough pixels to antialias from.
+DRAFT_OVERSAMPLE = 2
+
+TTA_ENABLED = os.environ.get('TTA', '').lower() in ('1', 'true', 'yes')
+TTA_VIEWS = tuple(
+    view.strip()
+    for view in os.environ.get(
+        'TTA_VIEWS', 'resize,flip,letterbox,center,top_left,top_right,bottom_left,bottom_right'
+    ).split(',')
+    if view.strip()
+)
+# Crops are taken from the image resized so its shorter side is this much
+# larger than the input, as in the usual 256 -> 224 evaluation crop.
+TTA_CROP_SCALE = 256 / 224
+# Neutral gray for the letterbox bars.
+LETTERBOX_FILL = 128
+
+NORMALIZATION_SCALES = {
+    'unit': np.float32(1.0 / 255.0),
+    'raw': None,
+}
+
+_local = threading.local()
+
+
+def open_image(source):
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+
+def decode_image(source, size=INPUT_SIZE):
+    """Open and decode an image, letting libjpeg downscale towards ``size``."""
+    image = open_image(source)
+    if image.format == 'JPEG':
+        image.draft('RGB', (size[0] * DRAFT_OVERSAMPLE, size[1] * DRAFT_OVERSAMPLE))
+    image.load()
+    return image
+
+
+def resize_image(image, size=INPUT_SIZE):
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    if image.size != tuple(size):
+        image = image.resize(size, reducing_gap=3.0)
+
+    return image
+
+
+def prepare_image(source, size=INPUT_SIZE):
+    """Decode, orient and resize an image to ``size``; returns an RGB PIL image."""
+    with stage('image_decode'):
+        image = decode_image(source, size)
+    with stage('preprocess'):
+        return resize_image(image, size)
+
+
+def write_pixels(image, out, normalization='unit'):
+    pixels = np.asarray(image)
+    scale = NORMALIZATION_SCALES[normalization]
+
+    if scale is None:
+        np.copyto(out, pixels)
+    else:
+        np.multiply(pixels, scale, out=out, casting='unsafe')
+
+    return out
+
+
+def preprocess(source, size=INPUT_SIZE, normalization='unit', out=None):
+    """Return a float32 (height, width, 3) array for one image.
+
+    ``normalization`` is 'unit' for [0, 1] inputs (the Food-101 model) or
+    'raw' for [0, 255] inputs (Keras EfficientNet, which rescales inside the
+    model). Pass ``out`` to write into an existing buffer row.
+    """
+    with stage('image_decode'):
+        image = decode_image(source, size)
+
+    with stage('preprocess'):
+        image = resize_image(image, size)
+        if out is None:
+            out = np.empty((size[1], size[0], 3), dtype=np.float32)
+        return write_pixels(image, out, normalization)
+
+
+def crop(pixels, size, vertical, horizontal):
+    """A ``size`` window of ``pixels``; each position is 0 (start), 0.5 (center) or 1 (end)."""
+    height, width = pixels.shape[:2]
+    top = int(round((height - size[1]) * vertical))
+    left = int(round((width - size[0]) * horizontal))
+    return pixels[top:top + size[1], left:left + size[0]]
+
+
+def letterbox(image, size):
+    scale = min(size[0] / image.width, size[1] / image.height)
+    fitted = image.resize(
+        (max(1, round(image.width * scale)), max(1, round(image.height * scale))), reducing_gap=3.0
+    )
+    canvas = np.full((size[1], size[0], 3), LETTERBOX_FILL, dtype=np.uint8)
+    top = (size[1] - fitted.height) // 2
+    left = (size[0] - fitted.width) // 2
+    canvas[top:top + fitted.height, left:left + fitted.width] = np.asarray(fitted)
+    return canvas
+
+
+def short_side_resize(image, size):
+    scale = max(size[0], size[1]) * TTA_CROP_SCALE / min(image.width, image.height)
+    return np.asarray(image.resize(
+        (max(size[0], round(image.width * scale)), max(size[1], round(image.height * scale))), reducing_gap=3.0
+    ))
+
+
+CROP_POSITIONS = {
+    'center': (0.5, 0.5),
+    'top_left': (0, 0),
+    'top_right': (0, 1),
+    'bottom_left': (1, 0),
+    'bottom_right': (1, 1),
+}
+
+
+def views_decode_size(size):
+    """What preprocess_views decodes towards: enough pixels for the crops."""
+    return round(size[0] * TTA_CROP_SCALE), round(size[1] * TTA_CROP_SCALE)
+
+
+def preprocess_views(source, views=None, size=INPUT_SIZE, normalization='unit', out=None):
+    """Return a float32 (views, height, width, 3) stack of TTA views of one image.
+
+    ``views`` lists names from 'resize' (the plain squashed resize),
+    'flip', 'letterbox' and the crops in CROP_POSITIONS.
+    """
+    views = views or TTA_VIEWS
+
+    with stage('image_decode'):
+        image = decode_image(source, views_decode_size(size))
+
+    with stage('preprocess'):
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        resized = cropped_from = None
+        pixels = np.empty((len(views), size[1], size[0], 3), dtype=np.uint8)
+        for row, view in zip(pixels, views):
+            if view in ('resize', 'flip'):
+                if resized is None:
+                    resized = np.asarray(image.resize(size, reducing_gap=3.0) if image.size != tuple(size) else image)
+                row[...] = resized[:, ::-1] if view == 'flip' else resized
+            elif view == 'letterbox':
+                row[...] = letterbox(image, size)
+            elif view in CROP_POSITIONS:
+                if cropped_from is None:
+                    cropped_from = short_side_resize(image, size)
+                row[...] = crop(cropped_from, size, *CROP_POSITIONS[view])
+            else:
+                raise ValueError(f"Unknown TTA view '{view}'")
+
+        if out is None:
+            out = np.empty(pixels.shape, dtype=np.float32)
+        return write_pixels(pixels, out, normalization)
+
+
+def batch_buffer(count, size=INPUT_SIZE):
+    """Thread-local float32 buffer with room for ``count`` images.
+
+    The buffer is reused by later calls on the same thread, so callers must
+    finish with it (e.g. run predict) before preprocessing the next batch.
+    """
+    shape = (size[1], size[0], 3)
+    buffer = getattr(_local, 'buffer', None)
+
+    if buffer is None or buffer.shape[1:] != shape or buffer.shape[0] < count:
+        capacity = max(count, buffer.shape[0] if buffer is not None else 0)
+        buffer = np.empty((capacity,) + shape, dtype=np.float32)
+        _local.buffer = buffer
+
+    return buffer[:count]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Publish a trained Food-101 model as a version directory for MODEL_DIR.
+
+    python publish_model.py --model models/food101_model.keras --version 2026-10-03
+    python publish_model.py --model models/food101_model.tflite --calibration models/calibration.json --activate
+
+Copies the model, its classes file and optionally its calibration into
+``<model-dir>/<version>/`` and writes manifest.json last, so a half-copied
+version is never listed. ``--activate`` then points CURRENT at it: services
+running the model watcher load it in the background, the others on the
+next admin reload or restart (see model_versions.py).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from classifiers import FOOD_CLASSES_PATH
+from model_versions import MANIFEST_NAME, MODEL_DIR, ManifestError, read_manifest, set_current
+from preprocessing import INPUT_SIZE, NORMALIZATION_SCALES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', required=True, help='.keras or .tflite model file')
+    parser.add_argument('--classes', default=FOOD_CLASSES_PATH)
+    parser.add_argument('--calibration', help='calibration.json fitted on this model (fit_calibration.py)')
+    parser.add_argument('--model-dir', default=MODEL_DIR or 'models/food101')
+    parser.add_argument('--version', default=time.strftime('%Y%m%d-%H%M%S'))
+    parser.add_argument('--backend', choices=('keras', 'tflite'), help='Defaults from the model file extension')
+    parser.add_argument('--input-size', type=int, nargs=2, default=INPUT_SIZE, metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--normalization', choices=tuple(NORMALIZATION_SCALES), default='unit')
+    parser.add_argument('--activate', action='store_true', help='Point CURRENT at the new version')
+    args = parser.parse_args()
+
+    directory = os.path.join(args.model_dir, args.version)
+    if os.path.exists(directory):
+        sys.exit(f"{directory} already exists; versions are never overwritten")
+    os.makedirs(directory)
+
+    manifest = {
+        'version': args.version,
+        'backend': args.backend or ('tflite' if args.model.endswith('.tflite') else 'keras'),
+        'model': os.path.basename(args.model),
+        'classes': 'classes.txt',
+        'input_size': list(args.input_size),
+        'normalization': args.normalization,
+        'published_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    shutil.copy2(args.model, os.path.join(directory, manifest['model']))
+    shutil.copy2(args.classes, os.path.join(directory, manifest['classes']))
+    if args.calibration:
+        manifest['calibration'] = 'calibration.json'
+        shutil.copy2(args.calibration, os.path.join(directory, manifest['calibration']))
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    try:
+        read_manifest(directory)
+    except ManifestError as e:
+        shutil.rmtree(directory)
+        sys.exit(str(e))
+    print(f"Published {directory}")
+
+    if args.activate:
+        set_current(args.model_dir, args.version)
+        print(f"{args.model_dir}/CURRENT -> {args.version}")
+
+
+if __name__ == '__main__':
+    main()
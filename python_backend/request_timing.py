@@ -0,0 +1,89 @@
+"""Per-stage timings for analysis requests.
+
+Each request gets a ``RequestTimings`` (``begin_request``) held in a
+context variable, so code anywhere on the request path can time itself
+with ``with stage('predict'):`` without the timings being passed down.
+Every stage is observed in the ``request_stage_seconds`` histogram
+(labelled by stage, exported on /metrics) and summed per request for the
+``Server-Timing`` response header.
+
+Stages: body_read, base64_decode, image_decode, preprocess, queue_wait,
+predict, embedding_lookup, fallback, verdict, plus total for the whole
+request. Work handed to a thread pool only counts towards the request if
+it runs under ``bind`` (or a copied context); otherwise it still reaches
+the histogram.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+
+from metrics import metrics
+
+stage_seconds = metrics.histogram(
+    'request_stage_seconds', 'Time spent in each stage of an analysis request', labels=('stage',)
+)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        # Stages timed on several pool threads at once (batch decode) add up.
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def finish(self):
+        """Record the request's total time and return the Server-Timing header value."""
+        total = time.perf_counter() - self.started_at
+        stage_seconds.labels(stage='total').observe(total)
+
+        with self._lock:
+            entries = list(self.stages.items())
+        entries.append(('total', total))
+        return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in entries)
+
+
+def begin_request():
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current_timings():
+    return _current.get()
+
+
+def record_stage(name, seconds):
+    stage_seconds.labels(stage=name).observe(seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.record(name, seconds)
+
+
+@contextlib.contextmanager
+def stage(name):
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started_at)
+
+
+def bind(fn):
+    """Wrap ``fn`` so stages it times on another thread count towards the current request."""
+    timings = _current.get()
+
+    def run(*args, **kwargs):
+        token = _current.set(timings)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 24 * 3600))
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', '')
+RESULT_CACHE_PERCEPTUAL = os.environ.get('RESULT_CACHE_PERCEPTUAL', '').lower() in ('1', 'true', 'yes')
+RESULT_CACHE_PERCEPTUAL_DISTANCE = int(os.environ.get('RESULT_CACHE_PERCEPTUAL_DISTANCE', 4))
+
+CACHED_FIELDS = ('food_name', 'confidence', 'source', 'candidates')
+
+
+def content_key(source):
+    """SHA-256 of the decoded image bytes; ``source`` is bytes or a seekable stream."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    position = source.tell()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(1 << 16), b''):
+        digest.update(chunk)
+    source.seek(position)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image):
+    """64-bit difference hash; visually similar images differ in few bits.
+
+    Hash an already decoded (ideally downscaled) and upright image: on a
+    lazily opened upload this would decode every pixel at full size.
+    """
+    small = image.convert('L').resize((9, 8))
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class ResultCache:
+    """Two-level cache of model outputs keyed by image content.
+
+    Level one is an in-process LRU with a TTL; level two is an optional
+    SQLite file shared by every worker on the host. Only the classifier
+    output is stored: the verdict depends on the caller's userContext and
+    is recomputed for each request. Callers hash the image once (see
+    ``perceptual_hash``) and pass the same ``phash`` to ``get`` and ``put``;
+    it is ignored unless perceptual matching is on.
+
+    Keys are ``<model>:<content hash>``. A near-duplicate image only matches
+    entries under the same ``<model>`` prefix, so it never gets another
+    classifier's (or another version's) result.
+    """
+
+    def __init__(self, max_size=None, ttl=None, path=None, perceptual=None, perceptual_distance=None):
+        self.max_size = RESULT_CACHE_SIZE if max_size is None else max_size
+        self.ttl = RESULT_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.perceptual = RESULT_CACHE_PERCEPTUAL if perceptual is None else perceptual
+        self.perceptual_distance = (RESULT_CACHE_PERCEPTUAL_DISTANCE
+                                    if perceptual_distance is None else perceptual_distance)
+
+        self._entries = OrderedDict()
+        self._perceptual_keys = {}
+        self._lock = threading.Lock()
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        path = RESULT_CACHE_PATH if path is None else path
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, phash INTEGER, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_phash ON results (phash)')
+            self._db.commit()
+
+        self.hits = metrics.counter('result_cache_hits_total', 'Lookups answered from the in-process cache')
+        self.disk_hits = metrics.counter('result_cache_disk_hits_total', 'Lookups answered from the on-disk cache')
+        self.perceptual_hits = metrics.counter(
+            'result_cache_perceptual_hits_total', 'Lookups answered by a near-duplicate image'
+        )
+        self.misses = metrics.counter('result_cache_misses_total', 'Lookups not found in any cache level')
+        self.evictions = metrics.counter('result_cache_evictions_total', 'Entries evicted from the in-process LRU')
+        self.expirations = metrics.counter('result_cache_expirations_total', 'Entries dropped after their TTL')
+
+    def get(self, key, phash=None):
+        now = time.time()
+        phash = phash if self.perceptual else None
+
+        value = self._get_memory(key, now)
+        if value is not None:
+            self.hits.inc()
+            return value
+
+        value = self._get_disk(key, now)
+        if value is not None:
+            self.disk_hits.inc()
+            self._put_memory(key, value, now + self.ttl, phash)
+            return value
+
+        if phash is not None:
+            value = self._get_perceptual(model_scope(key), phash, now)
+            if value is not None:
+                self.perceptual_hits.inc()
+                return value
+
+        self.misses.inc()
+        return None
+
+    def put(self, key, result, phash=None):
+        value = {field: result[field] for field in CACHED_FIELDS}
+        expires_at = time.time() + self.ttl
+        phash = phash if self.perceptual else None
+
+        self._put_memory(key, value, expires_at, phash)
+
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO results (key, phash, value, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, _to_signed64(phash), json.dumps(value), expires_at)
+                )
+                self._db.commit()
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value, phash = entry
+            if expires_at <= now:
+                self._remove(key, phash)
+                self.expirations.inc()
+                return None
+
+            self._entries.move_to_end(key)
+            return dict(value)
+
+    def _put_memory(self, key, value, expires_at, phash):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (expires_at, value, phash)
+            if phash is not None:
+                self._perceptual_keys[model_scope(key), phash] = key
+
+            while len(self._entries) > self.max_size:
+                old_key, (_, _, old_phash) = self._entries.popitem(last=False)
+                self._forget_phash(old_key, old_phash)
+                self.evictions.inc()
+
+    def drop_model(self, scope):
+        """Forget the in-process entries of a model that is no longer served.
+
+        The on-disk entries stay until their TTL: other workers may still be
+        serving that model.
+        """
+        with self._lock:
+            for key in [key for key in self._entries if model_scope(key) == scope]:
+                self._remove(key, self._entries[key][2])
+
+    def _remove(self, key, phash):
+        self._entries.pop(key, None)
+        self._forget_phash(key, phash)
+
+    def _forget_phash(self, key, phash):
+        index_key = (model_scope(key), phash)
+        if phash is not None and self._perceptual_keys.get(index_key) == key:
+            del self._perceptual_keys[index_key]
+
+    def _get_disk(self, key, now):
+        if self._db is None:
+            return None
+
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT value FROM results WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _get_perceptual(self, scope, phash, now):
+        with self._lock:
+            for (candidate_scope, candidate), key in self._perceptual_keys.items():
+                if candidate_scope == scope and (candidate ^ phash).bit_count() <= self.perceptual_distance:
+                    expires_at, value, _ = self._entries[key]
+                    if expires_at > now:
+                        return dict(value)
+
+        if self._db is None:
+            return None
+
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT value FROM results WHERE phash = ? AND substr(key, 1, ?) = ? AND expires_at > ?',
+                (_to_signed64(phash), len(scope) + 1, scope + ':', now)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'disk': self._db is not None,
+            'perceptual': self.perceptual
+        }
+
+
+def model_scope(key):
+    """The ``<model>`` part of a ``<model>:<content hash>`` key."""
+    return key.rpartition(':')[0]
+
+
+def _to_signed64(value):
+    # SQLite integers are signed 64-bit.
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
@@ -0,0 +1,153 @@
+"""Thread pools and compilation for the inference runtime in each process.
+
+Left alone, TensorFlow sizes its intra-op and inter-op pools to every core
+on the host in every gunicorn worker, so N workers run N x cores threads
+and tail latency collapses under load. Before the first op runs,
+``configure_tensorflow`` splits the cores this process may use (affinity
+and cgroup quota, or ``CPU_CORES``) between the processes that load a
+model: the ``WEB_CONCURRENCY`` workers, or the single model server with
+``INFERENCE_BACKEND=remote``. ``TF_INTRA_OP_THREADS`` and
+``TF_INTER_OP_THREADS`` override the split (0 keeps TensorFlow's own
+default); the TFLite interpreter gets the same intra-op count.
+
+``TF_JIT_COMPILE`` runs Keras models through ``tf.function(jit_compile=True)``
+so XLA fuses the graph. XLA compiles once per input shape, so batches are
+zero-padded to the next power of two and each size compiles on first use.
+oneDNN kernels are TensorFlow's own switch, ``TF_ENABLE_ONEDNN_OPTS``,
+read when TensorFlow is imported.
+
+``benchmarks/bench_runtime_config.py`` sweeps these settings for a core count.
+"""
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CPU_CORES = int(os.environ.get('CPU_CORES', 0)) or None
+TF_INTRA_OP_THREADS = os.environ.get('TF_INTRA_OP_THREADS', 'auto')
+TF_INTER_OP_THREADS = os.environ.get('TF_INTER_OP_THREADS', 'auto')
+TF_JIT_COMPILE = os.environ.get('TF_JIT_COMPILE', '').lower() in ('1', 'true', 'yes')
+
+_lock = threading.Lock()
+_process_count = None
+_tensorflow_settings = None
+
+
+def cpu_cores():
+    """Cores this process may run on: its CPU affinity, capped by a cgroup v2 quota."""
+    if CPU_CORES:
+        return CPU_CORES
+
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+def worker_count(shared_model=False):
+    """gunicorn workers: one per core when a model server holds the model, otherwise one."""
+    return int(os.environ.get('WEB_CONCURRENCY', cpu_cores() if shared_model else 1))
+
+
+def set_process_count(count):
+    """Declare how many processes on this host share the cores (the model server is alone)."""
+    global _process_count
+    _process_count = count
+
+
+def thread_counts(processes=None, cores=None):
+    """(intra_op, inter_op) threads for one of ``processes`` processes; 0 means the runtime default."""
+    processes = processes or _process_count or worker_count()
+    share = max(1, (cores or cpu_cores()) // processes)
+
+    intra = share if TF_INTRA_OP_THREADS == 'auto' else int(TF_INTRA_OP_THREADS)
+    # The classifiers are chains of ops; a second inter-op thread only helps
+    # overlap the small ones, and only when there are cores to spare.
+    inter = min(2, share) if TF_INTER_OP_THREADS == 'auto' else int(TF_INTER_OP_THREADS)
+    return intra, inter
+
+
+def tflite_threads():
+    intra, _ = thread_counts()
+    return intra or None
+
+
+def configure_tensorflow(tf):
+    """Size TensorFlow's thread pools for this process, once, before its first op."""
+    global _tensorflow_settings
+
+    with _lock:
+        if _tensorflow_settings is not None:
+            return _tensorflow_settings
+
+        intra, inter = thread_counts()
+        try:
+            if intra:
+                tf.config.threading.set_intra_op_parallelism_threads(intra)
+            if inter:
+                tf.config.threading.set_inter_op_parallelism_threads(inter)
+        except RuntimeError as e:
+            # Something ran an op first; the pools already exist.
+            logger.warning(f"TensorFlow thread pools already initialized, left unchanged: {e}")
+
+        _tensorflow_settings = {
+            'intra_op_threads': tf.config.threading.get_intra_op_parallelism_threads(),
+            'inter_op_threads': tf.config.threading.get_inter_op_parallelism_threads(),
+        }
+        logger.info(f"TensorFlow threads: {_tensorflow_settings['intra_op_threads']} intra-op, "
+                    f"{_tensorflow_settings['inter_op_threads']} inter-op ({cpu_cores()} cores, "
+                    f"{_process_count or worker_count()} processes), jit_compile={TF_JIT_COMPILE}")
+        return _tensorflow_settings
+
+
+def padded_batch_size(count):
+    return 1 << max(0, count - 1).bit_length()
+
+
+class CompiledPredict:
+    """``predict_on_batch`` through an XLA-compiled ``tf.function``."""
+
+    def __init__(self, tf, model):
+        self._function = tf.function(lambda inputs: model(inputs, training=False), jit_compile=True)
+
+    def __call__(self, inputs):
+        count = len(inputs)
+        padded = padded_batch_size(count)
+        if padded != count:
+            inputs = np.concatenate([inputs, np.zeros((padded - count,) + inputs.shape[1:], dtype=inputs.dtype)])
+
+        outputs = self._function(inputs)
+        if isinstance(outputs, (list, tuple)):
+            return [np.asarray(output)[:count] for output in outputs]
+        return np.asarray(outputs)[:count]
+
+
+def predict_function(tf, model):
+    """The model's ``predict_on_batch``, XLA-compiled when ``TF_JIT_COMPILE`` is set."""
+    return CompiledPredict(tf, model) if TF_JIT_COMPILE else model.predict_on_batch
+
+
+def status():
+    intra, inter = thread_counts()
+    return {
+        'cpu_cores': cpu_cores(),
+        'processes': _process_count or worker_count(),
+        'intra_op_threads': intra,
+        'inter_op_threads': inter,
+        'tensorflow': _tensorflow_settings,
+        'jit_compile': TF_JIT_COMPILE,
+        'onednn': os.environ.get('TF_ENABLE_ONEDNN_OPTS')
+    }
@@ -0,0 +1,1264 @@
+#!/usr/bin/env python3
+"""BrightBite food analysis service.
+
+One ASGI app serves both route shapes the clients use:
+
+- ``/api/analyze-food`` (base64 JSON), ``/api/analyze-food/upload`` (raw
+  or multipart bytes) and ``/api/analyze-food/batch``: camelCase results
+  with the userContext verdict rules. These were the Flask ``server.py``.
+- ``/analyze-food`` and ``/analyze-food/batch``: multipart uploads with
+  snake_case results and the query-parameter verdict rules. These were
+  the FastAPI ``app.py``.
+
+Every route goes through the same pipeline: upload limits, the result
+cache, the micro-batched classifier chosen by ``CLASSIFIER`` (see
+classifiers.py), the ChatGPT fallback, then the shape's verdict. Model
+work runs on the bounded inference pool so the event loop only parses
+requests and writes responses. Single-image routes can also answer with
+a job to poll instead of the result (jobs.py). Analyses made for a known
+user are kept in their history (history.py). A new model version can be
+loaded and swapped in, or shadowed, while the service runs
+(model_versions.py). With ``TTA`` set, each image is classified from
+several augmented views in one forward pass and their probabilities
+averaged (see preprocessing.py). ``server.py`` and ``app.py`` remain as
+entry points for existing deployments.
+"""
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from typing import List
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import base64
+import hmac
+import io
+import json
+import logging
+import os
+import time
+import numpy as np
+from PIL import ImageOps
+import uvicorn
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from chatgpt_fallback import ChatGPTFallback
+from classifiers import CLASSIFIER, create_classifier
+from embedding_index import EmbeddingIndex
+from food_tags import food_tags
+from history import HISTORY_SECRET, HISTORY_TOKEN, HistoryStore, user_token
+from inference_pool import RETRY_AFTER_SECONDS, BoundedExecutor, QueueFullError
+from jobs import FINISHED, JOB_POLL_TIMEOUT_SECONDS, JobQueue, job_mode
+from metrics import PROMETHEUS_CONTENT_TYPE, metrics
+from model_versions import (
+    MODEL_DIR, MODEL_SHADOW_VERSION, ManifestError, ModelReloader, ModelWatcher, ShadowComparison, list_versions,
+    resolve_version, versioned_classifier
+)
+from preprocessing import (
+    TTA_ENABLED, TTA_VIEWS, batch_buffer, decode_image, preprocess, preprocess_views, views_decode_size
+)
+from request_timing import begin_request, bind, stage
+from result_cache import ResultCache, content_key, perceptual_hash
+from runtime_config import status as runtime_status
+from startup import StartupTracker
+from streaming import MIMETYPES, STREAM_HEADERS, encode_events, stream_mode
+from upload_limits import (
+    UploadRejected, body_limit, body_too_large, check_base64_size, check_content_length, check_image_size,
+    content_length, open_upload
+)
+from verdicts import determine_dental_safety, determine_verdict, get_safety_reasons, set_class_names
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = FastAPI(
+    title="BrightBite Food Analysis API",
+    description="Food analysis for dental health",
+    version="1.0.0"
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
+# Bearer token for the /api/admin routes; they answer 404 without one.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 16))
+DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', 4))
+
+ENDPOINTS = {
+    'health': '/api/health',
+    'live': '/livez',
+    'ready': '/readyz',
+    'metrics': '/metrics',
+    'analyze': '/api/analyze-food',
+    'analyze_upload': '/api/analyze-food/upload',
+    'analyze_batch': '/api/analyze-food/batch',
+    'analyze_multipart': '/analyze-food',
+    'analyze_multipart_batch': '/analyze-food/batch',
+    'analyze_job': '/api/analyze-food/jobs/{job_id}',
+    'analyze_multipart_job': '/analyze-food/jobs/{job_id}',
+    'history': '/api/history/{user_id}',
+    'history_summary': '/api/history/{user_id}/summary',
+    'multipart_history': '/history/{user_id}',
+    'multipart_history_summary': '/history/{user_id}/summary'
+}
+
+# Where each route shape's jobs are polled (see jobs.py).
+JOB_ROUTES = {
+    'api': '/api/analyze-food/jobs',
+    'multipart': '/analyze-food/jobs'
+}
+
+# Answer used while no model is loaded; its confidence is low enough that
+# the fallback takes over when it is configured.
+MOCK_CLASSIFICATION = ("Unknown Food", 0.5, "mock", [])
+
+# Replaced as a whole by a reload; a request resolves it once and keeps
+# that model to the end (see the shared pipeline below).
+classifier = versioned_classifier() if MODEL_DIR and CLASSIFIER == 'food101' else create_classifier()
+set_class_names(classifier.labels)
+
+# Reference images the model's unsure answers are checked against (see
+# embedding_index.py); loaded with the classifier when one is built for it.
+embedding_index = None
+
+startup = StartupTracker(f'{classifier.name} classifier')
+
+result_cache = ResultCache()
+
+chatgpt_fallback = ChatGPTFallback(OPENAI_API_KEY)
+
+inference_pool = BoundedExecutor(name='inference')
+
+job_queue = JobQueue(lambda request_shape, image_bytes, params: run_job(request_shape, image_bytes, params))
+
+history = HistoryStore()
+
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+model_reloader = ModelReloader(
+    lambda version, tracker: load_model(version, tracker),
+    lambda model, shadow: activate_model(model, shadow)
+)
+
+model_watcher = ModelWatcher(lambda version: follow_model_dir(version))
+
+# A candidate model classifying sampled requests next to the active one.
+shadow_comparison = None
+
+def warm_up(tracker: StartupTracker):
+    global embedding_index
+
+    # A model that fails to load leaves the /api routes in fallback mode;
+    # /readyz and the /analyze-food routes answer 503 until one is serving
+    # (see serving_model).
+    try:
+        classifier.load(tracker)
+    except Exception as e:
+        classifier.error = str(e)
+        logger.exception(f"❌ Failed to load the {classifier.name} classifier, running in fallback mode: {e}")
+        return
+
+    if classifier.loaded:
+        with tracker.stage('embedding_index'):
+            embedding_index = EmbeddingIndex.load(model=classifier.name)
+
+    if MODEL_SHADOW_VERSION:
+        model_reloader.start(MODEL_SHADOW_VERSION, shadow=True)
+
+@app.on_event("startup")
+async def startup_event():
+    logger.info(f"🔥 Loading the {classifier.name} classifier in the background...")
+    startup.start(warm_up)
+    job_queue.start()
+    history.start()
+    model_watcher.start(classifier.version)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write out analyses still waiting in the history buffer.
+    history.close()
+
+class UploadSizeGuard:
+    """Turns oversized POST bodies away with a 413.
+
+    A Content-Length over the limit is rejected before the body is read.
+    Without one (chunked uploads) the bytes are counted as the route reads
+    them: the read that crosses the limit fails, and whatever the route
+    made of that failure is replaced by the 413.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        limit = body_limit(batch=scope['path'].endswith('/batch'))
+        try:
+            check_content_length(content_length(request.headers.get('content-length')), limit)
+        except UploadRejected as e:
+            return await (await upload_rejected(request, e))(scope, receive, send)
+
+        received = 0
+        rejected = None
+        started = False
+
+        async def counting_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit and rejected is None:
+                    rejected = body_too_large(limit)
+                if rejected is not None:
+                    raise rejected
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected is not None:
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, guarded_send)
+        except Exception:
+            if rejected is None:
+                raise
+        if rejected is not None and not started:
+            await (await upload_rejected(request, rejected))(scope, receive, send)
+
+app.add_middleware(UploadSizeGuard)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    timings = begin_request()
+    response = await call_next(request)
+    # Only requests that timed a stage (the analyze routes) get the header.
+    # Streamed responses send headers before the model runs, so theirs only
+    # covers reading the body.
+    if timings.stages:
+        response.headers["Server-Timing"] = timings.finish()
+    return response
+
+def request_token(request: Request, header: str) -> str:
+    """The ``Authorization: Bearer`` token, else the value of ``header``."""
+    authorization = request.headers.get('authorization', '')
+    return authorization[7:] if authorization.lower().startswith('bearer ') else request.headers.get(header, '')
+
+def error_response(request: Request, status_code: int, message: str, headers: dict = None) -> JSONResponse:
+    """An error in the calling route's shape: ``{"error"}`` on /api/*, FastAPI's ``{"detail"}`` elsewhere."""
+    key = 'error' if request.url.path.startswith('/api/') else 'detail'
+    return JSONResponse(status_code=status_code, content={key: message}, headers=headers)
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected(request: Request, e: UploadRejected):
+    logger.warning(f"Rejected upload: {e}")
+    return error_response(request, e.status_code, str(e))
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request: Request, e: QueueFullError):
+    logger.warning(f"Rejecting analysis, inference queue full: {e}")
+    return error_response(request, 503, "Server busy, retry shortly", {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+@app.get("/")
+async def root():
+    return {
+        'name': 'BrightBite API',
+        'version': '1.0.0',
+        'description': 'Food analysis API for BrightBite iOS app',
+        'status': 'healthy',
+        'classifier': classifier.name,
+        'runtime': classifier.runtime,
+        'endpoints': ENDPOINTS,
+        'website': 'https://brightbite.tuandnguyen.dev',
+        'documentation': 'https://brightbite.tuandnguyen.dev/docs',
+        'timestamp': datetime.now().isoformat()
+    }
+
+@app.get("/api")
+async def api_root():
+    return {'status': 'ok', 'endpoints': ENDPOINTS}
+
+@app.get("/api/health")
+async def health_check():
+    return {
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'model_loaded': classifier.loaded,
+        'classifier': classifier.status(),
+        'inference_backend': getattr(classifier, 'backend', None),
+        'startup': startup.status(),
+        'calibration': classifier.calibration.to_dict(),
+        'embedding_index': embedding_index.status() if embedding_index else None,
+        'tta_views': list(TTA_VIEWS) if TTA_ENABLED else None,
+        'openai_configured': bool(OPENAI_API_KEY),
+        'fallback': chatgpt_fallback.status(),
+        'inference_in_flight': inference_pool.in_flight,
+        'runtime_config': runtime_status(),
+        'jobs': job_queue.stats(),
+        'history': history.stats(),
+        'model_reload': model_reloader.status(),
+        'shadow': shadow_comparison.status() if shadow_comparison else None
+    }
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "healthy",
+        "models_loaded": classifier.loaded,
+        "runtime": classifier.runtime,
+        "startup": startup.status(),
+        "available_models": [classifier.name],
+        "models": {classifier.name: classifier.status()},
+        "inference_in_flight": inference_pool.in_flight,
+        "jobs": job_queue.stats()
+    }
+
+@app.get("/livez")
+async def livez():
+    return {"status": "alive"}
+
+def serving_model():
+    """Whether there is a model to answer with: loaded, or none configured (CLASSIFIER=fallback).
+
+    A model that failed to load, or was not found, leaves the /api routes on
+    the mock answer and the fallback; readiness and the /analyze-food routes
+    wait for one (an admin reload can still bring it in).
+    """
+    return classifier.loaded or classifier.name == 'fallback'
+
+@app.get("/readyz")
+async def readyz():
+    if not startup.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": startup.state, "startup": startup.status()},
+            headers={"Retry-After": "1"}
+        )
+    if not serving_model():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "model_not_loaded", "classifier": classifier.status(), "startup": startup.status()},
+            headers={"Retry-After": "1"}
+        )
+
+    return {"status": "ready", "model_loaded": classifier.loaded, "startup": startup.status()}
+
+@app.get("/metrics")
+async def metrics_prometheus(format: str = None):
+    # Prometheus text by default; ?format=json gives the same JSON as /api/metrics.
+    if format == "json":
+        return metrics.snapshot()
+    return Response(metrics.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/metrics")
+async def metrics_snapshot():
+    return metrics.snapshot()
+
+# --- /api/* routes: camelCase, verdict from the JSON userContext -------------
+
+@app.post("/api/analyze-food")
+async def analyze_food(request: Request):
+    try:
+        with stage('body_read'):
+            data = await request.json()
+
+        if not data or 'imageBase64' not in data:
+            return error_response(request, 400, 'Missing image data')
+
+        image_base64 = data['imageBase64']
+        check_base64_size(image_base64)
+        with stage('base64_decode'):
+            image_data = base64.b64decode(image_base64)
+        image = open_upload(image_data)
+
+        user_context = parse_user_context(data.get('userContext'))
+        if user_context is None:
+            return error_response(request, 400, 'userContext must be a JSON object')
+
+        return await analysis_response(request, image, image_data, user_context, lambda: image_base64)
+
+    except (UploadRejected, QueueFullError):
+        raise
+
+    except Exception as e:
+        logger.error(f"Error analyzing food: {e}")
+        return error_response(request, 500, str(e))
+
+@app.post("/api/analyze-food/upload")
+async def analyze_food_upload(request: Request):
+    """Binary variant of /api/analyze-food.
+
+    Accepts either multipart/form-data with an ``image`` file part and an
+    optional ``userContext`` JSON field, or the raw image bytes as the body
+    (application/octet-stream or image/*) with the user context JSON in the
+    ``X-User-Context`` header. The image is decoded without a base64 round
+    trip; base64 is only produced if the ChatGPT fallback needs it. Like
+    /api/analyze-food, it streams result/refined events on request (see
+    streaming.py).
+    """
+    try:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            with stage('body_read'):
+                form = await request.form()
+            upload = form.get('image')
+            if upload is None or isinstance(upload, str):
+                return error_response(request, 400, 'Missing image data')
+
+            check_image_size(upload.size)
+            image_stream = upload.file
+            user_context = parse_user_context(form.get('userContext'))
+        else:
+            with stage('body_read'):
+                body = await request.body()
+            if not body:
+                return error_response(request, 400, 'Missing image data')
+
+            check_image_size(len(body))
+            image_stream = io.BytesIO(body)
+            user_context = parse_user_context(request.headers.get('x-user-context'))
+
+        if user_context is None:
+            return error_response(request, 400, 'userContext must be a JSON object')
+        image = open_upload(image_stream)
+
+        def encode_image():
+            image_stream.seek(0)
+            return base64.b64encode(image_stream.read()).decode('ascii')
+
+        return await analysis_response(request, image, image_stream, user_context, encode_image)
+
+    except (UploadRejected, QueueFullError):
+        raise
+
+    except Exception as e:
+        logger.error(f"Error analyzing food: {e}")
+        return error_response(request, 500, str(e))
+
+@app.post("/api/analyze-food/batch")
+async def analyze_food_batch(request: Request):
+    """Analyze several images that share one userContext.
+
+    Accepts a JSON body ``{"images": [<base64>, ...], "userContext": {...}}``
+    or multipart/form-data with repeated ``images`` file parts and a
+    ``userContext`` field. Images are decoded in parallel and classified in
+    a single forward pass. Results come back in request order; an image
+    that fails gets an ``error`` entry without failing the others.
+    """
+    try:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            with stage('body_read'):
+                form = await request.form()
+                items = [await upload.read() for upload in form.getlist('images') if not isinstance(upload, str)]
+            user_context = parse_user_context(form.get('userContext'))
+        else:
+            with stage('body_read'):
+                data = await request.json()
+            if not data or not isinstance(data.get('images'), list):
+                return error_response(request, 400, 'Missing image data')
+
+            items = data['images']
+            user_context = parse_user_context(data.get('userContext'))
+
+        if user_context is None:
+            return error_response(request, 400, 'userContext must be a JSON object')
+        if not items:
+            return error_response(request, 400, 'Missing image data')
+
+        if len(items) > BATCH_MAX_IMAGES:
+            return error_response(request, 400, f'At most {BATCH_MAX_IMAGES} images per batch')
+
+        classifications = await inference_pool.run(run_batch_analysis, items, user_context)
+        user_id = history_user(request, user_context.get('userId'))
+
+        results = []
+        for index, classification in enumerate(classifications):
+            if isinstance(classification, Exception):
+                results.append({'index': index, 'error': str(classification)})
+            else:
+                response = record_analysis(user_id, 'api', build_response(*classification, user_context))
+                results.append({'index': index, **response})
+
+        return {'results': results}
+
+    except (UploadRejected, QueueFullError):
+        raise
+
+    except Exception as e:
+        logger.error(f"Error analyzing food batch: {e}")
+        return error_response(request, 500, str(e))
+
+def parse_user_context(value):
+    """The userContext as a dict: ``{}`` when absent, empty or null, None when it is not a JSON object."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.strip() else None
+        except ValueError:
+            return None
+    if value is None:
+        return {}
+    return value if isinstance(value, dict) else None
+
+async def analysis_response(request, image, image_source, user_context, encode_image):
+    user_id = history_user(request, user_context.get('userId'))
+    if job_mode(request.headers.get('prefer'), request.query_params.get('job')):
+        return accept_job('api', read_source(image_source), {'userContext': user_context, 'userId': user_id})
+
+    mode = stream_mode(request.headers.get('accept'), request.query_params.get('stream'))
+    if mode is None:
+        classification = await inference_pool.run(run_analysis, image, image_source, user_context, encode_image)
+        return record_analysis(user_id, 'api', build_response(*classification, user_context))
+
+    # The model runs before the response starts, so a full pool is still a 503.
+    local = await inference_pool.run(local_analysis, image, image_source)
+    events = recorded(user_id, 'api', stream_analysis(
+        local, user_context, encode_image, lambda classification: build_response(*classification, user_context)
+    ))
+    return StreamingResponse(
+        encode_events(mode, events, lambda e: logger.error(f"Error streaming analysis: {e}")),
+        media_type=MIMETYPES[mode],
+        headers=STREAM_HEADERS
+    )
+
+def build_response(food_name, confidence, source, candidates, user_context):
+    with stage('verdict'):
+        verdict, tags, reasons, alternatives = determine_verdict(
+            food_name,
+            has_braces=user_context.get('hasBraces', False),
+            restrictions=user_context.get('dietRestrictions', []),
+            procedures=user_context.get('recentProcedures', [])
+        )
+
+    # With a model result, "alternatives" are the other likely foods from the
+    # top-k rather than a fixed suggestion list.
+    if candidates:
+        alternatives = [name for name, _ in candidates if name.lower() != food_name.lower()][:3]
+
+    logger.info(f"Analysis complete: {food_name} ({confidence:.2f}) -> {verdict}")
+
+    return {
+        'foodName': food_name,
+        'confidence': confidence,
+        'verdict': verdict,
+        'tags': tags,
+        'reasons': reasons,
+        'alternatives': alternatives,
+        'candidates': [{'foodName': name, 'confidence': probability} for name, probability in candidates],
+        'source': source
+    }
+
+# --- /analyze-food routes: multipart, snake_case, verdict from query parameters
+
+def require_ready():
+    if not startup.ready or not serving_model():
+        raise HTTPException(status_code=503, detail="Models not loaded", headers={"Retry-After": "1"})
+
+def check_upload(file: UploadFile):
+    """Size, format and pixel checks on the spooled upload, before it is read into memory."""
+    check_image_size(file.size)
+    image = open_upload(file.file)
+    file.file.seek(0)
+    return image
+
+@app.post("/analyze-food")
+async def analyze_food_multipart(
+    request: Request,
+    file: UploadFile = File(...),
+    has_braces: str = None,
+    dietary_restrictions: str = None,
+    current_treatment: str = None,
+    current_pain_areas: str = None,
+    user_id: str = None,
+    stream: str = None,
+    job: str = None
+):
+    require_ready()
+
+    if not (file.content_type or '').startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    logger.info(f"User context: braces={has_braces}, restrictions={dietary_restrictions}, treatment={current_treatment}")
+
+    try:
+        start_time = datetime.now()
+
+        image = check_upload(file)
+        user_context = {'hasBraces': has_braces == "true"}
+        user_id = history_user(request, user_id)
+
+        def encode_image():
+            file.file.seek(0)
+            return base64.b64encode(file.file.read()).decode('ascii')
+
+        def respond(classification):
+            analysis = build_analysis(*classification, has_braces, dietary_restrictions, current_treatment)
+            processing_time = (datetime.now() - start_time).total_seconds()
+
+            logger.info(f"Food analysis: {analysis['food_name']} (confidence: {analysis['confidence']:.3f}, time: {processing_time:.3f}s)")
+
+            return {
+                **analysis,
+                "timestamp": datetime.now().isoformat(),
+                "processing_time": processing_time
+            }
+
+        if job_mode(request.headers.get("prefer"), job):
+            return accept_job('multipart', read_source(file.file), {
+                'has_braces': has_braces,
+                'dietary_restrictions': dietary_restrictions,
+                'current_treatment': current_treatment,
+                'user_id': user_id
+            })
+
+        mode = stream_mode(request.headers.get("accept"), stream)
+        if mode is not None:
+            local = await inference_pool.run(local_analysis, image, file.file)
+            events = recorded(user_id, 'multipart', stream_analysis(local, user_context, encode_image, respond))
+            return StreamingResponse(
+                encode_events(mode, events, lambda e: logger.error(f"Error streaming analysis: {e}")),
+                media_type=MIMETYPES[mode],
+                headers=STREAM_HEADERS
+            )
+
+        classification = await inference_pool.run(run_analysis, image, file.file, user_context, encode_image)
+        return record_analysis(user_id, 'multipart', respond(classification))
+
+    except (UploadRejected, QueueFullError):
+        raise
+
+    except Exception as e:
+        logger.error(f"Error analyzing food: {e}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+@app.post("/analyze-food/batch")
+async def analyze_food_multipart_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    has_braces: str = None,
+    dietary_restrictions: str = None,
+    current_treatment: str = None,
+    current_pain_areas: str = None,
+    user_id: str = None
+):
+    require_ready()
+
+    if len(files) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IMAGES} images per batch")
+
+    try:
+        start_time = datetime.now()
+
+        # Rejected files stay in the list as their exception so indexes line up.
+        items = []
+        with stage('body_read'):
+            for file in files:
+                if not (file.content_type or '').startswith('image/'):
+                    items.append(ValueError("File must be an image"))
+                    continue
+                try:
+                    check_upload(file)
+                    items.append(await file.read())
+                except UploadRejected as e:
+                    items.append(e)
+
+        classifications = await inference_pool.run(run_batch_analysis, items, {'hasBraces': has_braces == "true"})
+        user_id = history_user(request, user_id)
+
+        results = []
+        for index, classification in enumerate(classifications):
+            if isinstance(classification, Exception):
+                results.append({"index": index, "error": f"Analysis failed: {classification}"})
+            else:
+                analysis = build_analysis(*classification, has_braces, dietary_restrictions, current_treatment)
+                results.append({"index": index, **record_analysis(user_id, 'multipart', analysis)})
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+
+        logger.info(f"Batch food analysis: {len(files)} images (time: {processing_time:.3f}s)")
+
+        return {
+            "results": results,
+            "timestamp": datetime.now().isoformat(),
+            "processing_time": processing_time
+        }
+
+    except QueueFullError:
+        raise
+
+    except Exception as e:
+        logger.error(f"Error analyzing food batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+def build_analysis(food_name: str, confidence: float, source: str, candidates: list, has_braces: str,
+                   dietary_restrictions: str, current_treatment: str) -> dict:
+    alternatives = [name for name, _ in candidates if name != food_name][:3]
+
+    with stage('verdict'):
+        tags = food_tags(food_name)
+        verdict = determine_dental_safety(tags, has_braces, dietary_restrictions)
+        reasons = get_safety_reasons(verdict, tags, has_braces, current_treatment)
+
+    return {
+        "food_name": food_name,
+        "confidence": confidence,
+        "alternatives": alternatives,
+        "tags": tags,
+        "verdict": verdict,
+        "reasons": reasons,
+        "source": source
+    }
+
+# --- Job mode: both shapes, results fetched by polling (see jobs.py) ----------
+
+def read_source(image_source):
+    if isinstance(image_source, (bytes, bytearray)):
+        return image_source
+    image_source.seek(0)
+    return image_source.read()
+
+def accept_job(request_shape, image_bytes, params):
+    job_id = job_queue.submit(request_shape, image_bytes, params)
+    location = f"{JOB_ROUTES[request_shape]}/{job_id}"
+    logger.info(f"Accepted analysis job {job_id}")
+    return JSONResponse(
+        status_code=202,
+        content=job_response(job_queue.get(job_id)),
+        headers={"Location": location, "Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+def job_response(job):
+    """A job in the shape of the route it was submitted to."""
+    if job['kind'] == 'api':
+        body = {'jobId': job['id'], 'status': job['status']}
+    else:
+        body = {'job_id': job['id'], 'status': job['status']}
+
+    if job['result'] is not None:
+        body['result'] = job['result']
+    if job['error']:
+        body['error'] = job['error']
+    return body
+
+@app.get("/api/analyze-food/jobs/{job_id}")
+@app.get("/analyze-food/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, wait: float = None):
+    """The job's status; waits up to ``wait`` seconds (capped) for it to finish first."""
+    timeout = JOB_POLL_TIMEOUT_SECONDS if wait is None else min(wait, JOB_POLL_TIMEOUT_SECONDS)
+    job = await job_queue.wait(job_id, timeout)
+    if job is None:
+        return error_response(request, 404, 'Job not found or expired')
+
+    headers = None if job['status'] in FINISHED else {"Retry-After": str(RETRY_AFTER_SECONDS)}
+    return JSONResponse(content=job_response(job), headers=headers)
+
+def run_job(request_shape, image_bytes, params):
+    """Job handler: the synchronous pipeline, on a job worker instead of the inference pool."""
+    image = open_upload(image_bytes)
+    encode_image = lambda: base64.b64encode(image_bytes).decode('ascii')
+    # Nobody is holding a connection open, so the fallback gets its full
+    # upstream timeout rather than the per-request latency budget.
+    budget = chatgpt_fallback.timeout
+
+    if request_shape == 'api':
+        user_context = params['userContext']
+        classification = run_analysis(image, image_bytes, user_context, encode_image, budget)
+        return record_analysis(params.get('userId'), 'api', build_response(*classification, user_context))
+
+    has_braces = params['has_braces']
+    classification = run_analysis(image, image_bytes, {'hasBraces': has_braces == "true"}, encode_image, budget)
+    analysis = build_analysis(*classification, has_braces, params['dietary_restrictions'], params['current_treatment'])
+    return record_analysis(params.get('user_id'), 'multipart', {**analysis, "timestamp": datetime.now().isoformat()})
+
+# --- History: both shapes, per-user analyses (see history.py) -----------------
+
+def history_user(request, user_id=None):
+    """Whose history an analysis is recorded in: the request's own field, else the ``X-User-Id`` header.
+
+    Only a request carrying a token that may read that user's history (see
+    history_denied) writes to it; without one the analysis is answered but
+    not recorded.
+    """
+    user_id = user_id or request.headers.get('x-user-id')
+    if not user_id or not history.enabled:
+        return None
+    if not history_token_valid(request, user_id):
+        logger.info("Not recording the analysis: no valid history token for the user")
+        return None
+    return user_id
+
+def record_analysis(user_id, request_shape, result):
+    """Queue a finished analysis for the user's history; returns ``result`` unchanged."""
+    if request_shape == 'api':
+        fields = (result['foodName'], result['confidence'], result['source'], result['verdict'], result['tags'])
+    else:
+        fields = (result['food_name'], result['confidence'], result['source'], result['verdict'], result['tags'])
+    history.record(user_id, *fields, request_shape)
+    return result
+
+async def recorded(user_id, request_shape, events):
+    """Pass streamed events through, then record the last (most refined) result."""
+    result = None
+    async for event, data in events:
+        result = data
+        yield event, data
+    if result is not None:
+        record_analysis(user_id, request_shape, result)
+
+def history_token_valid(request, user_id):
+    """Whether the request holds HISTORY_TOKEN or ``user_id``'s own user_token."""
+    token = request_token(request, 'x-history-token').encode()
+    if HISTORY_TOKEN and hmac.compare_digest(token, HISTORY_TOKEN.encode()):
+        return True
+    return bool(HISTORY_SECRET) and hmac.compare_digest(token, user_token(user_id).encode())
+
+def history_denied(request, user_id):
+    """An error response unless the request may read ``user_id``'s history; None when it may."""
+    if not history.enabled or not (HISTORY_TOKEN or HISTORY_SECRET):
+        return error_response(request, 404, 'History is not enabled')
+    if not history_token_valid(request, user_id):
+        return error_response(request, 401, 'Invalid history token')
+    return None
+
+def history_entry(entry, api):
+    timestamp = datetime.fromtimestamp(entry['ts']).isoformat()
+    if api:
+        return {'foodName': entry['food_name'], 'confidence': entry['confidence'], 'source': entry['source'],
+                'verdict': entry['verdict'], 'tags': entry['tags'], 'timestamp': timestamp}
+    return {'food_name': entry['food_name'], 'confidence': entry['confidence'], 'source': entry['source'],
+            'verdict': entry['verdict'], 'tags': entry['tags'], 'timestamp': timestamp}
+
+# Plain functions, so FastAPI runs the SQLite reads on its thread pool.
+@app.get("/api/history/{user_id}")
+@app.get("/history/{user_id}")
+def user_history(request: Request, user_id: str, limit: int = None, before: float = None):
+    """The user's latest analyses, newest first; ``before`` (epoch seconds) pages further back."""
+    denied = history_denied(request, user_id)
+    if denied:
+        return denied
+
+    entries = history.recent(user_id, limit, before)
+    api = request.url.path.startswith('/api/')
+    # Pass as ``before`` for the next page.
+    next_before = entries[-1]['ts'] if entries else None
+    return {
+        'userId' if api else 'user_id': user_id,
+        'analyses': [history_entry(entry, api) for entry in entries],
+        'nextBefore' if api else 'next_before': next_before
+    }
+
+@app.get("/api/history/{user_id}/summary")
+@app.get("/history/{user_id}/summary")
+def user_history_summary(request: Request, user_id: str, since: float = None, until: float = None):
+    """Counts of the user's analyses by verdict and by tag, between ``since`` and ``until`` (epoch seconds)."""
+    denied = history_denied(request, user_id)
+    if denied:
+        return denied
+
+    summary = history.summary(user_id, since, until)
+    return {'userId' if request.url.path.startswith('/api/') else 'user_id': user_id, **summary}
+
+# --- Model versions: reload, swap and shadow (see model_versions.py) ----------
+
+def load_model(version, tracker):
+    """Reload handler: build and warm a classifier while the current one keeps serving."""
+    if MODEL_DIR and CLASSIFIER == 'food101':
+        model = versioned_classifier(version=version)
+    else:
+        model = create_classifier()
+    model.load(tracker)
+    if not model.loaded:
+        raise RuntimeError(model.error or f"No {model.name} model to load")
+    return model
+
+def activate_model(model, shadow=False):
+    """Put a loaded model into service, or next to it as the shadow."""
+    global classifier, embedding_index, shadow_comparison
+
+    if shadow:
+        previous, shadow_comparison = shadow_comparison, ShadowComparison(model, predict_image)
+    else:
+        index = EmbeddingIndex.load(model=model.name)
+        # Until the swap the old model's names still get verdicts, computed
+        # instead of looked up.
+        set_class_names(model.labels)
+        previous, embedding_index, classifier = classifier, index, model
+        if previous.cache_name != model.cache_name:
+            result_cache.drop_model(previous.cache_name)
+
+        if shadow_comparison is not None and shadow_comparison.model.version == model.version:
+            # Promoted: a separate copy of it no longer needs to shadow.
+            shadow_comparison.close()
+            shadow_comparison = None
+
+    # Requests still holding the old model finish on it; its batcher stops
+    # once their samples have run.
+    if previous is not None:
+        previous.close()
+
+def follow_model_dir(version):
+    """Watcher handler: reload when MODEL_DIR now resolves to another version."""
+    if version == classifier.version or (model_reloader.busy and model_reloader.version == version):
+        return
+    if not model_reloader.start(version):
+        logger.warning(f"Not loading model {version}: another reload is running")
+
+def admin_denied(request):
+    """An error response unless the request carries ADMIN_TOKEN; None when it does."""
+    if not ADMIN_TOKEN:
+        return error_response(request, 404, 'Not found')
+
+    token = request_token(request, 'x-admin-token')
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return error_response(request, 401, 'Invalid admin token')
+    return None
+
+@app.get("/api/admin/models")
+async def model_status(request: Request):
+    denied = admin_denied(request)
+    if denied:
+        return denied
+
+    return {
+        'modelDir': MODEL_DIR or None,
+        'versions': list_versions() if MODEL_DIR else [],
+        'active': classifier.status(),
+        'reload': model_reloader.status(),
+        'shadow': shadow_comparison.status() if shadow_comparison else None
+    }
+
+@app.post("/api/admin/models/reload")
+async def reload_model(request: Request):
+    """Load a model in the background, then swap it in or run it as the shadow.
+
+    Optional JSON body ``{"version": "...", "shadow": false}``. Without a
+    version, whatever MODEL_DIR resolves to (or, without MODEL_DIR, the
+    configured model file) is reloaded. Once an activated version is
+    serving, CURRENT is pointed at it, so workers running the watcher
+    follow; otherwise only the worker that answered reloads.
+    """
+    denied = admin_denied(request)
+    if denied:
+        return denied
+
+    try:
+        body = await request.body()
+        options = json.loads(body) if body else {}
+    except ValueError:
+        return error_response(request, 400, 'Invalid JSON body')
+
+    if not isinstance(options, dict):
+        return error_response(request, 400, 'Invalid JSON body')
+
+    version, shadow = options.get('version'), bool(options.get('shadow'))
+    if MODEL_DIR and CLASSIFIER == 'food101':
+        try:
+            version = resolve_version(version=version)
+        except ManifestError as e:
+            return error_response(request, 400, str(e))
+    elif version or shadow:
+        return error_response(request, 400, 'Model versions need MODEL_DIR and the food101 classifier')
+
+    if not model_reloader.start(version, shadow, publish=True):
+        return error_response(request, 409, 'A model is already loading', {"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    return JSONResponse(status_code=202, content={'reload': model_reloader.status()})
+
+@app.delete("/api/admin/models/shadow")
+async def stop_shadow(request: Request):
+    global shadow_comparison
+
+    denied = admin_denied(request)
+    if denied:
+        return denied
+
+    previous, shadow_comparison = shadow_comparison, None
+    if previous is None:
+        return error_response(request, 404, 'No shadow model')
+
+    previous.close()
+    return {'shadow': previous.status()}
+
+# --- Shared pipeline: cache, classifier, fallback ------------------------------
+#
+# Each entry point resolves ``classifier`` once and passes that ``model``
+# down, so a reload mid-request never decodes one model's output with
+# another's labels or caches it under another's key.
+
+def cache_key(image_source, model):
+    # Different classifiers, and versions of one, name the same image differently.
+    return f"{model.cache_name}:{content_key(image_source)}"
+
+def image_phash(model, image):
+    """The perceptual hash the result cache matches near-duplicates on; None when that is off.
+
+    The upload is decoded the way preprocess_image will decode it (JPEG draft
+    towards the model's input) and preprocessing reuses that decode, so the
+    hash adds no full-size decode. It is taken upright, so a copy that only
+    differs in EXIF orientation still matches.
+    """
+    if not result_cache.perceptual:
+        return None
+    size = views_decode_size(model.input_size) if TTA_ENABLED else model.input_size
+    with stage('image_decode'):
+        decoded = decode_image(image, size)
+    return perceptual_hash(ImageOps.exif_transpose(decoded))
+
+def run_analysis(image, image_source, user_context, encode_image, budget=None):
+    """Classify one image: cached result, or the model plus the fallback when it is unsure."""
+    model = classifier
+    key = cache_key(image_source, model)
+    phash = image_phash(model, image)
+    cached = result_cache.get(key, phash)
+
+    if cached:
+        food_name, confidence, source, candidates = cached_classification(cached)
+        logger.info(f"Cache hit: {food_name} ({confidence:.2f}, {source})")
+        return food_name, confidence, source, candidates
+
+    classification = classify(model, image, user_context, encode_image, cache_late_fallback(model, key, phash), budget)
+    cache_result(model, key, phash, *classification)
+    return classification
+
+def local_analysis(image, image_source):
+    """The first half of a streamed analysis: the cached result or the model's, without the fallback.
+
+    Returns ``(model, key, phash, classification, cached)`` for stream_analysis.
+    """
+    model = classifier
+    key = cache_key(image_source, model)
+    phash = image_phash(model, image)
+    cached = result_cache.get(key, phash)
+
+    if cached:
+        return model, key, phash, cached_classification(cached), True
+    return model, key, phash, classify_image(model, image), False
+
+def refine_analysis(model, key, phash, classification, user_context, encode_image):
+    # The client already has an answer, so the fallback gets its full
+    # upstream timeout instead of the per-request latency budget.
+    refined = apply_fallback(
+        model, *classification, user_context, encode_image, cache_late_fallback(model, key, phash),
+        budget=chatgpt_fallback.timeout
+    )
+    cache_result(model, key, phash, *refined)
+    return refined
+
+async def stream_analysis(local, user_context, encode_image, respond):
+    """Like run_analysis, but yields the local_analysis result before waiting on the fallback."""
+    model, key, phash, classification, cached = local
+    yield 'result', respond(classification)
+    if cached:
+        return
+
+    try:
+        refined = await inference_pool.run(
+            refine_analysis, model, key, phash, classification, user_context, encode_image
+        )
+    except QueueFullError:
+        # Too late for a 503; the client keeps the model's answer.
+        logger.warning("Inference pool full, skipping the fallback for a streamed analysis")
+        return
+
+    if refined[0] != classification[0]:
+        yield 'refined', respond(refined)
+
+def run_batch_analysis(items, user_context):
+    """Classify several images in one forward pass; an item that fails becomes its exception."""
+    model = classifier
+    # Each decode worker writes its image straight into its row of the batch;
+    # with TTA every image brings its own stack of views instead.
+    inputs = [None] * len(items) if TTA_ENABLED else batch_buffer(len(items), model.input_size)
+    decoded = list(decode_pool.map(bind(lambda item, out: decode_batch_item(model, item, out)), items, inputs))
+    classifications = [None] * len(items)
+    pending = []
+
+    for index, entry in enumerate(decoded):
+        if isinstance(entry, Exception):
+            classifications[index] = entry
+            continue
+
+        cached = result_cache.get(entry['key'], entry['phash'])
+        if cached:
+            classifications[index] = cached_classification(cached)
+        else:
+            pending.append(index)
+
+    if pending:
+        if TTA_ENABLED:
+            batch_inputs = np.concatenate([decoded[index]['array'] for index in pending])
+        else:
+            batch_inputs = inputs if len(pending) == len(items) else inputs[pending]
+        batch_results = classify_batch(model, batch_inputs, len(TTA_VIEWS) if TTA_ENABLED else 1)
+        fallback_results = decode_pool.map(
+            bind(lambda index, result: apply_fallback(
+                model, *result, user_context, decoded[index]['encode'],
+                cache_late_fallback(model, decoded[index]['key'], decoded[index]['phash'])
+            )),
+            pending, batch_results
+        )
+
+        for index, classification in zip(pending, fallback_results):
+            classifications[index] = classification
+            cache_result(model, decoded[index]['key'], decoded[index]['phash'], *classification)
+
+    return classifications
+
+def decode_batch_item(model, item, out=None):
+    if isinstance(item, Exception):
+        return item
+
+    try:
+        if isinstance(item, str):
+            check_base64_size(item)
+            with stage('base64_decode'):
+                image_bytes = base64.b64decode(item)
+            encode = lambda: item
+        else:
+            image_bytes = item
+            encode = lambda: base64.b64encode(image_bytes).decode('ascii')
+            check_image_size(len(image_bytes))
+
+        image = open_upload(image_bytes)
+        return {
+            'key': cache_key(image_bytes, model),
+            'phash': image_phash(model, image),
+            'array': preprocess_image(model, image, out),
+            'encode': encode
+        }
+    except Exception as e:
+        return e
+
+def cached_classification(cached):
+    # Entries written before top-k was cached have no candidates.
+    candidates = [tuple(candidate) for candidate in cached.get('candidates') or []]
+    return cached['food_name'], cached['confidence'], cached['source'], candidates
+
+def cache_result(model, key, phash, food_name, confidence, source, candidates):
+    # Results from the mock path or a failed fallback are not worth keeping.
+    failed_fallback = (
+        source == model.source and OPENAI_API_KEY
+        and model.calibration.needs_fallback(confidence, candidates)
+    )
+    if source != 'mock' and not failed_fallback:
+        result_cache.put(key, {
+            'food_name': food_name,
+            'confidence': confidence,
+            'source': source,
+            'candidates': candidates
+        }, phash)
+
+def classify(model, image, user_context, encode_image, on_late_result=None, budget=None):
+    food_name, confidence, source, candidates = classify_image(model, image)
+    return apply_fallback(
+        model, food_name, confidence, source, candidates, user_context, encode_image, on_late_result, budget
+    )
+
+def cache_late_fallback(model, key, phash):
+    # The request already answered with the model's result; keep the
+    # fallback's answer so the next scan of the same image gets it.
+    return lambda result: cache_result(
+        model, key, phash, result['foodName'], result['confidence'], 'chatgpt', result.get('candidates', [])
+    )
+
+def apply_fallback(model, food_name, confidence, source, candidates, user_context, encode_image, on_late_result=None,
+                   budget=None):
+    # A reference-image match already stands in for the fallback.
+    if source != 'embedding' and OPENAI_API_KEY and model.calibration.needs_fallback(confidence, candidates):
+        logger.info(f"Low confidence ({confidence:.2f}), trying ChatGPT Vision...")
+
+        late_result = None
+        if on_late_result is not None:
+            late_result = lambda result: on_late_result({**result, 'candidates': candidates})
+
+        try:
+            with stage('fallback'):
+                chatgpt_result = chatgpt_fallback.identify(
+                    encode_image(), user_context, budget=budget, on_late_result=late_result
+                )
+            if chatgpt_result:
+                food_name = chatgpt_result['foodName']
+                confidence = chatgpt_result['confidence']
+                source = 'chatgpt'
+        except Exception as e:
+            logger.error(f"ChatGPT fallback failed: {e}")
+
+    return food_name, confidence, source, candidates
+
+def preprocess_image(model, image, out=None):
+    if TTA_ENABLED:
+        return preprocess_views(image, size=model.input_size, normalization=model.normalization, out=out)
+    return preprocess(image, size=model.input_size, normalization=model.normalization, out=out)
+
+def classify_image(model, image):
+    started_at = time.perf_counter()
+    classification = predict_image(model, image)
+
+    shadow = shadow_comparison
+    if shadow is not None and model.loaded:
+        shadow.maybe_compare(image, classification, time.perf_counter() - started_at)
+    return classification
+
+def predict_image(model, image):
+    if not model.loaded:
+        logger.info("Model not loaded, using mock data")
+        return MOCK_CLASSIFICATION
+
+    try:
+        if TTA_ENABLED:
+            # The views already make a batch; one forward pass, not one batcher slot each.
+            return classify_batch(model, preprocess_image(model, image), len(TTA_VIEWS))[0]
+        output = model.batcher.predict(preprocess_image(model, image))
+        return decode_output(model, output)
+
+    except Exception as e:
+        logger.error(f"Classifier error: {e}")
+        return MOCK_CLASSIFICATION
+
+def classify_batch(model, inputs, views=1):
+    """Classify a batch holding ``views`` consecutive rows per image."""
+    images = len(inputs) // views
+    if not model.loaded:
+        logger.info("Model not loaded, using mock data")
+        return [MOCK_CLASSIFICATION] * images
+
+    try:
+        with stage('predict'):
+            outputs = model.split_batch(model.predict_on_batch(inputs))
+        if views > 1:
+            outputs = [model.average_views(outputs[start:start + views]) for start in range(0, len(outputs), views)]
+        return [decode_output(model, output) for output in outputs]
+
+    except Exception as e:
+        logger.error(f"Classifier batch error: {e}")
+        return [MOCK_CLASSIFICATION] * images
+
+def decode_output(model, output):
+    food_name, confidence, candidates = model.decode(output)
+
+    # When the model is unsure, a close enough reference image names the food
+    # for a matrix product instead of a ChatGPT call.
+    if embedding_index is not None and model.calibration.needs_fallback(confidence, candidates):
+        embedding = model.embedding(output)
+        if embedding is not None:
+            with stage('embedding_lookup'):
+                match = embedding_index.nearest(embedding)
+            if match:
+                logger.info(f"Low confidence ({confidence:.2f}), matched reference images: {match[0]} ({match[1]:.2f})")
+                return match[0], match[1], 'embedding', match[2]
+
+    return food_name, confidence, model.source, candidates
+
+if __name__ == "__main__":
+    port = int(os.environ.get('PORT', 8000))
+    logger.info(f"🚀 Starting BrightBite Food Analysis API on port {port} ({classifier.name} classifier)")
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
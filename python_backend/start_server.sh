@@ -82,17 +82,22 @@ SERVER_PID=$!
 # Save PID
 echo "$SERVER_PID" > "$PID_FILE"
 
-# Wait a bit for server to start
-sleep 3
-
-# Check if server started successfully
-if ps -p "$SERVER_PID" > /dev/null 2>&1; then
-    echo "✅ Server started successfully (PID: $SERVER_PID)"
-    echo "📍 Server running at: http://$LOCAL_IP:8000"
-    echo "📋 Logs: $LOG_FILE"
-    exit 0
-else
-    echo "❌ Server failed to start"
-    cat "$LOG_FILE"
-    exit 1
-fi
+# Wait until the process answers /livez; the model keeps loading in the
+# background and /readyz reports when it is ready to classify.
+for _ in $(seq 1 30); do
+    if ! ps -p "$SERVER_PID" > /dev/null 2>&1; then
+        break
+    fi
+    if curl -sf "http://127.0.0.1:8000/livez" > /dev/null 2>&1; then
+        echo "✅ Server started successfully (PID: $SERVER_PID)"
+        echo "📍 Server running at: http://$LOCAL_IP:8000"
+        echo "⏳ Model warming up, poll http://$LOCAL_IP:8000/readyz"
+        echo "📋 Logs: $LOG_FILE"
+        exit 0
+    fi
+    sleep 0.5
+done
+
+echo "❌ Server failed to start"
+cat "$LOG_FILE"
+exit 1
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """Runs the slow part of startup in the background and reports readiness.
+
+    The HTTP server starts answering immediately; ``/livez`` only says the
+    process is up, ``/readyz`` says the warm-up (runtime import, weight load,
+    first inference) has finished. Each stage is timed so the breakdown can
+    be logged and returned by the readiness probe.
+    """
+
+    STARTING = 'starting'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, name='startup', log=None):
+        self.name = name
+        self.log = log or logger.info
+        self.state = self.STARTING
+        self.error = None
+        self.stages = {}
+        self._created_at = time.perf_counter()
+        self._total = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.state == self.READY
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - start
+
+    def record(self, name, seconds):
+        if seconds is not None:
+            self.stages[name] = seconds
+
+    def start(self, warm_up):
+        """Run ``warm_up(self)`` on a daemon thread; returns immediately."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(warm_up,), name=f'{self.name}-warmup', daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def _run(self, warm_up):
+        try:
+            warm_up(self)
+            self.state = self.READY
+        except Exception as e:
+            self.error = str(e)
+            self.state = self.FAILED
+            logger.exception(f"{self.name} warm-up failed: {e}")
+        finally:
+            self._total = time.perf_counter() - self._created_at
+            self.log(f"{self.name} {self.state}: {self.summary()}")
+
+    def summary(self):
+        parts = [f"{name.replace('_', ' ')} {seconds:.2f}s" for name, seconds in self.stages.items()]
+        if self._total is not None:
+            parts.append(f"total {self._total:.2f}s")
+        return ', '.join(parts) or 'no stages recorded'
+
+    def status(self):
+        return {
+            'state': self.state,
+            'stages_seconds': dict(self.stages),
+            'total_seconds': self._total,
+            'error': self.error
+        }
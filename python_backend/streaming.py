@@ -0,0 +1,67 @@
+"""Event framing for the opt-in streaming mode of the analyze-food routes.
+
+A client asks for a stream with ``Accept: application/x-ndjson`` or
+``Accept: text/event-stream`` (or ``?stream=ndjson`` / ``?stream=sse``).
+The server then writes one event as soon as the local model has an answer
+and, if the fallback changes that answer, a ``refined`` event later:
+
+    {"event": "result", "foodName": "Pizza", ...}
+    {"event": "refined", "foodName": "Flatbread", ...}
+    {"event": "done"}
+
+SSE carries the same JSON in ``data:`` lines with ``event:`` set to the
+event name. An ``error`` event replaces the rest of the stream if the
+analysis fails after the response has started.
+"""
+import json
+
+NDJSON = 'ndjson'
+SSE = 'sse'
+
+MIMETYPES = {
+    NDJSON: 'application/x-ndjson',
+    SSE: 'text/event-stream',
+}
+
+# Stop proxies (nginx, Railway's edge) from buffering the stream.
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def stream_mode(accept=None, stream=None):
+    """Return NDJSON, SSE or None from the ``stream`` query value or the Accept header."""
+    if stream:
+        stream = stream.lower()
+        if stream in MIMETYPES:
+            return stream
+        if stream in ('1', 'true', 'yes'):
+            return NDJSON
+
+    accept = (accept or '').lower()
+    if MIMETYPES[SSE] in accept:
+        return SSE
+    if MIMETYPES[NDJSON] in accept:
+        return NDJSON
+    return None
+
+
+def format_event(mode, event, data=None):
+    if mode == SSE:
+        return f"event: {event}\ndata: {json.dumps(data or {})}\n\n"
+    return json.dumps({'event': event, **(data or {})}) + '\n'
+
+
+async def encode_events(mode, events, on_error=None):
+    """Frame the ``(event, data)`` pairs of an async iterator and close the stream with ``done`` or ``error``."""
+    try:
+        async for event, data in events:
+            yield format_event(mode, event, data)
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        yield format_event(mode, 'error', {'error': str(e)})
+        return
+
+    yield format_event(mode, 'done')
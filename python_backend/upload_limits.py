@@ -0,0 +1,107 @@
+"""Upload limits checked before any pixel is decoded.
+
+Checks run cheapest first: the body size from Content-Length before the
+body is read (or counted as it arrives when there is none), the encoded image size before base64 decoding, then the
+format and pixel count from the image header, which ``Image.open`` parses
+without decoding pixels. A 20 MB PNG or a 100 MP photo is turned away
+for the cost of reading its header instead of tying up a worker and
+hundreds of MB while it decodes. Each rejection increments
+``upload_rejected_total{reason=...}``.
+"""
+import io
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+from metrics import metrics
+
+# Largest single image, in raw (not base64) bytes.
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 12 * 1024 * 1024))
+# Largest body for the batch routes, all images together.
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get('MAX_BATCH_UPLOAD_BYTES', 48 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))
+# Pillow format names; iPhone JPEGs often open as MPO. HEIF only opens
+# when a plugin such as pillow-heif is installed.
+ALLOWED_IMAGE_FORMATS = frozenset(
+    name.strip().upper()
+    for name in os.environ.get('ALLOWED_IMAGE_FORMATS', 'JPEG,MPO,PNG,WEBP,HEIF').split(',')
+    if name.strip()
+)
+
+# Room for the JSON or multipart framing and the user context around one image.
+BODY_OVERHEAD_BYTES = 64 * 1024
+
+rejections = metrics.counter(
+    'upload_rejected_total', 'Uploads rejected before decoding, by reason', labels=('reason',)
+)
+
+
+class UploadRejected(Exception):
+    def __init__(self, reason, message, status_code):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = status_code
+
+
+def reject(reason, message, status_code=413):
+    rejections.labels(reason=reason).inc()
+    return UploadRejected(reason, message, status_code)
+
+
+def body_limit(batch=False):
+    """Largest request body accepted; single-image bodies may carry the image as base64."""
+    if batch:
+        return MAX_BATCH_UPLOAD_BYTES
+    return MAX_UPLOAD_BYTES * 4 // 3 + BODY_OVERHEAD_BYTES
+
+
+def body_too_large(limit, length=None):
+    size = f" of {length} bytes" if length is not None else ''
+    return reject('body_size', f"Request body{size} exceeds the {limit} byte limit")
+
+
+def content_length(header):
+    """The Content-Length header as an int, None when absent; a 400 rejection when it does not parse."""
+    if header is None:
+        return None
+    header = header.strip()
+    if not (header.isascii() and header.isdigit()):
+        raise reject('content_length', f"Invalid Content-Length {header!r}", 400)
+    return int(header)
+
+
+def check_content_length(length, limit):
+    if length is not None and length > limit:
+        raise body_too_large(limit, length)
+
+
+def check_image_size(size):
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise reject('image_size', f"Image of {size} bytes exceeds the {MAX_UPLOAD_BYTES} byte limit")
+
+
+def check_base64_size(text):
+    # Decoded size without decoding: every 4 base64 characters carry 3 bytes.
+    check_image_size(len(text) * 3 // 4)
+
+
+def open_upload(source):
+    """``Image.open`` plus the format and pixel-count checks; only the header is read."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise reject('pixels', str(e))
+    except UnidentifiedImageError:
+        raise reject('format', 'Unrecognized image format', 415)
+
+    if image.format not in ALLOWED_IMAGE_FORMATS:
+        raise reject('format', f"Image format {image.format} is not accepted", 415)
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise reject('pixels', f"Image of {width}x{height} exceeds the {MAX_IMAGE_PIXELS} pixel limit")
+
+    return image
@@ -0,0 +1,198 @@
+"""Dental verdicts for a classified food, in both response shapes.
+
+``determine_verdict`` is the rule set of the /api/* routes, driven by the
+JSON userContext (hasBraces, dietRestrictions, recentProcedures).
+``determine_dental_safety`` and ``get_safety_reasons`` are the rules of
+the /analyze-food routes, driven by query parameters. Both read tags from
+food_tags.py.
+"""
+import logging
+from functools import lru_cache
+
+from food_tags import food_tags, food_tags_many
+
+logger = logging.getLogger(__name__)
+
+class_tags = {}
+
+
+def set_class_names(names):
+    """Tag every class the classifier can return once, so the common path is a dict lookup."""
+    global class_tags
+
+    class_tags = dict(zip(names, (tuple(tags) for tags in food_tags_many(names))))
+    determine_class_verdict.cache_clear()
+
+    untagged = [name for name, tags in class_tags.items() if not tags]
+    if untagged:
+        logger.warning(f"{len(untagged)} of {len(class_tags)} food classes have no tags: {', '.join(untagged)}")
+
+
+def determine_verdict(food_name, has_braces=False, restrictions=[], procedures=[]):
+    if food_name not in class_tags:
+        return compute_verdict(food_tags(food_name), has_braces, restrictions, procedures)
+
+    # Only lists of flags go through the memo: a string such as "softOnly" would
+    # become a set of characters there, while compute_verdict tests it by substring.
+    try:
+        key = (food_name, bool(has_braces), memo_flags(restrictions), memo_flags(procedures))
+    except TypeError:
+        return compute_verdict(list(class_tags[food_name]), has_braces, restrictions or (), procedures or ())
+
+    verdict, tags, reasons, alternatives = determine_class_verdict(*key)
+    return verdict, list(tags), list(reasons), list(alternatives)
+
+
+def memo_flags(flags):
+    if not flags:
+        return frozenset()
+    if not isinstance(flags, (list, tuple, set, frozenset)):
+        raise TypeError(f"flags of type {type(flags).__name__} are not memoized")
+    return frozenset(flags)
+
+
+@lru_cache(maxsize=4096)
+def determine_class_verdict(food_name, has_braces, restrictions, procedures):
+    # Only the classifier's own class names reach this cache, and the verdict depends only
+    # on which restrictions and procedures are present, so the key space stays small.
+    verdict, tags, reasons, alternatives = compute_verdict(
+        list(class_tags[food_name]), has_braces, restrictions, procedures
+    )
+    return verdict, tuple(tags), tuple(reasons), tuple(alternatives)
+
+
+def compute_verdict(tags, has_braces, restrictions, procedures):
+    reasons = []
+    alternatives = []
+
+    is_hard = 'hard' in tags
+    is_sticky = 'sticky' in tags
+    is_chewy = 'chewy' in tags
+    is_hot = 'hot' in tags
+    is_cold = 'cold' in tags
+    is_soft = 'soft' in tags
+
+    verdict = 'safe'
+
+    if has_braces:
+        if is_hard:
+            verdict = 'avoid'
+            reasons.append('Too hard for braces - may damage brackets')
+            alternatives.append('Try softer alternatives like cooked vegetables')
+        elif is_sticky:
+            verdict = 'avoid'
+            reasons.append('Sticky foods can damage braces')
+            alternatives.append('Choose non-sticky options')
+
+    if 'softOnly' in restrictions:
+        if not is_soft and (is_hard or is_chewy):
+            verdict = 'avoid'
+            reasons.append('Not soft enough for current diet restrictions')
+            alternatives.append('Stick to soft foods like yogurt, smoothies, or mashed foods')
+
+    if 'noSticky' in restrictions and is_sticky:
+        verdict = 'caution' if verdict == 'safe' else verdict
+        reasons.append('Sticky foods should be avoided')
+
+    if 'noHot' in restrictions and is_hot:
+        verdict = 'later'
+        reasons.append('Wait for food to cool down')
+
+    if 'noCold' in restrictions and is_cold:
+        verdict = 'later'
+        reasons.append('Avoid cold foods for now due to sensitivity')
+
+    if 'extraction' in procedures:
+        if is_hot or is_hard or is_chewy:
+            verdict = 'avoid'
+            reasons.append('Not recommended after tooth extraction')
+            alternatives.append('Stick to cool, soft foods')
+
+    if verdict == 'safe' and not reasons:
+        if is_soft:
+            reasons.append('This is a great choice! Soft and safe.')
+        else:
+            reasons.append('This food looks safe for you to eat.')
+
+    if not alternatives and verdict != 'safe':
+        alternatives = ['Yogurt', 'Smoothie', 'Mashed potatoes', 'Scrambled eggs']
+
+    return verdict, tags, reasons, alternatives
+
+
+def determine_dental_safety(tags: list, has_braces: str = None, dietary_restrictions: str = None) -> str:
+    restrictions = []
+    if dietary_restrictions and dietary_restrictions != "none":
+        restrictions = [r.strip().lower() for r in dietary_restrictions.split(",")]
+
+    if "softonly" in restrictions:
+        if 'hard' in tags or 'chewy' in tags:
+            return 'avoid'
+
+    if "nohard" in restrictions and 'hard' in tags:
+        return 'avoid'
+
+    if "nosticky" in restrictions and 'sticky' in tags:
+        return 'avoid'
+
+    if "nochewy" in restrictions and 'chewy' in tags:
+        return 'avoid'
+
+    if "nohot" in restrictions and 'hot' in tags:
+        return 'avoid'
+
+    if "nocold" in restrictions and 'cold' in tags:
+        return 'avoid'
+
+    if has_braces == "true":
+        if 'hard' in tags or 'sticky' in tags or 'chewy' in tags:
+            return 'avoid'
+
+    if 'hard' in tags or 'sticky' in tags or 'chewy' in tags:
+        return 'avoid'
+
+    if 'sugary' in tags or 'acidic' in tags:
+        return 'caution'
+
+    if 'hot' in tags:
+        return 'later'
+
+    return 'safe'
+
+
+def get_safety_reasons(verdict: str, tags: list, has_braces: str = None, current_treatment: str = None) -> list:
+    reasons = []
+
+    if verdict == 'avoid':
+        if 'hard' in tags:
+            if has_braces == "true":
+                reasons.append("Hard texture can damage brackets and wires on your braces")
+            else:
+                reasons.append("Hard texture can damage crowns, fillings, or recent dental work")
+        if 'sticky' in tags:
+            if has_braces == "true":
+                reasons.append("Sticky foods can get stuck in braces and pull on brackets")
+            else:
+                reasons.append("Sticky foods can pull on dental work or get stuck between teeth")
+        if 'chewy' in tags:
+            reasons.append("Chewy texture requires excessive jaw movement and can damage appliances")
+
+    elif verdict == 'caution':
+        if 'sugary' in tags:
+            reasons.append("High sugar content feeds bacteria - rinse mouth thoroughly after eating")
+        if 'acidic' in tags:
+            reasons.append("Acidic foods can weaken tooth enamel - wait 30 minutes before brushing")
+
+    elif verdict == 'later':
+        if 'hot' in tags:
+            reasons.append("Hot temperature can increase sensitivity after dental procedures - let it cool down")
+
+    else:
+        if has_braces == "true":
+            reasons.append("Safe to eat with your braces - soft texture won't cause damage")
+        elif current_treatment and current_treatment != "none":
+            reasons.append("Safe to eat during your current dental treatment")
+        else:
+            reasons.append("Safe to eat with your current dental treatment plan")
+
+    return reasons